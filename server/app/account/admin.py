@@ -31,6 +31,7 @@ admin.site.register(models.User, UserAdmin)
 
 # login state admin portal
 class LoginStateAdmin(admin.ModelAdmin):
-    list_display = ('user', 'session_id')
+    list_display = ('user', 'session_id', 'device', 'expires_on', 'created_on')
+    search_fields = ('session_id', 'user__email')
 
 admin.site.register(models.LoginState, LoginStateAdmin)
\ No newline at end of file
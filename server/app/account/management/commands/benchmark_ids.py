@@ -0,0 +1,94 @@
+import os
+import time
+import random
+import sqlite3
+import tempfile
+from django.core.management.base import BaseCommand
+from common.utils import generator, ids
+
+SCHEMES = {
+    # random uuid text keys, as user and project ids were made before
+    'text': ('varchar(36)', generator.generate_identity),
+    # time-ordered 16 byte keys
+    'compact': ('blob', ids.generate_bytes),
+}
+
+
+class Command(BaseCommand):
+    help = 'Benchmarks inserts and lookups of rows keyed by random uuid text against time-ordered 16 byte ids (sqlite).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=10000000, help='Rows of each table.')
+        parser.add_argument('--batch-size', type=int, default=10000, help='Rows inserted per transaction.')
+        parser.add_argument('--lookups', type=int, default=100000, help='Random point lookups by id.')
+        parser.add_argument('--dir', default=None, help='Directory of the benchmark databases (a temporary one by default).')
+
+    # inserts rows with one child row each, returns (inserts/s overall, inserts/s of the last batch, sampled ids)
+    def __insert(self, db, make_id, rows: int, batch_size: int, lookups: int) -> tuple:
+        rng = random.Random(5)
+        sample = []
+        started = time.perf_counter()
+        last = 0.0
+        for offset in range(0, rows, batch_size):
+            count = min(batch_size, rows - offset)
+            keys = [make_id() for _ in range(count)]
+            batch_started = time.perf_counter()
+            with db:
+                db.executemany('INSERT INTO parent (id, name) VALUES (?, ?)', ((key, 'project') for key in keys))
+                db.executemany('INSERT INTO child (parent_id, name) VALUES (?, ?)', ((key, 'api') for key in keys))
+            last = count / (time.perf_counter() - batch_started)
+            # reservoir sample of ids to look up
+            for i, key in enumerate(keys, offset):
+                if len(sample) < lookups:
+                    sample.append(key)
+                elif rng.randrange(i + 1) < lookups:
+                    sample[rng.randrange(lookups)] = key
+        return rows / (time.perf_counter() - started), last, sample
+
+    # returns lookups/s of parent rows by id and of child rows by parent id
+    def __lookup(self, db, sample: list) -> tuple:
+        random.Random(7).shuffle(sample)
+        rates = []
+        for sql in ('SELECT name FROM parent WHERE id = ?', 'SELECT name FROM child WHERE parent_id = ?'):
+            started = time.perf_counter()
+            for key in sample:
+                db.execute(sql, (key,)).fetchall()
+            rates.append(len(sample) / (time.perf_counter() - started))
+        return tuple(rates)
+
+    def handle(self, *args, **options):
+        directory = options['dir'] or tempfile.mkdtemp(prefix='benchmark-ids-')
+        rows = options['rows']
+
+        results = {}
+        for label, (db_type, make_id) in SCHEMES.items():
+            path = os.path.join(directory, f'{label}.sqlite3')
+            if os.path.exists(path):
+                os.remove(path)
+            db = sqlite3.connect(path)
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute('PRAGMA synchronous=NORMAL')
+            db.execute(f'CREATE TABLE parent (id {db_type} NOT NULL PRIMARY KEY, name varchar(50) NOT NULL) WITHOUT ROWID')
+            db.execute(f'CREATE TABLE child (id integer NOT NULL PRIMARY KEY AUTOINCREMENT, parent_id {db_type} NOT NULL REFERENCES parent (id), name varchar(50) NOT NULL)')
+            db.execute('CREATE INDEX child_parent_id ON child (parent_id)')
+
+            insert_rate, last_rate, sample = self.__insert(db, make_id, rows, options['batch_size'], options['lookups'])
+            db.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+            db.close()
+            size = os.path.getsize(path)
+
+            # lookups on a fresh connection, so both schemes start with a cold page cache of sqlite
+            db = sqlite3.connect(path)
+            parent_rate, child_rate = self.__lookup(db, sample)
+            db.close()
+            results[label] = (insert_rate, last_rate, parent_rate, child_rate, size)
+            self.stdout.write(
+                f'{label:<8} insert {insert_rate:>9,.0f} rows/s (last batch {last_rate:>9,.0f})  '
+                f'lookup {parent_rate:>9,.0f}/s  by foreign key {child_rate:>9,.0f}/s  size {size / 2 ** 20:>8,.1f}MB'
+            )
+
+        text, compact = results['text'], results['compact']
+        self.stdout.write(
+            f'compact vs text: inserts {compact[0] / text[0]:.2f}x, lookups {compact[2] / text[2]:.2f}x, '
+            f'foreign key lookups {compact[3] / text[3]:.2f}x, size {compact[4] / text[4]:.2f}x  ({directory})'
+        )
@@ -0,0 +1,65 @@
+import time
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import connection
+from common.auth.jwt_token import Jwt
+from common.platform.security import AES256
+from common.utils import generator
+from constants.tokens import TokenExpiry
+from ...models import User, LoginState
+from ...services import LoginService, UserService
+
+EMAIL = 'benchmark-refresh@example.com'
+
+
+# looks the session up and lazily loads its user, as refreshing did before the session store
+def _uncached(refresh_token: str) -> str:
+    payload = Jwt.validate(refresh_token, category=Jwt.REFRESH)[1]
+    user = LoginState.objects.get(session_id=payload['sub']).user
+    return UserService.get_user_enc_key(user)
+
+
+class Command(BaseCommand):
+    help = 'Benchmarks refreshing access tokens through the session store against uncached session lookups.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, default=5000, help='Refreshes per benchmark.')
+        parser.add_argument('--sessions', type=int, default=10, help='Logged in devices of the benchmark user.')
+
+    def __measure(self, label: str, count: int, refresh, tokens: list, clear: bool = False) -> str:
+        queries = []
+
+        def counter(execute, sql, params, many, context):
+            queries.append(sql)
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(counter):
+            started = time.perf_counter()
+            for i in range(count):
+                if clear:
+                    cache.clear()
+                refresh(tokens[i % len(tokens)])
+            elapsed = time.perf_counter() - started
+        return f'{label:<12} {count / elapsed:>8,.0f}/s  {len(queries) / count:.2f} queries each'
+
+    def handle(self, *args, **options):
+        User.objects.filter(email=EMAIL).delete()
+        user = User.objects.create(
+            email=EMAIL,
+            username=generator.generate_identity(),
+            enc_key=AES256(settings.SERVER_ENC_KEY).encrypt(generator.generate_password_key()),
+            is_active=True
+        )
+
+        try:
+            tokens = [LoginService.generate_auth_token(user, device=f'device {i}')['rt'] for i in range(options['sessions'])]
+            count = options['count']
+
+            self.stdout.write(self.__measure('uncached', count, _uncached, tokens))
+            self.stdout.write(self.__measure('store cold', count, LoginService.refresh_auth_token, tokens, clear=True))
+            cache.clear()
+            self.stdout.write(self.__measure('store warm', count, LoginService.refresh_auth_token, tokens))
+            self.stdout.write(f'sessions of user: {LoginState.objects.filter(user=user).count()}, expiring in {TokenExpiry.REFRESH_EXPIRE_SECONDS}s')
+        finally:
+            User.objects.filter(email=EMAIL).delete()
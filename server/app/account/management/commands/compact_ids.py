@@ -0,0 +1,203 @@
+import uuid
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from common.utils import ids
+from common.utils.models import CompactIdField
+
+
+# returns (table, column, id field) of every column holding compact ids, primary keys and the foreign keys to them
+def _columns() -> list:
+    columns = []
+    for model in apps.get_models(include_auto_created=True):
+        if model._meta.proxy or not model._meta.managed:
+            continue
+        for field in model._meta.local_concrete_fields:
+            target = field.target_field if field.is_relation else field
+            if isinstance(target, CompactIdField):
+                columns.append((model._meta.db_table, field.column, target))
+    return columns
+
+
+# yields batches of (id text, 16 bytes) of the ids selected by sql, text that is no id is added to invalid
+def _batches(cursor, sql: str, field: CompactIdField, batch_size: int, invalid: list):
+    cursor.execute(sql)
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            break
+
+        batch = []
+        for (text,) in rows:
+            # text read back from a binary column while mysql converts
+            text = bytes(text).decode('ascii', 'replace') if isinstance(text, (bytes, bytearray, memoryview)) else text
+            try:
+                batch.append((text, ids.encode(text, field.legacy)))
+            except ValueError:
+                invalid.append(text)
+        yield batch
+
+
+class Command(BaseCommand):
+    help = (
+        'Converts user and project ids still stored as text (rows made before compact ids, or copied as is by the '
+        'schema migration) into their 16 byte form. Ids keep their text, so tokens, urls and clients keep working. '
+        'On postgresql and mysql the text columns are converted to uuid and binary(16) too, run it before serving '
+        'the new code and before migrating the column types.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000, help='Rows updated per statement batch.')
+        parser.add_argument('--dry-run', action='store_true', help='Only count the ids to convert.')
+
+    def handle(self, *args, **options):
+        convert = {
+            'sqlite': self.__sqlite,
+            'postgresql': self.__postgresql,
+            'mysql': self.__mysql,
+        }.get(connection.vendor)
+        if convert is None:
+            raise CommandError(f'Converting ids is supported on sqlite, postgresql and mysql, not on {connection.vendor}.')
+        convert(_columns(), options['batch_size'], options['dry_run'])
+
+    def __report(self, table: str, column: str, converted: int, invalid: list, dry_run: bool):
+        self.stdout.write(f'{table}.{column}: {converted} ids {"to convert" if dry_run else "converted"}')
+        if invalid:
+            self.stdout.write(self.style.WARNING(f'{table}.{column}: {len(invalid)} ids of unknown format, e.g. {invalid[:3]}'))
+
+    def __sqlite(self, columns: list, batch_size: int, dry_run: bool):
+        quote = connection.ops.quote_name
+
+        # primary and foreign keys are converted in one transaction, foreign key checks are deferred to its commit
+        with transaction.atomic(), connection.cursor() as cursor:
+            for table, column, field in columns:
+                converted = 0
+                invalid = []
+                sql = f"SELECT DISTINCT {quote(column)} FROM {quote(table)} WHERE typeof({quote(column)}) = 'text'"
+                for batch in _batches(cursor, sql, field, batch_size, invalid):
+                    if batch and not dry_run:
+                        with connection.cursor() as update:
+                            update.executemany(f'UPDATE {quote(table)} SET {quote(column)} = %s WHERE {quote(column)} = %s', [(raw, text) for text, raw in batch])
+                    converted += len(batch)
+
+                # ids of unknown format are left as text, they read back unchanged
+                self.__report(table, column, converted, invalid, dry_run)
+
+    def __postgresql(self, columns: list, batch_size: int, dry_run: bool):
+        quote = connection.ops.quote_name
+
+        # everything runs in one transaction (postgresql alters tables transactionally), any failure leaves the text columns as they were
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT table_name, column_name FROM information_schema.columns WHERE table_schema = current_schema() AND data_type = 'uuid'"
+            )
+            converted_columns = set(cursor.fetchall())
+            columns = [(table, column, field) for table, column, field in columns if (table, column) not in converted_columns]
+            if not columns:
+                self.stdout.write('All id columns are uuid already.')
+                return
+
+            # rewriting every id to the uuid text of its 16 bytes, legacy uids (digits in place of dashes) do not cast to uuid as they are
+            invalid_columns = []
+            for table, column, field in columns:
+                converted = 0
+                invalid = []
+                sql = f'SELECT DISTINCT {quote(column)} FROM {quote(table)} WHERE {quote(column)} IS NOT NULL'
+                for batch in _batches(cursor, sql, field, batch_size, invalid):
+                    updates = [(value, text) for value, text in ((str(uuid.UUID(bytes=raw)), text) for text, raw in batch) if value != text]
+                    if updates and not dry_run:
+                        with connection.cursor() as update:
+                            update.executemany(f'UPDATE {quote(table)} SET {quote(column)} = %s WHERE {quote(column)} = %s', updates)
+                    converted += len(updates)
+                self.__report(table, column, converted, invalid, dry_run)
+                if invalid:
+                    invalid_columns.append(f'{table}.{column}')
+
+            if invalid_columns:
+                raise CommandError(f'Ids of unknown format in {", ".join(invalid_columns)} do not cast to uuid, nothing was converted.')
+            if dry_run:
+                return
+
+            # checking deferred foreign keys now, tables with pending checks cannot be altered
+            cursor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+
+            # foreign keys between text and uuid columns are not allowed, they are dropped and created again after the type change
+            foreign_keys = []
+            for table, column, field in columns:
+                cursor.execute(
+                    'SELECT c.conname, pg_get_constraintdef(c.oid) FROM pg_constraint c '
+                    'JOIN pg_attribute a ON a.attrelid = c.conrelid AND a.attnum = ANY(c.conkey) '
+                    "WHERE c.contype = 'f' AND c.conrelid = %s::regclass AND a.attname = %s",
+                    [quote(table), column]
+                )
+                for name, definition in cursor.fetchall():
+                    cursor.execute(f'ALTER TABLE {quote(table)} DROP CONSTRAINT {quote(name)}')
+                    foreign_keys.append((table, name, definition))
+
+            for table, column, field in columns:
+                # pattern indexes made for text lookups (the "_like" indexes) have no meaning on uuid columns
+                cursor.execute(
+                    'SELECT indexname FROM pg_indexes WHERE schemaname = current_schema() AND tablename = %s AND indexdef LIKE %s',
+                    [table, f'%({column} %pattern_ops)']
+                )
+                for (name,) in cursor.fetchall():
+                    cursor.execute(f'DROP INDEX {quote(name)}')
+                cursor.execute(f'ALTER TABLE {quote(table)} ALTER COLUMN {quote(column)} TYPE uuid USING {quote(column)}::uuid')
+
+            for table, name, definition in foreign_keys:
+                cursor.execute(f'ALTER TABLE {quote(table)} ADD CONSTRAINT {quote(name)} {definition}')
+            self.stdout.write(f'{len(columns)} columns converted to uuid.')
+
+    def __mysql(self, columns: list, batch_size: int, dry_run: bool):
+        quote = connection.ops.quote_name
+
+        with connection.cursor() as cursor:
+            pending = []
+            for table, column, field in columns:
+                cursor.execute(
+                    'SELECT data_type, character_maximum_length FROM information_schema.columns '
+                    'WHERE table_schema = DATABASE() AND table_name = %s AND column_name = %s',
+                    [table, column]
+                )
+                row = cursor.fetchone()
+                if row is not None and (row[0] != 'binary' or row[1] != 16):
+                    pending.append((table, column, field, row[0]))
+            if not pending:
+                self.stdout.write('All id columns are binary(16) already.')
+                return
+
+            # checking every id before altering anything, mysql does not roll back table changes
+            invalid_columns = []
+            for table, column, field, data_type in pending:
+                invalid = []
+                sql = f'SELECT DISTINCT {quote(column)} FROM {quote(table)} WHERE LENGTH({quote(column)}) <> 16'
+                converted = sum(len(batch) for batch in _batches(cursor, sql, field, batch_size, invalid))
+                self.__report(table, column, converted, invalid, True)
+                if invalid:
+                    invalid_columns.append(f'{table}.{column}')
+
+            if invalid_columns:
+                raise CommandError(f'Ids of unknown format in {", ".join(invalid_columns)} do not fit binary(16), nothing was converted.')
+            if dry_run:
+                return
+
+            # foreign key checks are off while columns change type, so primary keys and the foreign keys to them may differ in between.
+            # text is first moved to varbinary(36) unchanged, its bytes are then replaced by the 16 byte ids and the column narrowed,
+            # an interrupted run continues from varbinary columns
+            cursor.execute('SET FOREIGN_KEY_CHECKS = 0')
+            try:
+                for table, column, field, data_type in pending:
+                    null = 'NULL' if field.null else 'NOT NULL'
+                    if data_type != 'varbinary':
+                        cursor.execute(f'ALTER TABLE {quote(table)} MODIFY {quote(column)} varbinary(36) {null}')
+
+                    invalid = []
+                    sql = f'SELECT DISTINCT {quote(column)} FROM {quote(table)} WHERE LENGTH({quote(column)}) <> 16'
+                    for batch in _batches(cursor, sql, field, batch_size, invalid):
+                        with transaction.atomic(), connection.cursor() as update:
+                            update.executemany(f'UPDATE {quote(table)} SET {quote(column)} = %s WHERE {quote(column)} = %s', [(raw, text.encode('ascii')) for text, raw in batch])
+
+                    cursor.execute(f'ALTER TABLE {quote(table)} MODIFY {quote(column)} binary(16) {null}')
+                    self.stdout.write(f'{table}.{column}: converted to binary(16)')
+            finally:
+                cursor.execute('SET FOREIGN_KEY_CHECKS = 1')
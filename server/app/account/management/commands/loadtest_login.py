@@ -0,0 +1,95 @@
+import time
+import threading
+import numpy as np
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from django.test import override_settings
+from common.auth.hashing import PasswordHashingService
+from common.exception.exceptions import HashingOverloadError
+from common.utils import generator
+from ...models import User
+from ...services import LoginService, UserService
+
+EMAIL = 'loadtest-login@example.com'
+PASSWORD = 'loadtest123'
+
+
+# calls an unrelated cheap request path every interval seconds and records its latency until stopped
+def _probe(stop: threading.Event, interval: float, latencies: list):
+    while not stop.is_set():
+        started = time.perf_counter()
+        UserService.check_username_availability(generator.generate_identity())
+        latencies.append(time.perf_counter() - started)
+        time.sleep(interval)
+    close_old_connections()
+
+
+# logs in count times and records the outcome of each attempt
+def _login(count: int, outcomes: list):
+    for _ in range(count):
+        try:
+            outcomes.append(LoginService.login({'email': EMAIL, 'password': PASSWORD, 'msg_token': ''}) is not None)
+        except HashingOverloadError:
+            outcomes.append(None)
+    close_old_connections()
+
+
+
+class Command(BaseCommand):
+    help = 'Measures latency of an unrelated request path during a login burst, with hashing on the request threads and on the hashing pool.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8, help='Request threads logging in concurrently.')
+        parser.add_argument('--logins', type=int, default=5, help='Logins per request thread.')
+        parser.add_argument('--interval', type=float, default=0.01, help='Seconds between calls of the unrelated request path.')
+        parser.add_argument('--workers', type=int, default=1, help='Hashing pool processes.')
+
+    def __run(self, options: dict) -> str:
+        stop = threading.Event()
+        latencies = []
+        outcomes = []
+        probe = threading.Thread(target=_probe, args=(stop, options['interval'], latencies))
+        probe.start()
+
+        # baseline latency before the burst
+        time.sleep(1)
+        baseline = len(latencies)
+
+        started = time.perf_counter()
+        threads = [threading.Thread(target=_login, args=(options['logins'], outcomes)) for _ in range(options['threads'])]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        stop.set()
+        probe.join()
+
+        idle = np.array(latencies[:baseline]) * 1000
+        burst = np.array(latencies[baseline:]) * 1000
+        return (
+            f'logins {outcomes.count(True)} ok, {outcomes.count(None)} rejected in {elapsed:.2f}s | '
+            f'unrelated p50/p99 idle {np.percentile(idle, 50):.2f}/{np.percentile(idle, 99):.2f}ms, '
+            f'burst {np.percentile(burst, 50):.2f}/{np.percentile(burst, 99):.2f}ms'
+        )
+
+    def handle(self, *args, **options):
+        User.objects.filter(email=EMAIL).delete()
+        User.objects.create(
+            email=EMAIL,
+            username=generator.generate_identity(),
+            password=PasswordHashingService.make(PASSWORD),
+            is_active=True
+        )
+
+        try:
+            with override_settings(PASSWORD_HASH_WORKERS=0):
+                self.stdout.write(f'request thread: {self.__run(options)}')
+
+            with override_settings(PASSWORD_HASH_WORKERS=options['workers']):
+                # starting pool processes before measuring
+                PasswordHashingService.make(PASSWORD)
+                self.stdout.write(f'hashing pool:   {self.__run(options)}')
+            self.stdout.write(f'pool metrics: {PasswordHashingService.metrics()}')
+        finally:
+            User.objects.filter(email=EMAIL).delete()
@@ -1,8 +1,12 @@
 import string
 from django.db import models
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager
+from django.contrib.auth.hashers import make_password
 from common.utils import generator
+from common.utils.models import DirtyFieldsMixin, CompactIdField
+from common.utils import ids
 from common.platform.security import AES256
+from common.auth.hashing import PasswordHashingService
 from django.conf import settings
 
 
@@ -20,7 +24,7 @@ class UserManager(BaseUserManager):
         user = self.model(email=self.normalize_email(email), first_name=first_name, last_name=last_name, username=username)
 
         # saving user with user password
-        user.set_password(password)
+        user.password = PasswordHashingService.make(password) if password is not None else make_password(None)
         user.save(using=self._db)
 
         return user
@@ -71,9 +75,9 @@ class UserManager(BaseUserManager):
 
 
 # user model
-class User(AbstractBaseUser):
+class User(DirtyFieldsMixin, AbstractBaseUser):
     '''User Model Class'''
-    uid = models.CharField(default=generator.generate_uuid, max_length=36, unique=True, primary_key=True, editable=False)
+    uid = CompactIdField(legacy=ids.UID, unique=True, primary_key=True, editable=False)
     first_name = models.CharField(default='', max_length=255)
     last_name = models.CharField(default='', max_length=255)
     email = models.EmailField(default='', max_length=255, unique=True)
@@ -119,10 +123,11 @@ class User(AbstractBaseUser):
 
 
 
-# Login State
+# Login State, one session per logged in device (refresh tokens carry the session id)
 class LoginState(models.Model):
-    user = models.OneToOneField(User, on_delete=models.CASCADE)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='sessions')
     session_id = models.CharField(default='', max_length=100, unique=True)
-    refresh_token = models.TextField(default='', unique=True)
+    device = models.CharField(default='', max_length=255, blank=True)
+    expires_on = models.DateTimeField(null=True)
     updated_on = models.DateTimeField(auto_now=True)
     created_on = models.DateTimeField(auto_now_add=True, null=True)
\ No newline at end of file
@@ -1,6 +1,8 @@
 from rest_framework import serializers
 from .models import User
 from common.utils import otp, validators
+from common.auth.hashing import PasswordHashingService
+from common.utils.query import IdentityMap
 from django.core.cache import cache
 
 
@@ -94,10 +96,10 @@ class LoginSerializer(serializers.ModelSerializer):
         if type(msg_token) is not str:
             raise serializers.ValidationError({'token': 'Invalid message token.'})
 
-        if not User.objects.filter(email=email).exists():
+        user = IdentityMap.fetch(User.objects, email=email)
+        if user is None:
             raise serializers.ValidationError({'account': 'No account found.'})
 
-        user = User.objects.get(email=email)
         if not user.is_signed:
             raise serializers.ValidationError({'account': 'Something went wrong!'})
 
@@ -122,10 +124,10 @@ class PasswordRecoverySerializer(serializers.ModelSerializer):
         if not validators.is_email(email):
             raise serializers.ValidationError({'email': 'Invalid Email'})
 
-        if not User.objects.filter(email=email).exists():
+        self.user = IdentityMap.fetch(User.objects, email=email)
+        if self.user is None:
             raise serializers.ValidationError({'account': 'No account found.'})
 
-        self.user = User.objects.get(email=email)
         if not self.user.is_signed:
             raise serializers.ValidationError({'account': 'Something went wrong!'})
 
@@ -191,7 +193,7 @@ class ChangePasswordSerializer(serializers.ModelSerializer):
         if not validators.atleast_length(new_password, 8) or not validators.atmost_length(new_password, 32) or not validators.is_password(new_password):
             raise serializers.ValidationError({'password': 'Password must be of 8 to 32 character, contains atleast one number and one character.'})
         
-        if not self.context.get('user').check_password(password):
+        if not PasswordHashingService.verify(password, self.context.get('user').password)[0]:
             raise serializers.ValidationError({'password': 'Current password is Invalid.'})
         
         return attrs
@@ -1,5 +1,6 @@
 from django.conf import settings
 from django.core.cache import cache
+from django.core.exceptions import ValidationError
 from common.utils import otp, generator
 from common.platform.platform import Platform
 from common.utils.messenger import Mailer
@@ -7,8 +8,11 @@ from common.debug.log import Log
 from common.exception.exceptions import UserNotFoundError, NoCacheDataError, NoSessionError
 from common.auth.jwt_token import Jwt
 from common.platform.security import AES256
-from .models import User, LoginState
-from django.contrib.auth import authenticate
+from common.auth.principal import PrincipalCache
+from common.auth.session import SessionStore
+from common.utils.query import IdentityMap
+from common.auth.hashing import PasswordHashingService
+from .models import User
 from constants.tokens import TokenExpiry, TokenType, CookieToken, HeaderToken
 
 
@@ -30,22 +34,28 @@ class UserService:
     
     @staticmethod
     def get_user(uid: str) -> User:
-        if User.objects.filter(uid=uid).exists():
-            return User.objects.get(uid=uid)
-        raise UserNotFoundError()
+        try:
+            user = IdentityMap.fetch(User.objects, uid=uid)
+        except ValidationError:
+            # malformed uid
+            user = None
+        if user is None:
+            raise UserNotFoundError()
+        return user
     
     @staticmethod
     def get_user_by_username(username: str) -> User:
-        if User.objects.filter(username=username).exists():
-            return User.objects.get(username=username)
-        raise UserNotFoundError()
+        user = IdentityMap.fetch(User.objects, username=username)
+        if user is None:
+            raise UserNotFoundError()
+        return user
     
     
     @staticmethod
     def delete_user(uid: str):
-        if User.objects.filter(uid=uid).exists():
-            User.objects.get(uid=uid).delete()
-        raise UserNotFoundError()
+        user = UserService.get_user(uid)
+        user.delete()
+        IdentityMap.forget(user)
 
 
     @staticmethod
@@ -55,13 +65,22 @@ class UserService:
     
     @staticmethod
     def change_password(user: User, password: str):
-        user.set_password(password)
+        user.password = PasswordHashingService.make(password)
         user.save()
+
+        # signing out every device, refresh tokens issued with the old password stop working
+        SessionStore.revoke_all(user)
     
     @staticmethod
     def get_user_enc_key(user: User) -> str:
         aes = AES256(settings.SERVER_ENC_KEY)
-        enc_key = aes.decrypt(user.enc_key)
+        enc_key, upgraded = aes.decrypt_and_upgrade(user.enc_key)
+
+        # re-encrypting older cipher version on read
+        if upgraded is not None:
+            User.objects.filter(uid=user.uid).update(enc_key=upgraded)
+            user.enc_key = upgraded
+            PrincipalCache.invalidate(user.uid)
         return enc_key
 
     @staticmethod
@@ -217,8 +236,20 @@ class LoginService:
 
     @staticmethod
     def __login_authentication(data):
-        return authenticate(email=data.get('email'), password=data.get('password'))
-        
+        user = IdentityMap.fetch(User.objects, email=data.get('email'))
+
+        # checking against an empty hash for unknown users, so response time does not reveal registered emails
+        valid, must_update = PasswordHashingService.verify(data.get('password') or '', user.password if user else '')
+        if not valid or not user.is_active:
+            return None
+
+        # upgrading hash made with older hasher parameters
+        if must_update:
+            user.password = PasswordHashingService.make(data.get('password'))
+            User.objects.filter(uid=user.uid).update(password=user.password)
+            PrincipalCache.invalidate(user.uid)
+        return user
+
 
     @staticmethod
     def login(data):
@@ -230,7 +261,7 @@ class LoginService:
         return user
     
     @staticmethod
-    def generate_auth_token(user: User) -> dict:
+    def generate_auth_token(user: User, device: str = '') -> dict:
         # generating access token
         access_token = Jwt.generate(
             type=TokenType.LOGIN,
@@ -239,25 +270,14 @@ class LoginService:
             seconds=TokenExpiry.ACCESS_EXPIRE_SECONDS
         )
 
-        # generating refresh token if no session found for the user
-        login_state = LoginState.objects.filter(user=user)
-        if login_state.exists() and Jwt.validate(login_state[0].refresh_token, category=Jwt.REFRESH)[0]:
-            refresh_token = login_state[0].refresh_token
-        else:
-            session_id = generator.generate_identity()
-            refresh_token = Jwt.generate(
-                type=TokenType.LOGIN,
-                sub=session_id,
-                category=Jwt.REFRESH,
-                seconds=TokenExpiry.REFRESH_EXPIRE_SECONDS
-            )
-            if login_state.exists():
-                lst = login_state[0]
-                lst.session_id = session_id
-                lst.refresh_token = refresh_token
-                lst.save()
-            else:
-                LoginState.objects.create(user=user, session_id=session_id, refresh_token=refresh_token)
+        # creating new session for this device, refresh token carries the session id
+        session = SessionStore.create(user, seconds=TokenExpiry.REFRESH_EXPIRE_SECONDS, device=device)
+        refresh_token = Jwt.generate(
+            type=TokenType.LOGIN,
+            sub=session.session_id,
+            category=Jwt.REFRESH,
+            seconds=TokenExpiry.REFRESH_EXPIRE_SECONDS
+        )
 
         # getting user encryption key
         enc_key = UserService.get_user_enc_key(user)
@@ -272,9 +292,8 @@ class LoginService:
     @staticmethod
     def refresh_auth_token(refresh_token: str) -> dict:
         is_valid, payload = Jwt.validate(refresh_token, category=Jwt.REFRESH)
-        if is_valid:
-            user = LoginState.objects.get(session_id=payload['sub']).user
-
+        user = SessionStore.get_user(payload['sub']) if is_valid else None
+        if user is not None:
             # refreshing access token
             access_token = Jwt.generate(
                 type=TokenType.LOGIN,
@@ -296,14 +315,27 @@ class LoginService:
         
 
     @staticmethod
-    def logout(user) -> dict:
+    def logout(user, refresh_token: str = None) -> dict:
         # removing msg_token from user
         UserService.update_fcm_token(user=user)
-        # removing refresh token
-        LoginState.objects.get(user=user).delete()
+
+        # removing only the session of this device, a missing or invalid refresh token leaves other sessions alone
+        is_valid, payload = Jwt.validate(refresh_token, category=Jwt.REFRESH) if refresh_token else (False, {})
+        if is_valid:
+            SessionStore.revoke(payload['sub'])
 
         return { 'message': 'Account Logged out Successfully. See you soon.' }
 
+    @staticmethod
+    def logout_all(user) -> dict:
+        # removing msg_token from user
+        UserService.update_fcm_token(user=user)
+
+        # removing every session of user, on all devices
+        SessionStore.revoke_all(user)
+
+        return { 'message': 'Account Logged out from all devices Successfully. See you soon.' }
+
 
 
 
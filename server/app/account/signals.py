@@ -0,0 +1,11 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from common.auth.principal import PrincipalCache
+from .models import User
+
+
+# invalidating cached principal whenever user is changed or removed
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_principal(sender, instance: User, **kwargs):
+    PrincipalCache.invalidate(instance.uid)
@@ -1,3 +1,497 @@
-from django.test import TestCase
+import uuid
+from io import StringIO
+from types import SimpleNamespace
+from unittest import mock
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+from django.test import TestCase, override_settings
+from django.core.management import call_command, CommandError
+from django.db import connection
+from django.core.cache import cache
+from django.contrib.auth.hashers import make_password
+from django.conf import settings
+from rest_framework.test import APIClient, APIRequestFactory
+from common.platform.security import AES256
+from common.utils import generator, ids
+from common.utils.query import IdentityMap
+from common.auth.authentication import UserAuthentication
+from common.auth.jwt_token import Jwt
+from common.auth.hashing import PasswordHashingService
+from constants.tokens import TokenType, CookieToken
+from ..project.models import Project
+from .models import User, LoginState
+from .services import UserService, PasswordRecoveryService
+from .management.commands.compact_ids import _columns
+from common.exception.exceptions import UserNotFoundError, HashingOverloadError
 
-# Create your tests here.
+
+# hashing inline with few iterations, so tests do not spawn the hashing pool
+@override_settings(PASSWORD_HASH_WORKERS=0, PASSWORD_HASH_ITERATIONS=1000)
+class QueryCountTest(TestCase):
+    '''Query budgets of account endpoints, rows loaded while validating are reused by the services.'''
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create(
+            email='ada@example.com',
+            username='ada1234',
+            password=make_password('secret123'),
+            enc_key=AES256(settings.SERVER_ENC_KEY).encrypt('0123456789abcdef'),
+            is_signed=True,
+            is_active=True
+        )
+
+    def test_login(self):
+        # user, fcm token update (only msg_token column), session insert, session pruning
+        with self.assertNumQueries(4):
+            response = self.client.post('/api/account/v1/login/', {'email': 'ada@example.com', 'password': 'secret123', 'msg_token': 'fcm'}, format='json')
+        self.assertEqual(response.data['data']['uid'], self.user.uid)
+        self.assertEqual(LoginState.objects.filter(user=self.user).count(), 1)
+
+        # unchanged fcm token is not written
+        with self.assertNumQueries(3):
+            self.client.post('/api/account/v1/login/', {'email': 'ada@example.com', 'password': 'secret123', 'msg_token': 'fcm'}, format='json')
+
+    def test_login_unknown_email(self):
+        with self.assertNumQueries(1):
+            response = self.client.post('/api/account/v1/login/', {'email': 'nobody@example.com', 'password': 'secret123', 'msg_token': ''}, format='json')
+        self.assertIn('account', response.data['errors'])
+
+    def test_refresh(self):
+        self.client.post('/api/account/v1/login/', {'email': 'ada@example.com', 'password': 'secret123', 'msg_token': ''}, format='json')
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/account/v1/refresh-token/')
+        self.assertEqual(response.data['data']['uid'], self.user.uid)
+
+    def test_password_recovery(self):
+        # user, otp mail
+        with self.assertNumQueries(2):
+            response = self.client.post('/api/account/v1/recovery-password/', {'email': 'ada@example.com'}, format='json')
+        self.assertIn('message', response.data['data'])
+
+    def test_get_user(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(UserService.get_user(self.user.uid), self.user)
+        with self.assertNumQueries(1):
+            self.assertEqual(UserService.get_user_by_username('ada1234'), self.user)
+        with self.assertNumQueries(1), self.assertRaises(UserNotFoundError):
+            UserService.get_user(ids.generate())
+        # malformed uids are not looked up
+        with self.assertNumQueries(0), self.assertRaises(UserNotFoundError):
+            UserService.get_user('missing')
+
+
+# process pool running hashes inline, pools made after `broken` pools run them, hashes on a `stuck` pool never finish
+class FakePool:
+    pools = []
+    made = []
+
+    def __init__(self, **kwargs):
+        self.state = FakePool.pools[len(FakePool.made)] if len(FakePool.made) < len(FakePool.pools) else 'ok'
+        FakePool.made.append(self)
+
+    def submit(self, function, *args):
+        future = Future()
+        if self.state == 'broken':
+            future.set_exception(BrokenProcessPool('a worker process died'))
+        elif self.state == 'ok':
+            future.set_result(function(*args))
+        return future
+
+    def shutdown(self, **kwargs):
+        self.state = 'shutdown'
+
+
+@override_settings(PASSWORD_HASH_WORKERS=1, PASSWORD_HASH_ITERATIONS=1000, PASSWORD_HASH_TIMEOUT=0.05)
+class PasswordHashingTest(TestCase):
+    '''Hashes survive a broken pool and do not wait past their timeout.'''
+
+    def setUp(self):
+        FakePool.made = []
+        patcher = mock.patch('common.auth.hashing.ProcessPoolExecutor', FakePool)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(setattr, PasswordHashingService, '_PasswordHashingService__pool', None)
+
+    def test_broken_pool(self):
+        FakePool.pools = ['broken']
+        encoded = PasswordHashingService.make('secret123')
+        self.assertEqual(PasswordHashingService.verify('secret123', encoded), (True, False))
+        # the broken pool was replaced once
+        self.assertEqual([pool.state for pool in FakePool.made], ['shutdown', 'ok'])
+
+        FakePool.made = []
+        FakePool.pools = ['broken', 'broken']
+        PasswordHashingService._PasswordHashingService__pool = None
+        with self.assertRaises(BrokenProcessPool):
+            PasswordHashingService.make('secret123')
+
+    def test_timeout(self):
+        FakePool.pools = ['stuck']
+        rejected = PasswordHashingService.metrics()['rejected']
+        with self.assertRaises(HashingOverloadError):
+            PasswordHashingService.make('secret123')
+        self.assertEqual(PasswordHashingService.metrics()['rejected'], rejected + 1)
+
+
+class PrincipalCacheTest(TestCase):
+    '''Queries of authenticating requests, without and with the principal cache.'''
+
+    def setUp(self):
+        cache.clear()
+        Jwt.cache.clear()
+        self.user = User.objects.create(email='ada@example.com', username='ada1234', enc_key='key', photo='profile/photo/ada.png', is_active=True)
+        token = Jwt.generate(type=TokenType.LOGIN, sub=self.user.uid, category=Jwt.ACCESS, seconds=60)
+        self.request = APIRequestFactory().get('/', HTTP_AUTHORIZATION=f'Bearer {token}', HTTP_UID=self.user.uid)
+
+    def __authenticate(self, requests: int):
+        for _ in range(requests):
+            user, _ = UserAuthentication().authenticate(self.request)
+            self.assertEqual(user, self.user)
+
+    @override_settings(AUTH_PRINCIPAL_CACHE_SECONDS=0)
+    def test_uncached(self):
+        # one user query per request
+        with self.assertNumQueries(10):
+            self.__authenticate(10)
+
+    def test_cached(self):
+        # only the first request loads the user
+        with self.assertNumQueries(1):
+            self.__authenticate(10)
+
+
+class IdentityMapTest(TestCase):
+    '''Rows loaded in a request are shared only by querysets of the same filters and joins.'''
+
+    def setUp(self):
+        self.user = User.objects.create(email='ada@example.com', username='ada1234', photo='profile/photo/ada.png', is_active=True)
+        self.other = User.objects.create(email='bob@example.com', username='bob1234', photo='profile/photo/bob.png', is_active=True)
+        self.project = Project.objects.create(user=self.user, name='project')
+        token = IdentityMap.begin()
+        self.addCleanup(IdentityMap.end, token)
+
+    def test_shared(self):
+        project = IdentityMap.fetch(Project.objects.all(), id=self.project.pk)
+        with self.assertNumQueries(0):
+            self.assertIs(IdentityMap.fetch(Project.objects, pk=self.project.pk), project)
+
+    def test_filtered(self):
+        IdentityMap.fetch(Project.objects.all(), pk=self.project.pk)
+        # the row loaded without the owner filter does not answer a lookup with it
+        with self.assertNumQueries(1):
+            self.assertIsNone(IdentityMap.fetch(Project.objects.filter(user=self.other), pk=self.project.pk))
+        with self.assertNumQueries(1):
+            owned = IdentityMap.fetch(Project.objects.filter(user=self.user), pk=self.project.pk)
+        self.assertEqual(owned, self.project)
+        self.assertIsNone(IdentityMap.fetch(Project.objects.none(), pk=self.project.pk))
+
+    def test_select_related(self):
+        IdentityMap.fetch(Project.objects.all(), pk=self.project.pk)
+        with self.assertNumQueries(1):
+            project = IdentityMap.fetch(Project.objects.select_related('user'), pk=self.project.pk)
+            self.assertEqual(project.user, self.user)
+
+
+class DirtyFieldsTest(TestCase):
+    '''Saves of loaded rows write only changed columns.'''
+
+    def setUp(self):
+        User.objects.create(email='ada@example.com', username='ada1234', enc_key='key', msg_token='old')
+        self.user = User.objects.get(email='ada@example.com')
+
+    def test_save_changed_fields(self):
+        self.user.msg_token = 'new'
+        self.assertEqual(self.user.dirty_fields(), ['msg_token'])
+        with self.assertNumQueries(1) as queries:
+            self.user.save()
+        self.assertNotIn('enc_key', queries.captured_queries[0]['sql'])
+        self.assertEqual(self.user.dirty_fields(), [])
+        self.assertEqual(User.objects.get(uid=self.user.uid).msg_token, 'new')
+
+    def test_save_unchanged(self):
+        with self.assertNumQueries(0):
+            self.user.save()
+
+    def test_save_deferred_field(self):
+        user = User.objects.only('uid').get(uid=self.user.uid)
+        user.phone = '5550100'
+        with self.assertNumQueries(1):
+            user.save()
+        self.assertEqual(User.objects.get(uid=self.user.uid).phone, '5550100')
+
+
+class CompactIdTest(TestCase):
+    '''New ids are time-ordered, ids of older rows keep their text.'''
+
+    def test_new_ids(self):
+        first = User.objects.create(email='ada@example.com', username='ada1234', enc_key='key')
+        second = User.objects.create(email='bob@example.com', username='bob1234', enc_key='key')
+        self.assertEqual(len(first.uid), 26)
+        # ids sort by their leading 10 characters, the creation millisecond
+        self.assertLessEqual(first.uid[:10], second.uid[:10])
+        self.assertEqual(User.objects.get(uid=second.uid.lower()), second)
+
+    def test_legacy_ids(self):
+        uid = generator.generate_uuid()
+        user = User.objects.create(uid=uid, email='ada@example.com', username='ada1234', enc_key='key')
+        self.assertEqual(len(ids.encode(uid, ids.UID)), 16)
+        self.assertEqual(User.objects.get(uid=uid).uid, uid)
+        self.assertEqual(UserService.get_user(uid), user)
+
+
+@override_settings(PASSWORD_HASH_WORKERS=0, PASSWORD_HASH_ITERATIONS=1000)
+class SessionTest(TestCase):
+    '''Logging out revokes only the session of its refresh token, password changes revoke every session.'''
+
+    def setUp(self):
+        cache.clear()
+        Jwt.cache.clear()
+        self.user = User.objects.create(
+            email='ada@example.com',
+            username='ada1234',
+            password=make_password('secret123'),
+            enc_key=AES256(settings.SERVER_ENC_KEY).encrypt('0123456789abcdef'),
+            photo='profile/photo/ada.png',
+            is_signed=True,
+            is_active=True
+        )
+        # logged in on two devices
+        self.phone, self.laptop = self.__login(), self.__login()
+
+    def __login(self) -> APIClient:
+        client = APIClient()
+        response = client.post('/api/account/v1/login/', {'email': 'ada@example.com', 'password': 'secret123', 'msg_token': ''}, format='json')
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {response.data['data']['at']}", HTTP_UID=self.user.uid)
+        return client
+
+    def __refreshes(self, refresh_token: str) -> bool:
+        client = APIClient()
+        client.cookies[CookieToken.REFRESH_TOKEN] = refresh_token
+        return client.get('/api/account/v1/refresh-token/').data['success']
+
+    def test_logout(self):
+        phone_token = self.phone.cookies[CookieToken.REFRESH_TOKEN].value
+        self.assertTrue(self.phone.post('/api/account/v1/logout/').data['success'])
+        self.assertFalse(self.__refreshes(phone_token))
+        self.assertTrue(self.__refreshes(self.laptop.cookies[CookieToken.REFRESH_TOKEN].value))
+
+    def test_logout_without_refresh_token(self):
+        for refresh_token in ('', 'invalid'):
+            self.phone.cookies[CookieToken.REFRESH_TOKEN] = refresh_token
+            self.assertTrue(self.phone.post('/api/account/v1/logout/').data['success'])
+        self.assertEqual(LoginState.objects.filter(user=self.user).count(), 2)
+        self.assertTrue(self.__refreshes(self.laptop.cookies[CookieToken.REFRESH_TOKEN].value))
+
+    def test_logout_all(self):
+        laptop_token = self.laptop.cookies[CookieToken.REFRESH_TOKEN].value
+        self.assertTrue(self.phone.post('/api/account/v1/logout-all/').data['success'])
+        self.assertFalse(self.__refreshes(laptop_token))
+        self.assertFalse(LoginState.objects.filter(user=self.user).exists())
+
+    def test_change_password(self):
+        laptop_token = self.laptop.cookies[CookieToken.REFRESH_TOKEN].value
+        self.assertTrue(self.__refreshes(laptop_token))
+        response = self.phone.post('/api/account/v1/account-password-change/', {'password': 'secret123', 'new_password': 'secret456'}, format='json')
+        self.assertTrue(response.data['success'])
+        self.assertFalse(self.__refreshes(laptop_token))
+        self.assertFalse(LoginState.objects.filter(user=self.user).exists())
+
+    def test_password_recovery(self):
+        laptop_token = self.laptop.cookies[CookieToken.REFRESH_TOKEN].value
+        client = APIClient()
+        client.cookies[CookieToken.PASSWORD_RECOVERY_NEW_PASS_TOKEN] = PasswordRecoveryService.generate_new_pass_token(self.user.uid)['prnpt']
+        self.assertTrue(client.post('/api/account/v1/recovery-password-new/', {'password': 'secret456'}, format='json').data['success'])
+        self.assertFalse(self.__refreshes(laptop_token))
+        self.assertFalse(LoginState.objects.filter(user=self.user).exists())
+
+
+class CompactIdsCommandTest(TestCase):
+    '''compact_ids converts ids still stored as text, and the foreign keys to them.'''
+
+    def setUp(self):
+        self.uid = generator.generate_uuid()
+        self.user = User.objects.create(uid=self.uid, email='ada@example.com', username='ada1234', enc_key='key')
+        self.project = Project.objects.create(user=self.user, name='project')
+
+        # rows as left by the schema migration, ids copied as text
+        with connection.cursor() as cursor:
+            cursor.execute(f'UPDATE {User._meta.db_table} SET uid = %s', [self.uid])
+            cursor.execute(f'UPDATE {Project._meta.db_table} SET id = %s, user_id = %s', [self.project.id, self.uid])
+
+    def __types(self) -> set:
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT typeof(uid) FROM {User._meta.db_table}')
+            types = {row[0] for row in cursor.fetchall()}
+            cursor.execute(f'SELECT typeof(id), typeof(user_id) FROM {Project._meta.db_table}')
+            return types | {value for row in cursor.fetchall() for value in row}
+
+    def test_convert(self):
+        self.assertEqual(self.__types(), {'text'})
+        call_command('compact_ids', '--dry-run', stdout=StringIO())
+        self.assertEqual(self.__types(), {'text'})
+
+        call_command('compact_ids', stdout=StringIO())
+        self.assertEqual(self.__types(), {'blob'})
+        self.assertEqual(Project.objects.get(user__uid=self.uid).id, self.project.id)
+        self.assertEqual(User.objects.get(uid=self.uid).uid, self.uid)
+
+
+class FakeCursor:
+    '''Cursor of FakeConnection, records statements and answers queries from the connection'''
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.rows = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def execute(self, sql: str, params=None):
+        self.connection.statements.append((sql, params))
+        self.rows = list(self.connection.answer(sql, params or []))
+
+    def executemany(self, sql: str, rows):
+        self.connection.statements.append((sql, list(rows)))
+
+    def fetchall(self) -> list:
+        rows, self.rows = self.rows, []
+        return rows
+
+    def fetchone(self):
+        return self.rows.pop(0) if self.rows else None
+
+    def fetchmany(self, size: int) -> list:
+        rows, self.rows = self.rows[:size], self.rows[size:]
+        return rows
+
+
+class FakeConnection:
+    '''Postgresql or mysql connection recording the sql run on it, answer(sql, params) returns the rows of a query'''
+
+    def __init__(self, vendor: str, answer):
+        self.vendor = vendor
+        self.answer = answer
+        self.statements = []
+        quote = '"%s"' if vendor == 'postgresql' else '`%s`'
+        self.ops = SimpleNamespace(quote_name=lambda name: quote % name)
+
+    def cursor(self) -> FakeCursor:
+        return FakeCursor(self)
+
+    def sql(self, prefix: str = '') -> list:
+        return [sql for sql, _ in self.statements if sql.startswith(prefix)]
+
+
+class CompactIdsSqlTest(TestCase):
+    '''SQL compact_ids runs on postgresql and mysql, recorded on a fake connection.'''
+
+    USERS = User._meta.db_table
+    PROJECTS = Project._meta.db_table
+
+    def setUp(self):
+        self.uid = generator.generate_uuid()
+        self.project_id = str(uuid.uuid4())
+        # id text found per (table, column), other columns hold no ids
+        self.ids = {(self.USERS, 'uid'): [self.uid], (self.PROJECTS, 'id'): [self.project_id], (self.PROJECTS, 'user_id'): [self.uid]}
+
+    def __run(self, vendor: str, answer, *args) -> tuple:
+        connection = FakeConnection(vendor, answer)
+        out = StringIO()
+        with mock.patch('app.account.management.commands.compact_ids.connection', connection):
+            call_command('compact_ids', *args, stdout=out)
+        return connection, out.getvalue()
+
+    def __distinct(self, sql: str, quote: str) -> list:
+        for (table, column), values in self.ids.items():
+            if sql.startswith(f'SELECT DISTINCT {quote}{column}{quote} FROM {quote}{table}{quote} '):
+                return [(value,) for value in values]
+        return []
+
+    def __postgresql(self, sql: str, params: list) -> list:
+        if sql.startswith('SELECT DISTINCT'):
+            return self.__distinct(sql, '"')
+        if 'pg_constraint' in sql and params == [f'"{self.PROJECTS}"', 'user_id']:
+            return [('project_user_id_fk', f'FOREIGN KEY (user_id) REFERENCES {self.USERS}(uid) DEFERRABLE INITIALLY DEFERRED')]
+        if 'pg_indexes' in sql and params[0] == self.USERS and 'uid' in params[1]:
+            return [('user_uid_like',)]
+        return []
+
+    def test_postgresql(self):
+        connection, out = self.__run('postgresql', self.__postgresql)
+
+        # legacy uids are rewritten to the uuid text of their bytes, uuid text casts as it is
+        uuid_text = str(uuid.UUID(bytes=ids.encode(self.uid, ids.UID)))
+        updates = [(sql, rows) for sql, rows in connection.statements if sql.startswith('UPDATE')]
+        self.assertEqual(updates, [
+            (f'UPDATE "{self.USERS}" SET "uid" = %s WHERE "uid" = %s', [(uuid_text, self.uid)]),
+            (f'UPDATE "{self.PROJECTS}" SET "user_id" = %s WHERE "user_id" = %s', [(uuid_text, self.uid)]),
+        ])
+
+        # foreign keys are dropped before the type changes and created again after them
+        statements = connection.sql()
+        drop = statements.index(f'ALTER TABLE "{self.PROJECTS}" DROP CONSTRAINT "project_user_id_fk"')
+        add = statements.index(f'ALTER TABLE "{self.PROJECTS}" ADD CONSTRAINT "project_user_id_fk" FOREIGN KEY (user_id) REFERENCES {self.USERS}(uid) DEFERRABLE INITIALLY DEFERRED')
+        alters = [statements.index(f'ALTER TABLE "{table}" ALTER COLUMN "{column}" TYPE uuid USING "{column}"::uuid') for table, column, _ in _columns()]
+        self.assertLess(statements.index('SET CONSTRAINTS ALL IMMEDIATE'), drop)
+        self.assertTrue(drop < min(alters) and max(alters) < add)
+        self.assertLess(statements.index('DROP INDEX "user_uid_like"'), statements.index(f'ALTER TABLE "{self.USERS}" ALTER COLUMN "uid" TYPE uuid USING "uid"::uuid'))
+        self.assertIn(f'{len(alters)} columns converted to uuid.', out)
+
+    def test_postgresql_dry_run(self):
+        connection, out = self.__run('postgresql', self.__postgresql, '--dry-run')
+        self.assertEqual(connection.sql('UPDATE') + connection.sql('ALTER') + connection.sql('DROP'), [])
+        self.assertIn(f'{self.USERS}.uid: 1 ids to convert', out)
+
+    def test_postgresql_invalid(self):
+        self.ids[(self.PROJECTS, 'id')].append('not-an-id')
+        with self.assertRaisesMessage(CommandError, f'{self.PROJECTS}.id'):
+            self.__run('postgresql', self.__postgresql)
+
+    def test_postgresql_converted(self):
+        converted = [(table, column) for table, column, _ in _columns()]
+        connection, out = self.__run('postgresql', lambda sql, params: converted if "data_type = 'uuid'" in sql else [])
+        self.assertIn('All id columns are uuid already.', out)
+        self.assertEqual(connection.sql('ALTER'), [])
+
+    def __mysql(self, data_types: dict = None):
+        def answer(sql: str, params: list) -> list:
+            if 'information_schema.columns' in sql:
+                return [(data_types or {}).get(tuple(params), ('varchar', 36))]
+            if sql.startswith('SELECT DISTINCT'):
+                return self.__distinct(sql, '`')
+            return []
+        return answer
+
+    def test_mysql(self):
+        # an interrupted run left the user table at varbinary, its ids read back as bytes
+        self.ids[(self.USERS, 'uid')] = [self.uid.encode('ascii')]
+        connection, out = self.__run('mysql', self.__mysql({(self.USERS, 'uid'): ('varbinary', 36)}))
+
+        statements = connection.sql()
+        self.assertEqual((statements[-1], connection.sql('SET')[0]), ('SET FOREIGN_KEY_CHECKS = 1', 'SET FOREIGN_KEY_CHECKS = 0'))
+        self.assertNotIn(f'ALTER TABLE `{self.USERS}` MODIFY `uid` varbinary(36) NOT NULL', statements)
+        widen = statements.index(f'ALTER TABLE `{self.PROJECTS}` MODIFY `user_id` varbinary(36) NOT NULL')
+        update = statements.index(f'UPDATE `{self.PROJECTS}` SET `user_id` = %s WHERE `user_id` = %s')
+        narrow = statements.index(f'ALTER TABLE `{self.PROJECTS}` MODIFY `user_id` binary(16) NOT NULL')
+        self.assertTrue(widen < update < narrow)
+
+        # text is replaced by the 16 bytes of the id
+        raw = ids.encode(self.uid, ids.UID)
+        self.assertEqual(connection.statements[update][1], [(raw, self.uid.encode('ascii'))])
+        self.assertEqual(len([sql for sql in statements if ' binary(16) ' in sql]), len(_columns()))
+        self.assertIn(f'{self.PROJECTS}.user_id: converted to binary(16)', out)
+
+    def test_mysql_invalid(self):
+        self.ids[(self.PROJECTS, 'user_id')].append('not-an-id')
+        with self.assertRaisesMessage(CommandError, f'{self.PROJECTS}.user_id'):
+            self.__run('mysql', self.__mysql())
+
+    def test_mysql_converted(self):
+        connection, out = self.__run('mysql', self.__mysql({(table, column): ('binary', 16) for table, column, _ in _columns()}))
+        self.assertIn('All id columns are binary(16) already.', out)
+        self.assertEqual(connection.sql('ALTER') + connection.sql('SET'), [])
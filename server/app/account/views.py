@@ -9,6 +9,7 @@ from common.debug.log import Log
 from common.platform.platform import Platform
 from constants.tokens import TokenExpiry, CookieToken
 from common.auth.permissions import IsWebIdentitySessionValid
+from common.exception.exceptions import HashingOverloadError
 
 
 
@@ -78,7 +79,7 @@ class SignupVerification(APIView):
                     user = SignupService.create_user(data)
 
                     # generating auth tokens
-                    content = LoginService.generate_auth_token(user)
+                    content = LoginService.generate_auth_token(user, device=request.META.get('HTTP_USER_AGENT', ''))
 
                     # sending response
                     response = Response.success({ 
@@ -177,7 +178,7 @@ class Login(APIView):
 
                 if user is not None:
                     # generating auth tokens
-                    content = LoginService.generate_auth_token(user)
+                    content = LoginService.generate_auth_token(user, device=request.META.get('HTTP_USER_AGENT', ''))
 
                     # sending response
                     response = Response.success({ 
@@ -199,6 +200,8 @@ class Login(APIView):
 
             # sending error reponse
             return Response.errors(serializer.errors)
+        except HashingOverloadError as e:
+            return Response.error(e.message)
         except Exception as e:
             Log.error(e)
             return Response.something_went_wrong()
@@ -214,7 +217,28 @@ class Logout(APIView):
 
     def post(self, request):
         try:
-            content = LoginService.logout(request.user)
+            content = LoginService.logout(request.user, request.COOKIES.get(CookieToken.REFRESH_TOKEN))
+
+            # sending response and logout current authenticated user
+            response = Response.success(content)
+            response.delete_cookie(CookieToken.REFRESH_TOKEN)
+            return response
+        except Exception as e:
+            Log.error(e)
+            return Response.something_went_wrong()
+
+
+
+
+
+# Logout User from all devices
+class LogoutAll(APIView):
+    permission_classes = [IsAuthenticated]
+    throttle_classes = [LogoutThrottling]
+
+    def post(self, request):
+        try:
+            content = LoginService.logout_all(request.user)
 
             # sending response and logout current authenticated user
             response = Response.success(content)
@@ -338,7 +362,7 @@ class PasswordRecoveryNewPassword(APIView):
                 serializer = serializers.PasswordRecoveryNewPassSerializer(data=request.data)
 
                 if serializer.is_valid():   
-                    # setting new password
+                    # setting new password, every session of user is revoked
                     UserService.change_password(user, serializer.validated_data.get('password'))
 
                     # sending response
@@ -352,6 +376,9 @@ class PasswordRecoveryNewPassword(APIView):
             response = Response.error('Session out! Try again.') 
             response.delete_cookie(CookieToken.PASSWORD_RECOVERY_NEW_PASS_TOKEN)
             return response
+        except HashingOverloadError as e:
+            # keeping the token, so the new password can be submitted again
+            return Response.error(e.message)
         except:
             response = Response.something_went_wrong()
             response.delete_cookie(CookieToken.PASSWORD_RECOVERY_NEW_PASS_TOKEN)
@@ -567,11 +594,11 @@ class ChangePassword(APIView):
             # validating current password
             if serializer.is_valid():
 
-                # saving new password
+                # saving new password, every session of user is revoked
                 UserService.change_password(request.user, serializer.validated_data.get('new_password'))
 
                 # logout user
-                LoginService.logout(request.user)
+                LoginService.logout(request.user, request.COOKIES.get(CookieToken.REFRESH_TOKEN))
 
                 # sending response
                 response = Response.success({'message': 'Password changed successfully.'})
@@ -579,6 +606,8 @@ class ChangePassword(APIView):
                 return response
 
             return Response.errors(serializer.errors)
+        except HashingOverloadError as e:
+            return Response.error(e.message)
         except:
             return Response.something_went_wrong()
 
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class ApisConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'app.apis'
+
+    def ready(self):
+        from . import signals
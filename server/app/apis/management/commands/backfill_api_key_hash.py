@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from ...services import ApiKeyService
+
+
+class Command(BaseCommand):
+    help = 'Fills the keyed api key hash index for apis created before it existed.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        updated = ApiKeyService.backfill(batch_size=options['batch_size'])
+        self.stdout.write(f'{updated} api key hash(es) filled.')
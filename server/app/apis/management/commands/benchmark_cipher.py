@@ -0,0 +1,43 @@
+import time
+import secrets
+from django.core.management.base import BaseCommand
+from common.platform.security import AES256
+
+
+class Command(BaseCommand):
+    help = 'Benchmarks encrypting and decrypting with AES256 v1 (CBC, key derived per call) against v2 (GCM, key derived once).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rounds', type=int, default=2000, help='Values encrypted and decrypted per mode and size.')
+        parser.add_argument('--sizes', type=int, nargs='+', default=[32, 4096], help='Plain text sizes in bytes.')
+
+    # returns seconds per encrypt and per decrypt of rounds values
+    def __measure(self, cipher: AES256, raw: str, rounds: int) -> tuple:
+        started = time.perf_counter()
+        sealed = [cipher.encrypt(raw) for _ in range(rounds)]
+        encrypted = time.perf_counter() - started
+
+        started = time.perf_counter()
+        for value in sealed:
+            if cipher.decrypt(value) != raw:
+                raise AssertionError('Decrypted value does not match.')
+        decrypted = time.perf_counter() - started
+        return encrypted / rounds, decrypted / rounds
+
+    def handle(self, *args, **options):
+        # fresh key, so the one time key derivation of v2 is measured too
+        key = secrets.token_hex(16)
+        started = time.perf_counter()
+        AES256(key, version=AES256.V2).encrypt('')
+        self.stdout.write(f'v2 key derivation (once per process and key) {(time.perf_counter() - started) * 1e3:.1f}ms')
+
+        for size in options['sizes']:
+            raw = secrets.token_hex(size)[:size]
+            results = {}
+            for version in (AES256.V1, AES256.V2):
+                results[version] = self.__measure(AES256(key, version=version), raw, options['rounds'])
+                encrypt, decrypt = results[version]
+                self.stdout.write(f'v{version} {size:>6}B  encrypt {encrypt * 1e6:>9.1f}us  decrypt {decrypt * 1e6:>9.1f}us')
+
+            v1, v2 = results[AES256.V1], results[AES256.V2]
+            self.stdout.write(f'speedup {size:>6}B  encrypt {v1[0] / v2[0]:.1f}x, decrypt {v1[1] / v2[1]:.1f}x')
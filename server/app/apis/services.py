@@ -2,10 +2,15 @@ from .models import Api
 from common.debug.log import Log
 from common.utils import generator
 from constants.keys import Keys
-from common.platform.security import AES256
+import time
+import threading
+from collections import OrderedDict
+from common.platform.security import AES256, KeyedHash
 from django.conf import settings
 from ..project.models import Project
 from ..project.services import ProjectService
+from common.utils.query import nested
+from common.platform.products import Product
 
 
 
@@ -14,18 +19,26 @@ from ..project.services import ProjectService
 class ApiService:
     '''Api Service'''
 
+    # relations read by to_json
+    RELATED = nested('project', ProjectService.RELATED)
+
+    @staticmethod
+    def queryset():
+        return Api.objects.select_related(*ApiService.RELATED)
+
     @staticmethod
     def create_project_api(user, project_id: str, data: dict):
-        project = Project.objects.get(id=project_id, user=user)
+        project = ProjectService.queryset().get(id=project_id, user=user)
 
         if Api.objects.filter(project=project, product=data.get('product')).exists():
             raise Exception('Your can create only one Api for one Product in each Project.')
 
-        api_key = Keys.GENERATED_API_KEY_PREFIX + generator.generate_password_key(Keys.GENERATED_API_KEY_SIZE)
-        api_key = AES256(settings.SERVER_ENC_KEY).encrypt(api_key)
+        raw_api_key = Keys.GENERATED_API_KEY_PREFIX + generator.generate_password_key(Keys.GENERATED_API_KEY_SIZE)
+        api_key = AES256(settings.SERVER_ENC_KEY).encrypt(raw_api_key)
         project_api = Api.objects.create(
             project=project, 
             api_key=api_key, 
+            api_key_hash=ApiKeyService.hash(raw_api_key),
             product=data.get('product'), 
             type=data.get('type')
         )
@@ -33,8 +46,7 @@ class ApiService:
     
     @staticmethod
     def list_project_apis(user, project_id: str):
-        project = Project.objects.get(id=project_id, user=user)
-        project_apis_query = Api.objects.filter(project=project)
+        project_apis_query = ApiService.queryset().filter(project__id=project_id, project__user=user)
         project_apis = [ApiService.to_json(api) for api in project_apis_query]
         return project_apis
 
@@ -42,7 +54,7 @@ class ApiService:
     def view_project_api(user, project_id, project_api_id):
         project = Project.objects.get(id=project_id, user=user)
         project_api = Api.objects.get(id=project_api_id, project=project)
-        api_key = AES256(settings.SERVER_ENC_KEY).decrypt(project_api.api_key)
+        api_key = ApiService.decrypt_api_key(project_api)
         return api_key
 
     @staticmethod
@@ -50,11 +62,21 @@ class ApiService:
         project = Project.objects.get(id=project_id, user=user)
         Api.objects.get(id=project_api_id, project=project).delete()
     
+    @staticmethod
+    def decrypt_api_key(project_api: Api) -> str:
+        api_key, upgraded = AES256(settings.SERVER_ENC_KEY).decrypt_and_upgrade(project_api.api_key)
+
+        # re-encrypting older cipher version on read
+        if upgraded is not None:
+            Api.objects.filter(pk=project_api.pk).update(api_key=upgraded)
+            project_api.api_key = upgraded
+        return api_key
+
     @staticmethod
     def to_json(project_api: Api, decrypt_api=False):
         api_key = project_api.api_key
         if decrypt_api:
-            api_key = AES256(settings.SERVER_ENC_KEY).decrypt(project_api.api_key)
+            api_key = ApiService.decrypt_api_key(project_api)
 
         return {
             'id': project_api.pk,
@@ -66,4 +88,89 @@ class ApiService:
             'hitsCount': project_api.hits_count,
             'updatedon': project_api.updated_on,
             'createdon': project_api.created_on
-        }
\ No newline at end of file
+        }
+
+
+
+
+class ApiKeyService:
+    '''Api Key lookup service, resolves presented api keys through keyed hash index with an in-process cache'''
+
+    __lock = threading.Lock()
+    __entries = OrderedDict()
+
+    @staticmethod
+    def hash(api_key: str) -> str:
+        return KeyedHash.digest(api_key, getattr(settings, 'API_KEY_HASH_KEY', None) or settings.SERVER_ENC_KEY)
+
+    @staticmethod
+    def resolve(api_key: str) -> dict:
+        '''returns {id, project_id, product, product_id} of api of presented key, product is its chatbot or emform, raises Api.DoesNotExist'''
+        key_hash = ApiKeyService.hash(api_key)
+        now = time.monotonic()
+
+        with ApiKeyService.__lock:
+            entry = ApiKeyService.__entries.get(key_hash)
+            if entry is not None and entry[0] > now:
+                ApiKeyService.__entries.move_to_end(key_hash)
+                return dict(entry[1])
+
+        # caching plain values, model instances would carry their loaded relations for the lifetime of the entry
+        api = Api.objects.filter(api_key_hash=key_hash).values('id', 'project_id', 'product', 'chatbot__id', 'emform__id').get()
+        resolved = {
+            'id': api['id'],
+            'project_id': api['project_id'],
+            'product': api['product'],
+            'product_id': api['chatbot__id'] if api['product'] == Product.chatbot.name else api['emform__id']
+        }
+
+        with ApiKeyService.__lock:
+            ApiKeyService.__entries[key_hash] = (now + settings.API_KEY_LOOKUP_CACHE_SECONDS, resolved)
+            ApiKeyService.__entries.move_to_end(key_hash)
+            while len(ApiKeyService.__entries) > settings.API_KEY_LOOKUP_CACHE_SIZE:
+                ApiKeyService.__entries.popitem(last=False)
+        return dict(resolved)
+
+    @staticmethod
+    def api_id(request, api_id=None):
+        '''returns id of api whose key authenticated request, else api_id sent by external server, raises Api.DoesNotExist when they differ'''
+        api = getattr(request, 'api', None)
+        if api is None:
+            return api_id
+        if api_id is not None and api_id != api['id']:
+            raise Api.DoesNotExist('Api key is not of this api.')
+        return api['id']
+
+    @staticmethod
+    def __forget_where(matches):
+        with ApiKeyService.__lock:
+            for key_hash in [key_hash for key_hash, (_, resolved) in ApiKeyService.__entries.items() if matches(resolved)]:
+                del ApiKeyService.__entries[key_hash]
+
+    @staticmethod
+    def forget(key_hash: str):
+        with ApiKeyService.__lock:
+            ApiKeyService.__entries.pop(key_hash, None)
+
+    @staticmethod
+    def forget_api(api_id: int):
+        '''drops cached lookups of api, other workers see the change once their entry expires'''
+        ApiKeyService.__forget_where(lambda resolved: resolved['id'] == api_id)
+
+    @staticmethod
+    def forget_project(project_id):
+        ApiKeyService.__forget_where(lambda resolved: resolved['project_id'] == project_id)
+
+    @staticmethod
+    def backfill(batch_size: int = 500) -> int:
+        '''fills keyed hash of apis created before the index existed, returns number of apis updated'''
+        aes = AES256(settings.SERVER_ENC_KEY)
+        updated = 0
+        while True:
+            apis = list(Api.objects.filter(api_key_hash__isnull=True).only('id', 'api_key')[:batch_size])
+            if not apis:
+                return updated
+            for api in apis:
+                api.api_key_hash = ApiKeyService.hash(aes.decrypt(api.api_key))
+            Api.objects.bulk_update(apis, ['api_key_hash'])
+            updated += len(apis)
@@ -0,0 +1,30 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from ..project.models import Project
+from ..chatbot.models import Chatbot
+from ..emforms.models import Emform
+from .models import Api
+from .services import ApiKeyService
+
+
+# dropping cached api key lookups whenever api is changed or removed
+@receiver(post_save, sender=Api)
+@receiver(post_delete, sender=Api)
+def forget_api_key(sender, instance: Api, **kwargs):
+    if instance.api_key_hash:
+        ApiKeyService.forget(instance.api_key_hash)
+
+
+# lookups carry the product of api, and are dropped with its project
+@receiver(post_save, sender=Chatbot)
+@receiver(post_delete, sender=Chatbot)
+@receiver(post_save, sender=Emform)
+@receiver(post_delete, sender=Emform)
+def forget_product_api_key(sender, instance, **kwargs):
+    ApiKeyService.forget_api(instance.api_id)
+
+
+@receiver(post_save, sender=Project)
+@receiver(post_delete, sender=Project)
+def forget_project_api_keys(sender, instance: Project, **kwargs):
+    ApiKeyService.forget_project(instance.pk)
@@ -1,3 +1,74 @@
 from django.test import TestCase
+from rest_framework.test import APIClient
+from common.platform.products import Product
+from ..account.models import User
+from ..project.models import Project
+from ..chatbot.models import Chatbot
+from .models import Api
+from .services import ApiService, ApiKeyService
 
-# Create your tests here.
+
+class QueryCountTest(TestCase):
+    '''Listing apis runs a fixed number of queries whatever the number of rows.'''
+
+    def setUp(self):
+        self.user = User.objects.create(email='ada@example.com', username='ada1234', photo='profile/photo/ada.png', is_active=True)
+        self.project = Project.objects.create(user=self.user, name='project')
+
+    def test_list_project_apis(self):
+        Api.objects.create(project=self.project, product=Product.chatbot.name, type='QNA')
+        with self.assertNumQueries(1):
+            self.assertEqual(len(ApiService.list_project_apis(self.user, self.project.id)), 1)
+
+        for _ in range(4):
+            Api.objects.create(project=self.project, product=Product.emforms.name, type='QNA')
+        with self.assertNumQueries(1):
+            self.assertEqual(len(ApiService.list_project_apis(self.user, self.project.id)), 5)
+
+
+class ApiKeyTest(TestCase):
+    '''Api keys resolve to plain api values through a cache dropped when the api, its product or its project changes.'''
+
+    def setUp(self):
+        self.user = User.objects.create(email='ada@example.com', username='ada1234', photo='profile/photo/ada.png', is_active=True)
+        self.project = Project.objects.create(user=self.user, name='project')
+        api = ApiService.create_project_api(self.user, self.project.pk, {'product': Product.chatbot.name, 'type': 'QNA'})
+        self.api = Api.objects.get(pk=api['id'])
+        self.api_key = ApiService.view_project_api(self.user, self.project.pk, self.api.pk)
+        self.chatbot = Chatbot.objects.create(api=self.api, name='bot', photo='chatbot/photo/bot.gif', engine='C-QnA', knowledge='We open at 9am.')
+        Api.objects.filter(pk=self.api.pk).update(config_id=self.chatbot.pk)
+
+    def test_resolve(self):
+        with self.assertNumQueries(1):
+            resolved = ApiKeyService.resolve(self.api_key)
+        self.assertEqual(resolved, {'id': self.api.pk, 'project_id': self.project.pk, 'product': Product.chatbot.name, 'product_id': self.chatbot.pk})
+
+        # cached, and callers cannot change the cached values
+        resolved['id'] = 0
+        with self.assertNumQueries(0):
+            self.assertEqual(ApiKeyService.resolve(self.api_key)['id'], self.api.pk)
+
+        with self.assertRaises(Api.DoesNotExist):
+            ApiKeyService.resolve('unknown')
+
+    def test_forget(self):
+        for instance, field in ((self.chatbot, 'name'), (self.project, 'name'), (self.api, 'type')):
+            ApiKeyService.resolve(self.api_key)
+            setattr(instance, field, 'AI')
+            instance.save()
+            with self.assertNumQueries(1):
+                ApiKeyService.resolve(self.api_key)
+
+        self.chatbot.delete()
+        self.assertIsNone(ApiKeyService.resolve(self.api_key)['product_id'])
+
+    def test_qna_answer(self):
+        client = APIClient()
+        response = client.post('/api/chatbot/v1/qna/answer/', {'question': 'when do you open'}, format='json', HTTP_PAK=self.api_key)
+        self.assertEqual(response.data['data']['answer'], 'We open at 9am.')
+
+        # the key only answers for its own api
+        response = client.post('/api/chatbot/v1/qna/answer/', {'api_id': 0, 'question': 'when do you open'}, format='json', HTTP_PAK=self.api_key)
+        self.assertFalse(response.data['success'])
+        response = client.post('/api/chatbot/v1/qna/answer/', {'question': 'when do you open'}, format='json', HTTP_PAK='unknown')
+        self.assertEqual(response.status_code, 401)
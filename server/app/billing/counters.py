@@ -0,0 +1,123 @@
+import atexit
+import threading
+from collections import defaultdict
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.dispatch import Signal
+from common.debug.log import Log
+from ..apis.models import Api
+from ..project.models import Project
+
+
+# sent with api_ids and project_ids whose counters were written, counters are written with F() updates that send no post_save
+counters_applied = Signal()
+
+
+
+class HitCounter:
+    '''
+    Write-behind Api hit counter. Hits and the price they add to their project accumulate in memory per worker
+    and are flushed periodically as F() increments, grouped into one UPDATE per distinct delta,
+    so concurrent workers never lose hits.
+    '''
+    __lock = threading.Lock()
+    __pending = defaultdict(int)
+    __pending_price = defaultdict(float)
+    __flusher = None
+    __stop = threading.Event()
+
+    @staticmethod
+    def __interval() -> float:
+        return getattr(settings, 'HIT_COUNTER_FLUSH_SECONDS', 5)
+
+    @staticmethod
+    def __start_flusher():
+        if HitCounter.__flusher is not None:
+            return
+
+        with HitCounter.__lock:
+            if HitCounter.__flusher is not None:
+                return
+            HitCounter.__flusher = threading.Thread(target=HitCounter.__run, name='hit-counter-flusher', daemon=True)
+            HitCounter.__flusher.start()
+            atexit.register(HitCounter.shutdown)
+
+    @staticmethod
+    def __run():
+        while not HitCounter.__stop.wait(HitCounter.__interval()):
+            HitCounter.flush()
+
+    @staticmethod
+    def hit(api_id: int, project_id: str, price: float, count: int = 1):
+        if HitCounter.__interval() <= 0:
+            # write-through when buffering is disabled
+            with transaction.atomic():
+                HitCounter.apply({api_id: count}, {project_id: price * count})
+            return
+
+        with HitCounter.__lock:
+            HitCounter.__pending[api_id] += count
+            HitCounter.__pending_price[project_id] += price * count
+        HitCounter.__start_flusher()
+
+    @staticmethod
+    def pending(api_id: int) -> int:
+        '''returns hits of api not yet flushed by this worker'''
+        with HitCounter.__lock:
+            return HitCounter.__pending.get(api_id, 0)
+
+    @staticmethod
+    def pending_price(project_id: str) -> float:
+        '''returns price added to project by hits not yet flushed by this worker'''
+        with HitCounter.__lock:
+            return HitCounter.__pending_price.get(project_id, 0)
+
+    @staticmethod
+    def flush() -> int:
+        '''writes pending hits to database, returns number of hits flushed'''
+        with HitCounter.__lock:
+            if not HitCounter.__pending and not HitCounter.__pending_price:
+                return 0
+            pending = dict(HitCounter.__pending)
+            pending_price = dict(HitCounter.__pending_price)
+            HitCounter.__pending.clear()
+            HitCounter.__pending_price.clear()
+
+        try:
+            with transaction.atomic():
+                HitCounter.apply(pending, pending_price)
+        except Exception as e:
+            Log.error(e)
+            # putting hits back so they are retried with next flush
+            with HitCounter.__lock:
+                for api_id, count in pending.items():
+                    HitCounter.__pending[api_id] += count
+                for project_id, price in pending_price.items():
+                    HitCounter.__pending_price[project_id] += price
+            return 0
+
+        return sum(pending.values())
+
+    @staticmethod
+    def apply(hits: dict, prices: dict):
+        '''writes api hit and project price deltas, one F() update per distinct delta, callers own the transaction'''
+        groups = defaultdict(list)
+        for api_id, count in hits.items():
+            groups[count].append(api_id)
+        price_groups = defaultdict(list)
+        for project_id, price in prices.items():
+            price_groups[price].append(project_id)
+
+        for count, api_ids in groups.items():
+            Api.objects.filter(pk__in=api_ids).update(hits_count=F('hits_count') + count)
+        for price, project_ids in price_groups.items():
+            Project.objects.filter(pk__in=project_ids).update(price_to_pay=F('price_to_pay') + price)
+        if hits or prices:
+            counters_applied.send(sender=HitCounter, api_ids=list(hits), project_ids=list(prices))
+
+    @staticmethod
+    def shutdown():
+        '''stops flusher and writes remaining hits'''
+        HitCounter.__stop.set()
+        HitCounter.flush()
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from ...services import BillingService
+
+
+class Command(BaseCommand):
+    help = 'Recomputes project prices from api hits and reports (or fixes) drifted totals.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fix', action='store_true', help='Overwrite drifted totals with recomputed prices.')
+        parser.add_argument('--tolerance', type=float, default=0.01, help='Allowed difference before a total counts as drifted.')
+        parser.add_argument('--enqueue', action='store_true', help='Queue the reconcile for the task worker instead of running it here.')
+
+    def handle(self, *args, **options):
+        if options['enqueue']:
+            task = BillingService.schedule_reconcile(fix=options['fix'], tolerance=options['tolerance'])
+            self.stdout.write(f"Reconcile queued as task {task.pk}." if task else "Reconcile ran inline, task queue is disabled.")
+            return
+
+        drifted = BillingService.reconcile(fix=options['fix'], tolerance=options['tolerance'])
+        for d in drifted:
+            self.stdout.write(f"{d['id']}: stored {d['priceToPay']} computed {d['computed']}")
+        self.stdout.write(f"{len(drifted)} project(s) drifted{' and fixed' if options['fix'] and drifted else ''}.")
@@ -1,27 +1,100 @@
+from collections import defaultdict
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Case, When, F, Value, Sum, FloatField
+from django.db.models.functions import Coalesce
 from ..project.models import Project
 from ..apis.models import Api
 from common.platform.products import Product
 from common.debug.log import Log
+from ..tasks.services import TaskService
+from .counters import HitCounter
 
 
 
 
 class BillingService:
+    @staticmethod
+    def __project_id(project_id):
+        try:
+            return Project._meta.pk.to_python(project_id)
+        except ValidationError:
+            return None
+
     @staticmethod
     def update_billing(project_id, api_id):
-        project = Project.objects.get(id=project_id)
-        api = Api.objects.get(id=api_id, project=project)
+        api = Api.objects.select_related('project').get(id=api_id, project__id=project_id)
+        project = api.project
         if api.product == Product.chatbot.name or api.product == Product.emforms.name:
-            api.hits_count = api.hits_count + 1
-            api.save()
-        apis = Api.objects.filter(project=project)
-        api_price = 0
-        for a in apis:
-            price = Product.chatbot.price if a.product == Product.chatbot.name else Product.emforms.price
-            api_price = api_price + (a.hits_count * price)
-        project.price_to_pay = round(api_price, 2)
-        project.save()
-        return project.price_to_pay
+            # adding unit price of the hit product instead of recomputing every api of project
+            HitCounter.hit(api.pk, project.pk, Product.price_of(api.product))
+        price_to_pay = project.price_to_pay + HitCounter.pending_price(project.pk)
+        return round(price_to_pay, 2)
+
+    @staticmethod
+    def apply_usage(usage: list) -> dict:
+        '''applies batch of {project_id, api_id, count} hits with grouped updates, returns new price to pay per project'''
+        api_ids = {u['api_id'] for u in usage}
+        apis = {api.pk: api for api in Api.objects.filter(pk__in=api_ids).only('id', 'project_id', 'product')}
+
+        # project ids as stored, so ids sent in another case or with lookalike characters still match
+        project_ids = {u['project_id']: BillingService.__project_id(u['project_id']) for u in usage}
+
+        hits = defaultdict(int)
+        prices = defaultdict(float)
+        for u in usage:
+            api = apis.get(u['api_id'])
+            if api is None or api.project_id != project_ids[u['project_id']]:
+                raise Exception(f"No Api {u['api_id']} found in project {u['project_id']}.")
+            if api.product == Product.chatbot.name or api.product == Product.emforms.name:
+                hits[api.pk] += u['count']
+                prices[api.project_id] += Product.price_of(api.product) * u['count']
+
+        HitCounter.apply(hits, prices)
+
+        rows = Project.objects.filter(id__in=set(project_ids.values())).values_list('id', 'price_to_pay')
+        return {id: round(price_to_pay + HitCounter.pending_price(id), 2) for id, price_to_pay in rows}
+
+    @staticmethod
+    def compute_prices(project_ids=None) -> dict:
+        '''returns price to pay of projects recomputed from api hits with a single aggregate query'''
+        price = Case(
+            When(api__product=Product.chatbot.name, then=F('api__hits_count') * Value(Product.chatbot.price)),
+            default=F('api__hits_count') * Value(Product.emforms.price),
+            output_field=FloatField()
+        )
+        projects = Project.objects.all()
+        if project_ids is not None:
+            projects = projects.filter(id__in=project_ids)
+        rows = projects.annotate(computed=Coalesce(Sum(price), Value(0.0))).values_list('id', 'price_to_pay', 'computed')
+        return {id: (price_to_pay, round(computed, 2)) for id, price_to_pay, computed in rows}
+
+    @staticmethod
+    def reconcile(fix: bool = False, tolerance: float = 0.01) -> list:
+        '''returns projects whose stored price drifted from recomputed price, fixes them if asked'''
+        HitCounter.flush()
+        drifted = []
+        for id, (price_to_pay, computed) in BillingService.compute_prices().items():
+            if abs(price_to_pay - computed) > tolerance:
+                drifted.append({'id': id, 'priceToPay': price_to_pay, 'computed': computed})
+
+        if fix and drifted:
+            # drifted projects are locked and recomputed before writing, so a flush committing between
+            # the check and the write waits for the lock instead of having its delta overwritten.
+            # hits and prices of a flush commit together, so hits still buffered by other workers never show as drift
+            with transaction.atomic():
+                ids = list(Project.objects.select_for_update().filter(id__in=[d['id'] for d in drifted]).order_by('id').values_list('id', flat=True))
+                Project.objects.bulk_update(
+                    [Project(id=id, price_to_pay=computed) for id, (price_to_pay, computed) in BillingService.compute_prices(ids).items() if abs(price_to_pay - computed) > tolerance],
+                    ['price_to_pay'],
+                    batch_size=500
+                )
+        return drifted
+
+    @staticmethod
+    def schedule_reconcile(fix: bool = False, tolerance: float = 0.01, delay: float = None):
+        '''queues reconcile to run on the task worker instead of the calling thread'''
+        return TaskService.enqueue('billing.reconcile', {'fix': fix, 'tolerance': tolerance}, delay=delay)
     
     @staticmethod
     def get_billing(user):
@@ -0,0 +1,8 @@
+from ..tasks.services import TaskService
+from .services import BillingService
+
+
+# recomputing project prices, one at a time as every run scans all projects
+@TaskService.register('billing.reconcile', concurrency=1, max_attempts=3)
+def reconcile(fix: bool = False, tolerance: float = 0.01):
+    BillingService.reconcile(fix=fix, tolerance=tolerance)
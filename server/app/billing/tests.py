@@ -1,3 +1,126 @@
-from django.test import TestCase
+import threading
+from unittest import mock
+from django.test import TestCase, override_settings
+from common.platform.products import Product
+from ..account.models import User
+from ..project.models import Project
+from ..apis.models import Api
+from .counters import HitCounter
+from .services import BillingService
 
-# Create your tests here.
+
+# long interval, so the flusher thread started by hit() stays idle and the test drives the flushes
+@override_settings(HIT_COUNTER_FLUSH_SECONDS=3600)
+class HitCounterStressTest(TestCase):
+    '''No hit is lost while many threads hit and flushes run and fail concurrently.'''
+
+    THREADS = 8
+    HITS = 2000
+
+    def setUp(self):
+        HitCounter.flush()
+        user = User.objects.create(email='ada@example.com', username='ada1234')
+        self.projects = [Project.objects.create(user=user, name=f'project {i}') for i in range(2)]
+        self.apis = [
+            Api.objects.create(project=project, product=product, type='QNA')
+            for project in self.projects
+            for product in (Product.chatbot.name, Product.emforms.name)
+        ]
+
+    def __hitter(self, seed: int, start: threading.Barrier):
+        start.wait()
+        for i in range(self.HITS):
+            api = self.apis[(seed + i) % len(self.apis)]
+            HitCounter.hit(api.pk, api.project_id, Product.price_of(api.product), count=1 + i % 3)
+
+    def test_no_hits_lost(self):
+        apply = HitCounter.apply
+        calls = [0]
+
+        # the first and every third flush after it fail after writing part of their deltas, so their transaction is rolled back
+        def failing_apply(hits, prices):
+            calls[0] += 1
+            if calls[0] % 3 == 1:
+                apply(hits, {})
+                raise RuntimeError('database unavailable')
+            apply(hits, prices)
+
+        start = threading.Barrier(self.THREADS)
+        threads = [threading.Thread(target=self.__hitter, args=(seed, start)) for seed in range(self.THREADS)]
+        with mock.patch.object(HitCounter, 'apply', side_effect=failing_apply), mock.patch('app.billing.counters.Log'):
+            for thread in threads:
+                thread.start()
+            while any(thread.is_alive() for thread in threads):
+                HitCounter.flush()
+            for thread in threads:
+                thread.join()
+            # failures never come twice in a row, so two flushes write whatever is left
+            HitCounter.flush()
+            HitCounter.flush()
+
+        # expected totals of the same hits
+        hits = {api.pk: 0 for api in self.apis}
+        prices = {project.pk: 0.0 for project in self.projects}
+        for seed in range(self.THREADS):
+            for i in range(self.HITS):
+                api = self.apis[(seed + i) % len(self.apis)]
+                hits[api.pk] += 1 + i % 3
+                prices[api.project_id] += Product.price_of(api.product) * (1 + i % 3)
+
+        self.assertGreaterEqual(calls[0], 2)
+        for api in Api.objects.all():
+            self.assertEqual(api.hits_count, hits[api.pk])
+            self.assertEqual(HitCounter.pending(api.pk), 0)
+        for project in Project.objects.all():
+            # float sums of the same deltas in another order, exact to far below a cent
+            self.assertAlmostEqual(project.price_to_pay, prices[project.pk], places=6)
+
+
+class ReconcileTest(TestCase):
+    '''Reconciling fixes drifted prices without overwriting hits flushed meanwhile.'''
+
+    def setUp(self):
+        user = User.objects.create(email='ada@example.com', username='ada1234')
+        self.project = Project.objects.create(user=user, name='project', price_to_pay=99)
+        self.api = Api.objects.create(project=self.project, product=Product.chatbot.name, type='QNA', hits_count=10)
+
+    def test_fix(self):
+        drifted = BillingService.reconcile(fix=True)
+        self.assertEqual([d['id'] for d in drifted], [self.project.pk])
+        self.assertAlmostEqual(Project.objects.get(pk=self.project.pk).price_to_pay, 10 * Product.chatbot.price)
+        self.assertEqual(BillingService.reconcile(), [])
+
+    def test_fix_with_concurrent_flush(self):
+        compute_prices = BillingService.compute_prices
+        calls = [0]
+
+        # another worker flushes 5 hits right after the drift check
+        def flushing_compute_prices(project_ids=None):
+            prices = compute_prices(project_ids)
+            calls[0] += 1
+            if calls[0] == 1:
+                HitCounter.apply({self.api.pk: 5}, {self.project.pk: 5 * Product.chatbot.price})
+            return prices
+
+        with mock.patch.object(BillingService, 'compute_prices', side_effect=flushing_compute_prices):
+            BillingService.reconcile(fix=True)
+        self.assertAlmostEqual(Project.objects.get(pk=self.project.pk).price_to_pay, 15 * Product.chatbot.price)
+
+
+class ApplyUsageTest(TestCase):
+    '''Usage batches match projects by id whatever the case of the id sent.'''
+
+    def setUp(self):
+        user = User.objects.create(email='ada@example.com', username='ada1234')
+        self.project = Project.objects.create(user=user, name='project')
+        self.api = Api.objects.create(project=self.project, product=Product.chatbot.name, type='QNA')
+
+    def test_lowercase_project_id(self):
+        prices = BillingService.apply_usage([{'project_id': self.project.pk.lower(), 'api_id': self.api.pk, 'count': 2}])
+        self.assertAlmostEqual(prices[self.project.pk], round(2 * Product.chatbot.price, 2))
+        self.assertEqual(Api.objects.get(pk=self.api.pk).hits_count, 2)
+
+    def test_unknown_project_id(self):
+        for project_id in ('missing', Project._meta.pk.default()):
+            with self.assertRaises(Exception):
+                BillingService.apply_usage([{'project_id': project_id, 'api_id': self.api.pk, 'count': 1}])
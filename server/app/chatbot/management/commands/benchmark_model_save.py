@@ -0,0 +1,79 @@
+import time
+import random
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from common.utils.models import DirtyFieldsMixin
+from ...models import Chatbot
+from ....account.models import User
+from ....project.models import Project
+from ....apis.models import Api
+
+WORDS = ('open', 'hours', 'refund', 'order', 'delivery', 'support', 'account', 'price', 'plan', 'billing')
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Benchmarks saving one changed field of chatbots with large knowledge, tracked (changed columns) against full saves.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=200, help='Chatbots to update.')
+        parser.add_argument('--knowledge-kb', type=int, default=256, help='Knowledge size of each chatbot in KB.')
+        parser.add_argument('--config-kb', type=int, default=32, help='Config json size of each chatbot in KB.')
+
+    # saves every chatbot with a new name, returns seconds of saves and of chatbot UPDATE statements and bytes sent
+    def __measure(self, ids: list, save) -> tuple:
+        updates = [0, 0.0, 0]
+
+        def recorder(execute, sql, params, many, context):
+            if not sql.startswith('UPDATE "chatbot_chatbot"'):
+                return execute(sql, params, many, context)
+            started = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                updates[0] += 1
+                updates[1] += time.perf_counter() - started
+                updates[2] += len(sql) + sum(len(str(param)) for param in params or ())
+
+        chatbots = list(Chatbot.objects.filter(pk__in=ids))
+        with connection.execute_wrapper(recorder):
+            started = time.perf_counter()
+            for i, chatbot in enumerate(chatbots):
+                chatbot.name = f'bot {i} {time.perf_counter_ns() % 1000}'
+                save(chatbot)
+            elapsed = time.perf_counter() - started
+        return elapsed, updates
+
+    def handle(self, *args, **options):
+        rng = random.Random(3)
+        knowledge = ' '.join(rng.choice(WORDS) for _ in range(options['knowledge_kb'] * 1024 // 6))
+        config = {'faq': [{'q': ' '.join(rng.choice(WORDS) for _ in range(8)), 'a': ' '.join(rng.choice(WORDS) for _ in range(20))} for _ in range(options['config_kb'] * 1024 // 200)]}
+
+        # everything runs in one transaction rolled back at the end, so no rows and no on-commit work are left behind
+        try:
+            with transaction.atomic():
+                user = User.objects.create(email='benchmark-save@example.com', username='benchmark-save')
+                project = Project.objects.create(user=user, name='benchmark')
+                ids = []
+                for i in range(options['rows']):
+                    api = Api.objects.create(project=project, product='CHATBOT', type='AI', api_key_hash=f'benchmark-save-{i}')
+                    ids.append(Chatbot.objects.create(api=api, name=f'bot {i}', engine='OpenAI-ChatGPT', knowledge=knowledge, config=config).pk)
+
+                results = {
+                    'full': self.__measure(ids, lambda chatbot: super(DirtyFieldsMixin, chatbot).save()),
+                    'tracked': self.__measure(ids, lambda chatbot: chatbot.save()),
+                }
+                raise Rollback()
+        except Rollback:
+            pass
+
+        rows = options['rows']
+        for label, (elapsed, (count, update_seconds, sent)) in results.items():
+            self.stdout.write(
+                f'{label:<8} {rows / elapsed:>8,.0f} saves/s  UPDATE {update_seconds / count * 1e3:.3f}ms '
+                f'and {sent / count / 1024:,.1f}KB each'
+            )
+        self.stdout.write(f"speedup  {results['full'][0] / results['tracked'][0]:.2f}x saves, {results['full'][1][1] / results['tracked'][1][1]:.2f}x UPDATE")
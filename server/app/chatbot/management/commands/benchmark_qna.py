@@ -0,0 +1,63 @@
+import time
+import random
+import numpy as np
+from django.core.management.base import BaseCommand
+from ...qna import KnowledgeIndexer
+
+SIZES = {'KB': 1024, 'MB': 1024 * 1024}
+
+
+# returns synthetic knowledge of about size bytes drawn from a zipf distributed vocabulary
+def _knowledge(size: int, vocabulary: list, seed: int = 7) -> str:
+    rng = np.random.default_rng(seed)
+    ranks = np.minimum(rng.zipf(1.2, size // 5), len(vocabulary)) - 1
+    words = [vocabulary[r] for r in ranks]
+    sentences = [' '.join(words[i:i + 12]) + '.' for i in range(0, len(words), 12)]
+    return ' '.join(sentences)[:size]
+
+
+def _size(value: str) -> int:
+    value = value.strip().upper()
+    for unit, multiplier in SIZES.items():
+        if value.endswith(unit):
+            return int(float(value[:-len(unit)]) * multiplier)
+    return int(value)
+
+
+class Command(BaseCommand):
+    help = 'Benchmarks C-QnA index build, rebuild, index size and answer latency over synthetic knowledge bases.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='10KB,100KB,1MB,10MB,50MB', help='Comma separated knowledge sizes.')
+        parser.add_argument('--questions', type=int, default=1000, help='Questions answered per size.')
+
+    def handle(self, *args, **options):
+        random.seed(7)
+        vocabulary = [''.join(random.choices('abcdefghijklmnopqrstuvwxyz', k=random.randint(3, 10))) for _ in range(50000)]
+        questions = [' '.join(random.choices(vocabulary[:5000], k=random.randint(3, 8))) for _ in range(options['questions'])]
+
+        for value in options['sizes'].split(','):
+            size = _size(value)
+            knowledge = _knowledge(size, vocabulary)
+            indexer = KnowledgeIndexer()
+
+            started = time.perf_counter()
+            index = indexer.build(1, 1, knowledge)
+            build = time.perf_counter() - started
+
+            # appending a paragraph, as an owner editing knowledge would
+            started = time.perf_counter()
+            index = indexer.build(1, 2, knowledge + '\n\n' + _knowledge(2048, vocabulary, seed=11))
+            rebuild = time.perf_counter() - started
+
+            latencies = []
+            for question in questions:
+                started = time.perf_counter()
+                index.search(question)
+                latencies.append((time.perf_counter() - started) * 1000)
+            p50, p99 = np.percentile(latencies, [50, 99])
+
+            self.stdout.write(
+                f'{value.strip():>6}: {len(index.chunks)} chunks, {index.nbytes() / 1024 / 1024:.1f}MB, build {build:.2f}s, rebuild {rebuild:.2f}s, '
+                f'answer p50 {p50:.3f}ms p99 {p99:.3f}ms'
+            )
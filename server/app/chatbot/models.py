@@ -1,9 +1,10 @@
 from django.db import models
 from common.platform.products import Product
+from common.utils.models import DirtyFieldsMixin
 
 
 # chatbot model
-class Chatbot(models.Model):
+class Chatbot(DirtyFieldsMixin, models.Model):
     api = models.OneToOneField("apis.Api", on_delete=models.CASCADE)
     type = models.CharField(default='', choices=Product.chatbot.types_model_choices, max_length=20)
     name = models.CharField(default='', max_length=20)
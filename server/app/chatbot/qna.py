@@ -0,0 +1,227 @@
+import re
+import sys
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+import numpy as np
+
+
+STOPWORDS = frozenset((
+    'a', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'for', 'from', 'has', 'have', 'how', 'i', 'in', 'is', 'it',
+    'its', 'of', 'on', 'or', 'that', 'the', 'this', 'to', 'was', 'were', 'what', 'when', 'where', 'which', 'who',
+    'why', 'will', 'with', 'you', 'your', 'can', 'do', 'does', 'me', 'my', 'we', 'our'
+))
+SUFFIXES = ('ing', 'ed', 'es', 's')
+TOKEN_PATTERN = re.compile(r'[a-z0-9]+')
+PARAGRAPH_PATTERN = re.compile(r'\n\s*\n')
+SENTENCE_PATTERN = re.compile(r'(?<=[.!?])\s+')
+
+
+# returns token with common english suffix removed, so that "opens" and "open" match
+def _stem(token: str) -> str:
+    if len(token) > 4:
+        for suffix in SUFFIXES:
+            if token.endswith(suffix):
+                return token[:-len(suffix)]
+    return token
+
+
+# returns lowercase stemmed word tokens of text without stopwords
+def tokenize(text: str) -> list:
+    return [_stem(token) for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOPWORDS]
+
+
+# returns text split into chunks of about chunk_words words, breaking on sentence boundaries and never across paragraphs
+def chunk(text: str, chunk_words: int = 80) -> list:
+    chunks = []
+    for paragraph in PARAGRAPH_PATTERN.split(text):
+        current = []
+        words = 0
+        for sentence in SENTENCE_PATTERN.split(paragraph):
+            sentence = ' '.join(sentence.split())
+            if not sentence:
+                continue
+            current.append(sentence)
+            words += sentence.count(' ') + 1
+            if words >= chunk_words:
+                chunks.append(' '.join(current))
+                current = []
+                words = 0
+        if current:
+            chunks.append(' '.join(current))
+    return chunks
+
+
+
+class BM25Index:
+    '''
+    BM25 inverted index over text chunks. Postings are kept in CSR layout (per term offsets into flat
+    chunk id and term frequency arrays) so that scoring a query is a few vectorized NumPy operations.
+    '''
+
+    def __init__(self, chunks: list, tokens: list, k1: float = 1.5, b: float = 0.75):
+        self.chunks = chunks
+        self.k1 = k1
+        self.b = b
+
+        vocabulary = {}
+        term_ids = []
+        chunk_ids = []
+        lengths = np.zeros(len(chunks), dtype=np.float32)
+        for chunk_id, chunk_tokens in enumerate(tokens):
+            lengths[chunk_id] = len(chunk_tokens)
+            for token in chunk_tokens:
+                term_ids.append(vocabulary.setdefault(token, len(vocabulary)))
+                chunk_ids.append(chunk_id)
+
+        self.vocabulary = vocabulary
+        self.lengths = lengths
+        self.avg_length = float(lengths.mean()) if len(chunks) else 0.0
+
+        # counting (term, chunk) pairs, sorted by term so postings of a term are contiguous
+        pairs = np.array(term_ids, dtype=np.int64) * max(len(chunks), 1) + np.array(chunk_ids, dtype=np.int64)
+        pairs, frequencies = np.unique(pairs, return_counts=True)
+        posting_terms = pairs // max(len(chunks), 1)
+        self.posting_chunks = (pairs % max(len(chunks), 1)).astype(np.int32)
+        self.posting_frequencies = frequencies.astype(np.float32)
+        self.offsets = np.searchsorted(posting_terms, np.arange(len(vocabulary) + 1)).astype(np.int64)
+
+        document_frequencies = np.diff(self.offsets).astype(np.float32)
+        self.idf = np.log1p((len(chunks) - document_frequencies + 0.5) / (document_frequencies + 0.5)).astype(np.float32)
+
+        # precomputed per chunk length normalisation of BM25
+        if self.avg_length > 0:
+            self.norms = (k1 * (1 - b + b * lengths / self.avg_length)).astype(np.float32)
+        else:
+            self.norms = np.full(len(chunks), k1, dtype=np.float32)
+
+    def search(self, question: str, top_k: int = 3) -> list:
+        '''returns (chunk, score) of best matching chunks for question'''
+        scores = np.zeros(len(self.chunks), dtype=np.float32)
+        matched = False
+        for token in set(tokenize(question)):
+            term_id = self.vocabulary.get(token)
+            if term_id is None:
+                continue
+            matched = True
+            start, end = self.offsets[term_id], self.offsets[term_id + 1]
+            chunk_ids = self.posting_chunks[start:end]
+            frequencies = self.posting_frequencies[start:end]
+            # chunk ids are unique within one term's postings, so fancy-index accumulation is safe
+            scores[chunk_ids] += self.idf[term_id] * frequencies * (self.k1 + 1) / (frequencies + self.norms[chunk_ids])
+
+        if not matched:
+            return []
+
+        top_k = min(top_k, len(scores))
+        best = np.argpartition(-scores, top_k - 1)[:top_k]
+        best = best[np.argsort(-scores[best])]
+        return [(self.chunks[i], float(scores[i])) for i in best if scores[i] > 0]
+
+    def nbytes(self) -> int:
+        '''returns estimated memory held by the index, chunk text and vocabulary included'''
+        arrays = (self.lengths, self.posting_chunks, self.posting_frequencies, self.offsets, self.idf, self.norms)
+        text = sum(sys.getsizeof(text) for text in self.chunks)
+        # a vocabulary entry costs its key string and its share of the dict
+        vocabulary = sys.getsizeof(self.vocabulary) + sum(sys.getsizeof(token) for token in self.vocabulary)
+        return sum(array.nbytes for array in arrays) + text + vocabulary
+
+
+
+class KnowledgeIndexer:
+    '''
+    LRU of BM25 indexes of chatbot knowledge, bounded by number of indexes and by their estimated size.
+    Large knowledge is indexed on one background thread, so no request waits for a full build.
+    '''
+
+    def __init__(self, chunk_words: int = 80, max_indexes: int = 64, max_bytes: int = 512 * 1024 * 1024):
+        self.chunk_words = chunk_words
+        self.max_indexes = max_indexes
+        self.max_bytes = max_bytes
+        self.__lock = threading.Lock()
+        self.__indexes = OrderedDict()
+        self.__bytes = 0
+        self.__building = {}
+        self.__executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='qna-index')
+
+    @staticmethod
+    def __digest(text: str) -> str:
+        return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+    def get(self, chatbot_id: int, version=None):
+        '''returns index of chatbot if it was built for the given version, or its latest index when version is None'''
+        with self.__lock:
+            entry = self.__indexes.get(chatbot_id)
+            if entry is None or (version is not None and entry['version'] != version):
+                return None
+            self.__indexes.move_to_end(chatbot_id)
+            return entry['index']
+
+    def building(self, chatbot_id: int, version) -> bool:
+        '''returns True while index of chatbot for the given version is being built in background'''
+        with self.__lock:
+            pending = self.__building.get(chatbot_id)
+            return pending is not None and pending[0] == version
+
+    def build(self, chatbot_id: int, version, knowledge: str) -> BM25Index:
+        digest = KnowledgeIndexer.__digest(knowledge)
+
+        # knowledge unchanged, only version moved
+        with self.__lock:
+            previous = self.__indexes.get(chatbot_id)
+            if previous is not None and previous['digest'] == digest:
+                previous['version'] = version
+                return previous['index']
+
+        # tokens are only held while building, keeping them would cost several times the knowledge size
+        chunks = chunk(knowledge, self.chunk_words)
+        index = BM25Index(chunks, [tokenize(text) for text in chunks])
+        size = index.nbytes()
+
+        with self.__lock:
+            current = self.__indexes.get(chatbot_id)
+            # a build of an older version finishing late does not replace a newer index
+            if current is not None and current['version'] > version:
+                return index
+            if current is not None:
+                self.__bytes -= current['bytes']
+            self.__indexes[chatbot_id] = {'version': version, 'digest': digest, 'bytes': size, 'index': index}
+            self.__indexes.move_to_end(chatbot_id)
+            self.__bytes += size
+
+            # evicting least recently used indexes, the one just built is always kept
+            while len(self.__indexes) > 1 and (len(self.__indexes) > self.max_indexes or self.__bytes > self.max_bytes):
+                _, evicted = self.__indexes.popitem(last=False)
+                self.__bytes -= evicted['bytes']
+        return index
+
+    def build_async(self, chatbot_id: int, version, knowledge: str) -> Future:
+        '''builds index on the background thread, a build already queued for the same version is reused'''
+        with self.__lock:
+            pending = self.__building.get(chatbot_id)
+            if pending is not None and pending[0] == version:
+                return pending[1]
+            future = self.__executor.submit(self.__build, chatbot_id, version, knowledge)
+            self.__building[chatbot_id] = (version, future)
+            return future
+
+    def __build(self, chatbot_id: int, version, knowledge: str) -> BM25Index:
+        try:
+            return self.build(chatbot_id, version, knowledge)
+        finally:
+            with self.__lock:
+                pending = self.__building.get(chatbot_id)
+                if pending is not None and pending[0] == version:
+                    del self.__building[chatbot_id]
+
+    def forget(self, chatbot_id: int):
+        with self.__lock:
+            entry = self.__indexes.pop(chatbot_id, None)
+            if entry is not None:
+                self.__bytes -= entry['bytes']
+
+    def stats(self) -> dict:
+        '''returns number and estimated size of cached indexes'''
+        with self.__lock:
+            return {'indexes': len(self.__indexes), 'bytes': self.__bytes, 'building': len(self.__building)}
@@ -1,10 +1,12 @@
 from rest_framework import serializers
+from django.conf import settings
 from .models import Chatbot
 from common.utils import validators
 from common.debug.log import Log
-from ..apis.models import Api
-from ..emforms.models import Emform
+from ..apis.services import ApiService
+from ..emforms.services import EmformService
 from common.platform.products import Product
+from common.utils.query import IdentityMap
 
 
 
@@ -33,11 +35,11 @@ class AddChatbotConfigSerializer(serializers.ModelSerializer):
         data = attrs.get('data')
         user = self.context.get('user')
 
-        if not Api.objects.filter(id=api_id).exists():
+        api = IdentityMap.fetch(ApiService.queryset(), id=api_id)
+        if api is None:
             raise serializers.ValidationError({'api': 'No API found.'})
         
-        api = Api.objects.get(id=api_id)
-        if api.project.user != user or api.product != Product.chatbot.name:
+        if api.project.user_id != user.pk or api.product != Product.chatbot.name:
             raise serializers.ValidationError({'api': 'Invalid api for product.'})
         
         if not validators.atleast_length(name, 3) or not validators.atmost_length(name, 20):
@@ -68,7 +70,7 @@ class AddChatbotConfigSerializer(serializers.ModelSerializer):
         if when_emform is None:
             raise serializers.ValidationError({'emform': 'Invalid emform specification.'})
         
-        if use_emform and not Emform.objects.filter(pk=emform_config_id).exists():
+        if use_emform and IdentityMap.fetch(EmformService.queryset(), pk=emform_config_id) is None:
             raise serializers.ValidationError({'api': 'No Emform found.'})
 
         if config is None or not isinstance(config, dict):
@@ -77,4 +79,12 @@ class AddChatbotConfigSerializer(serializers.ModelSerializer):
         if data is None or not isinstance(data, dict):
             raise serializers.ValidationError({'data': 'Invalid data.'})
 
-        return attrs
\ No newline at end of file
+        return attrs
+
+
+# QnA Question Serializer
+class QnAQuestionSerializer(serializers.Serializer):
+    # taken from the api key when questions are sent with one
+    api_id = serializers.IntegerField(required=False)
+    question = serializers.CharField(max_length=settings.QNA_QUESTION_MAX_LENGTH)
+    top_k = serializers.IntegerField(min_value=1, max_value=10, required=False)
@@ -1,19 +1,36 @@
+import time
+import threading
+from collections import deque
+import numpy as np
+from django.conf import settings
+from django.db.models import F
 from .models import Chatbot
+from .qna import KnowledgeIndexer
 from ..apis.models import Api
 from ..apis.services import ApiService
 from ..emforms.models import Emform
 from ..emforms.services import EmformService
 from common.platform.products import Product
 from common.debug.log import Log
+from common.exception.exceptions import KnowledgeIndexingError
+from common.utils.query import nested, IdentityMap
 
 
 
 class ChatbotService:
+    # relations read by to_json
+    RELATED = nested('api', ApiService.RELATED) + nested('emform', EmformService.RELATED)
+
+    @staticmethod
+    def queryset():
+        return Chatbot.objects.select_related(*ChatbotService.RELATED)
+
     @staticmethod
     def configure(data):
-        api = Api.objects.get(id=data.get('api_id'))
+        # rows loaded by the serializer in this request are reused
+        api = IdentityMap.fetch(ApiService.queryset(), id=data.get('api_id'))
         if data.get('use_emform'):
-            emform = Emform.objects.get(pk=data.get('emform_config_id'))
+            emform = IdentityMap.fetch(EmformService.queryset(), pk=data.get('emform_config_id'))
         else:
             emform = None
         del data['emform_config_id']
@@ -24,8 +41,7 @@ class ChatbotService:
     
     @staticmethod
     def get_configuration(api_id):
-        api = Api.objects.get(id=api_id)
-        chatbot = Chatbot.objects.get(pk=api.config_id, api=api)
+        chatbot = ChatbotService.queryset().get(api__id=api_id, pk=F('api__config_id'))
         return ChatbotService.to_json(chatbot)
     
     @staticmethod
@@ -48,3 +64,86 @@ class ChatbotService:
             'updateon': chatbot.updated_on,
             'createdon': chatbot.created_on
         }
+
+
+
+class ChatbotQnAService:
+    '''Answers questions from chatbot knowledge with the in-process BM25 index of the C-QnA engine'''
+    ENGINE = 'C-QnA'
+
+    indexer = KnowledgeIndexer(
+        chunk_words=getattr(settings, 'QNA_CHUNK_WORDS', 80),
+        max_indexes=getattr(settings, 'QNA_INDEX_CACHE_SIZE', 64),
+        max_bytes=getattr(settings, 'QNA_INDEX_CACHE_BYTES', 512 * 1024 * 1024)
+    )
+
+    # answer latencies of this worker, in milliseconds
+    __lock = threading.Lock()
+    __latencies = deque(maxlen=1000)
+
+    @staticmethod
+    def __built(future):
+        if future.exception() is not None:
+            Log.error(future.exception())
+
+    @staticmethod
+    def index(chatbot_id: int, version, knowledge: str):
+        '''builds small knowledge right away, larger knowledge on the background thread of the indexer'''
+        if len(knowledge) <= settings.QNA_INLINE_BUILD_CHARS:
+            return ChatbotQnAService.indexer.build(chatbot_id, version, knowledge)
+        ChatbotQnAService.indexer.build_async(chatbot_id, version, knowledge).add_done_callback(ChatbotQnAService.__built)
+        return None
+
+    @staticmethod
+    def forget(chatbot_id: int):
+        ChatbotQnAService.indexer.forget(chatbot_id)
+
+    @staticmethod
+    def answer(api_id: int, question: str, top_k: int = None) -> dict:
+        started = time.perf_counter()
+        top_k = top_k or settings.QNA_TOP_K
+
+        # knowledge is only read when this worker has no index of the current version
+        chatbot_id, version = Chatbot.objects.filter(
+            api__id=api_id, pk=F('api__config_id'), engine=ChatbotQnAService.ENGINE
+        ).values_list('id', 'updated_on').get()
+        index = ChatbotQnAService.indexer.get(chatbot_id, version)
+        if index is None:
+            if not ChatbotQnAService.indexer.building(chatbot_id, version):
+                knowledge = Chatbot.objects.filter(pk=chatbot_id).values_list('knowledge', flat=True).get()
+                index = ChatbotQnAService.index(chatbot_id, version, knowledge)
+
+            # answering from the previous index of the chatbot while the current one is built
+            index = index or ChatbotQnAService.indexer.get(chatbot_id)
+            if index is None:
+                raise KnowledgeIndexingError()
+
+        matches = index.search(question, top_k)
+        elapsed = (time.perf_counter() - started) * 1000
+        with ChatbotQnAService.__lock:
+            ChatbotQnAService.__latencies.append(elapsed)
+
+        return {
+            'answer': matches[0][0] if matches else None,
+            'matches': [{'text': text, 'score': round(score, 4)} for text, score in matches],
+            'tookMs': round(elapsed, 3)
+        }
+
+    @staticmethod
+    def metrics() -> dict:
+        '''returns p50/p99 answer latency and cached indexes of this worker against the configured targets'''
+        with ChatbotQnAService.__lock:
+            latencies = np.array(ChatbotQnAService.__latencies, dtype=np.float64)
+
+        if len(latencies) == 0:
+            return {'answers': 0, 'indexes': ChatbotQnAService.indexer.stats()}
+        p50, p99 = np.percentile(latencies, [50, 99])
+        return {
+            'answers': len(latencies),
+            'indexes': ChatbotQnAService.indexer.stats(),
+            'p50Ms': round(float(p50), 3),
+            'p99Ms': round(float(p99), 3),
+            'p50TargetMs': settings.QNA_P50_TARGET_MS,
+            'p99TargetMs': settings.QNA_P99_TARGET_MS,
+            'withinTargets': bool(p50 <= settings.QNA_P50_TARGET_MS and p99 <= settings.QNA_P99_TARGET_MS)
+        }
@@ -0,0 +1,21 @@
+from django.db.models.signals import post_save, post_delete
+from django.db import transaction
+from django.dispatch import receiver
+from .models import Chatbot
+from .services import ChatbotQnAService
+
+
+# rebuilding qna index of saved chatbots once committed, large knowledge is indexed in background
+@receiver(post_save, sender=Chatbot)
+def chatbot_saved(sender, instance: Chatbot, raw=False, **kwargs):
+    if raw:
+        return
+    if instance.engine != ChatbotQnAService.ENGINE:
+        ChatbotQnAService.forget(instance.pk)
+        return
+    transaction.on_commit(lambda: ChatbotQnAService.index(instance.pk, instance.updated_on, instance.knowledge))
+
+
+@receiver(post_delete, sender=Chatbot)
+def chatbot_deleted(sender, instance: Chatbot, **kwargs):
+    ChatbotQnAService.forget(instance.pk)
@@ -1,3 +1,174 @@
-from django.test import TestCase
+import threading
+from unittest import mock
+from django.test import TestCase, override_settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from common.utils.query import IdentityMap
+from common.platform.products import Product
+from ..account.models import User
+from ..project.models import Project
+from ..apis.models import Api
+from ..emforms.models import Emform
+from .models import Chatbot
+from common.exception.exceptions import KnowledgeIndexingError
+from .qna import KnowledgeIndexer
+from .services import ChatbotService, ChatbotQnAService
+from . import serializers
 
-# Create your tests here.
+# smallest valid gif
+PHOTO = b'GIF89a\x01\x00\x01\x00\x80\x00\x00\x00\x00\x00\xff\xff\xff!\xf9\x04\x01\x00\x00\x00\x00,\x00\x00\x00\x00\x01\x00\x01\x00\x00\x02\x02D\x01\x00;'
+
+
+@override_settings(MEDIA_ROOT='/tmp/chatbot-tests')
+class QueryCountTest(TestCase):
+    '''Query budgets of chatbot configuration, rows loaded while validating are reused by the service.'''
+
+    def setUp(self):
+        self.user = User.objects.create(email='ada@example.com', username='ada1234', photo='profile/photo/ada.png', is_signed=True, is_active=True)
+        project = Project.objects.create(user=self.user, name='project')
+        self.api = Api.objects.create(project=project, product=Product.chatbot.name, type='QNA', api_key_hash='chatbot')
+
+    def __data(self, **data) -> dict:
+        return {
+            'api_id': self.api.pk,
+            'name': 'helper',
+            'photo': SimpleUploadedFile('bot.gif', PHOTO, content_type='image/gif'),
+            'greeting': 'Hello',
+            'engine': 'C-QnA',
+            'model': 'C-QnA',
+            'sys_prompt': 'Answer from knowledge.',
+            'knowledge': 'We open at 9am.',
+            'use_emform': False,
+            'when_emform': 'never',
+            'emform_config_id': 0,
+            'config': {},
+            'data': {},
+            **data
+        }
+
+    # validates and configures as the ChatbotConfig view does within one request
+    def __configure(self, data: dict):
+        token = IdentityMap.begin()
+        try:
+            serializer = serializers.AddChatbotConfigSerializer(data=data, context={'user': self.user})
+            if serializer.is_valid():
+                return ChatbotService.configure(serializer.validated_data)
+            return serializer.errors
+        finally:
+            IdentityMap.end(token)
+
+    def test_config(self):
+        # api, chatbot insert and its change log, api update and its change log
+        with self.assertNumQueries(5):
+            config = self.__configure(self.__data())
+        self.assertEqual(config['id'], Chatbot.objects.get(api=self.api).pk)
+
+    def test_config_unknown_api(self):
+        with self.assertNumQueries(1):
+            errors = self.__configure(self.__data(api_id=0))
+        self.assertIn('api', errors)
+
+
+class ListQueryCountTest(TestCase):
+    '''Chatbots with their api, project, user and emform are read in a fixed number of queries whatever the number of rows.'''
+
+    def setUp(self):
+        self.user = User.objects.create(email='ada@example.com', username='ada1234', photo='profile/photo/ada.png', is_active=True)
+        self.project = Project.objects.create(user=self.user, name='project')
+
+    def __add_chatbot(self, i: int):
+        emform_api = Api.objects.create(project=self.project, product=Product.emforms.name, type='QNA')
+        emform = Emform.objects.create(api=emform_api, name=f'form {i}')
+        api = Api.objects.create(project=self.project, product=Product.chatbot.name, type='QNA')
+        Chatbot.objects.create(api=api, name=f'bot {i}', photo='chatbot/photo/bot.gif', engine='C-QnA', use_emform=True, emform=emform)
+
+    def __list(self) -> list:
+        return [ChatbotService.to_json(chatbot) for chatbot in ChatbotService.queryset().filter(api__project__user=self.user)]
+
+    def test_list(self):
+        self.__add_chatbot(0)
+        with self.assertNumQueries(1):
+            self.assertEqual(len(self.__list()), 1)
+
+        for i in range(1, 5):
+            self.__add_chatbot(i)
+        with self.assertNumQueries(1):
+            chatbots = self.__list()
+        self.assertEqual(len(chatbots), 5)
+        self.assertEqual(chatbots[4]['emform']['api']['project']['user']['profile']['username'], 'ada1234')
+
+
+class KnowledgeIndexerTest(TestCase):
+    '''Indexes are kept in a bounded LRU, large knowledge is indexed in background while the previous index answers.'''
+
+    def setUp(self):
+        user = User.objects.create(email='ada@example.com', username='ada1234', photo='profile/photo/ada.png', is_active=True)
+        project = Project.objects.create(user=user, name='project')
+        self.api = Api.objects.create(project=project, product=Product.chatbot.name, type='QNA')
+        self.chatbot = Chatbot.objects.create(api=self.api, name='bot', photo='chatbot/photo/bot.gif', engine='C-QnA', knowledge='We open at 9am.')
+        Api.objects.filter(pk=self.api.pk).update(config_id=self.chatbot.pk)
+
+        self.indexer = KnowledgeIndexer()
+        patcher = mock.patch.object(ChatbotQnAService, 'indexer', self.indexer)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_lru_by_count(self):
+        indexer = KnowledgeIndexer(max_indexes=2)
+        for chatbot_id in (1, 2):
+            indexer.build(chatbot_id, 1, f'Knowledge of bot {chatbot_id}.')
+        indexer.get(1, 1)
+        indexer.build(3, 1, 'Knowledge of bot 3.')
+
+        # bot 2 was used least recently
+        self.assertIsNotNone(indexer.get(1, 1))
+        self.assertIsNone(indexer.get(2, 1))
+        self.assertIsNotNone(indexer.get(3, 1))
+        self.assertEqual(indexer.stats()['indexes'], 2)
+
+    def test_lru_by_size(self):
+        size = KnowledgeIndexer().build(1, 1, 'We open at 9am. ' * 100).nbytes()
+        indexer = KnowledgeIndexer(max_bytes=size * 2)
+        for chatbot_id in (1, 2, 3):
+            indexer.build(chatbot_id, 1, 'We open at 9am. ' * 100)
+        self.assertIsNone(indexer.get(1, 1))
+        self.assertEqual(indexer.stats()['bytes'], size * 2)
+
+        # one index larger than the budget is still kept
+        indexer = KnowledgeIndexer(max_bytes=1)
+        self.assertIs(indexer.build(1, 1, 'We open at 9am.'), indexer.get(1, 1))
+        indexer.forget(1)
+        self.assertEqual(indexer.stats(), {'indexes': 0, 'bytes': 0, 'building': 0})
+
+    def test_small_knowledge(self):
+        # indexed right away on the first question
+        content = ChatbotQnAService.answer(self.api.pk, 'when do you open')
+        self.assertEqual(content['answer'], 'We open at 9am.')
+
+    @override_settings(QNA_INLINE_BUILD_CHARS=0)
+    def test_large_knowledge(self):
+        release = threading.Event()
+        build = self.indexer.build
+
+        def blocked(*args):
+            release.wait(5)
+            return build(*args)
+
+        with mock.patch.object(self.indexer, 'build', side_effect=blocked):
+            # no index yet, the question does not wait for the build
+            with self.assertRaises(KnowledgeIndexingError):
+                ChatbotQnAService.answer(self.api.pk, 'when do you open')
+            # knowledge is not read again while its build is queued
+            with self.assertNumQueries(1), self.assertRaises(KnowledgeIndexingError):
+                ChatbotQnAService.answer(self.api.pk, 'when do you open')
+            release.set()
+            self.indexer.build_async(self.chatbot.pk, Chatbot.objects.get().updated_on, self.chatbot.knowledge).result(5)
+            self.assertEqual(ChatbotQnAService.answer(self.api.pk, 'when do you open')['answer'], 'We open at 9am.')
+
+            # the previous index answers while the edited knowledge is indexed
+            release.clear()
+            self.chatbot.knowledge = 'We close at 5pm.'
+            self.chatbot.save()
+            self.assertEqual(ChatbotQnAService.answer(self.api.pk, 'when do you open')['answer'], 'We open at 9am.')
+            release.set()
+            self.indexer.build_async(self.chatbot.pk, Chatbot.objects.get().updated_on, self.chatbot.knowledge).result(5)
+            self.assertEqual(ChatbotQnAService.answer(self.api.pk, 'when do you close')['answer'], 'We close at 5pm.')
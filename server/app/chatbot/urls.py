@@ -4,4 +4,5 @@ from . import views
 
 urlpatterns = [
     path('v1/config/', views.ChatbotConfig.as_view(), name='chatbot-config'),
+    path('v1/qna/answer/', views.ChatbotQnAAnswer.as_view(), name='chatbot-qna-answer'),
 ]
\ No newline at end of file
@@ -2,9 +2,14 @@ from rest_framework.views import APIView
 from rest_framework.permissions import IsAuthenticated
 from common.debug.log import Log
 from common.utils.response import Response
+from common.auth.permissions import IsExternalAuthenticated, IsApiKeyAuthenticated
 from common.auth.throttling import AuthenticatedUserThrottling
+from common.exception.exceptions import KnowledgeIndexingError
 from . import serializers
-from .services import ChatbotService
+from .models import Chatbot
+from .services import ChatbotService, ChatbotQnAService
+from ..apis.models import Api
+from ..apis.services import ApiKeyService
 
 
 
@@ -45,4 +50,32 @@ class ChatbotConfig(APIView):
             })
         except Exception as e:
             Log.error(e)
-            return Response.something_went_wrong()
\ No newline at end of file
+            return Response.something_went_wrong()
+
+
+# Chatbot QnA Answer
+class ChatbotQnAAnswer(APIView):
+    permission_classes = [IsExternalAuthenticated | IsApiKeyAuthenticated]
+
+    def post(self, request):
+        try:
+            serializer = serializers.QnAQuestionSerializer(data=request.data)
+            if serializer.is_valid():
+                data = serializer.validated_data
+                api_id = ApiKeyService.api_id(request, data.get('api_id'))
+                if api_id is None:
+                    return Response.error('Api id not specified.')
+
+                content = ChatbotQnAService.answer(api_id, data.get('question'), data.get('top_k'))
+                return Response.success(content)
+
+            return Response.errors(serializer.errors)
+        except Api.DoesNotExist as e:
+            return Response.error(str(e))
+        except Chatbot.DoesNotExist:
+            return Response.error('No C-QnA chatbot found.')
+        except KnowledgeIndexingError as e:
+            return Response.error(e.message)
+        except Exception as e:
+            Log.error(e)
+            return Response.something_went_wrong()
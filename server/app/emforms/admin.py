@@ -6,3 +6,24 @@ class EmformAdmin(admin.ModelAdmin):
     list_display = ('id', 'api', 'name', 'created_on')
 
 admin.site.register(models.Emform, EmformAdmin)
+
+
+# submission admin panel
+class SubmissionAdmin(admin.ModelAdmin):
+    list_display = ('id', 'emform', 'doc_id', 'submitted_on', 'synced_on')
+
+admin.site.register(models.Submission, SubmissionAdmin)
+
+
+# submission sync state admin panel
+class SubmissionSyncStateAdmin(admin.ModelAdmin):
+    list_display = ('id', 'emform', 'high_water', 'last_doc_id', 'synced_on')
+
+admin.site.register(models.SubmissionSyncState, SubmissionSyncStateAdmin)
+
+
+# submission summary admin panel
+class SubmissionSummaryAdmin(admin.ModelAdmin):
+    list_display = ('id', 'emform', 'signature', 'updated_on')
+
+admin.site.register(models.SubmissionSummary, SubmissionSummaryAdmin)
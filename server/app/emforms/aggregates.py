@@ -0,0 +1,170 @@
+import base64
+import hashlib
+import math
+from datetime import datetime, timedelta
+
+
+# returns normalised fields of an emform config, entries may be field names or dicts naming the field by name, key or label
+def config_fields(config) -> list:
+    fields = []
+    for entry in config if isinstance(config, list) else []:
+        if isinstance(entry, str):
+            entry = {'name': entry}
+        if not isinstance(entry, dict):
+            continue
+        name = entry.get('name') or entry.get('key') or entry.get('label')
+        if isinstance(name, str) and name:
+            fields.append({**entry, 'name': name})
+    return fields
+
+
+# returns a short signature of the field names of an emform config
+def config_signature(config) -> str:
+    names = '\n'.join(field['name'] for field in config_fields(config))
+    return hashlib.sha1(names.encode('utf-8')).hexdigest()
+
+
+
+class HyperLogLog:
+    '''HyperLogLog distinct count sketch with 2^precision one byte registers, serialized as base64.'''
+
+    def __init__(self, precision: int = 10, registers: str = None):
+        self.precision = precision
+        self.size = 1 << precision
+        self.registers = bytearray(base64.b64decode(registers)) if registers else bytearray(self.size)
+
+    def add(self, value: str):
+        hashed = int.from_bytes(hashlib.blake2b(value.encode('utf-8'), digest_size=8).digest(), 'big')
+        index = hashed >> (64 - self.precision)
+        rest = (hashed << self.precision) & 0xFFFFFFFFFFFFFFFF
+        rank = 64 - self.precision + 1 if rest == 0 else 64 - rest.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def count(self) -> int:
+        alpha = 0.7213 / (1 + 1.079 / self.size)
+        estimate = alpha * self.size * self.size / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        # linear counting is more accurate for small cardinalities
+        if estimate <= 2.5 * self.size and zeros:
+            estimate = self.size * math.log(self.size / zeros)
+        return int(round(estimate))
+
+    def dump(self) -> str:
+        return base64.b64encode(bytes(self.registers)).decode('utf-8')
+
+
+
+class FieldAggregate:
+    '''
+    Running aggregate of one emform field: filled/missing counts, distinct estimate, approximate top values
+    (space-saving counters) and numeric stats. State is a plain dict so it can be stored as JSON.
+    '''
+
+    def __init__(self, state: dict = None, capacity: int = 50, precision: int = 10):
+        state = state or {}
+        self.capacity = capacity
+        self.filled = state.get('filled', 0)
+        self.missing = state.get('missing', 0)
+        self.top = state.get('top', {})
+        self.numeric = state.get('numeric', None)
+        self.hll = HyperLogLog(precision, state.get('hll'))
+
+    def add(self, value):
+        if value is None or value == '' or value == []:
+            self.missing += 1
+            return
+        self.filled += 1
+
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            if self.numeric is None:
+                self.numeric = {'count': 0, 'sum': 0, 'min': value, 'max': value}
+            self.numeric['count'] += 1
+            self.numeric['sum'] += value
+            self.numeric['min'] = min(self.numeric['min'], value)
+            self.numeric['max'] = max(self.numeric['max'], value)
+
+        for item in value if isinstance(value, list) else (value,):
+            item = str(item)[:100]
+            self.hll.add(item)
+            # space-saving: unseen values evict the least counted one, inheriting its count
+            if item in self.top:
+                self.top[item] += 1
+            elif len(self.top) < self.capacity:
+                self.top[item] = 1
+            else:
+                evicted = min(self.top, key=self.top.get)
+                self.top[item] = self.top.pop(evicted) + 1
+
+    def state(self) -> dict:
+        return {'filled': self.filled, 'missing': self.missing, 'top': self.top, 'numeric': self.numeric, 'hll': self.hll.dump()}
+
+    def summary(self, top_k: int = 10) -> dict:
+        summary = {
+            'filled': self.filled,
+            'missing': self.missing,
+            'distinct': self.hll.count() if self.filled else 0,
+            'top': sorted(self.top.items(), key=lambda item: -item[1])[:top_k]
+        }
+        if self.numeric is not None:
+            summary['numeric'] = {
+                'min': self.numeric['min'],
+                'max': self.numeric['max'],
+                'mean': self.numeric['sum'] / self.numeric['count']
+            }
+        return summary
+
+
+
+class SubmissionAggregate:
+    '''Running aggregate of all submissions of an emform: total count, daily buckets and one FieldAggregate per config field.'''
+
+    def __init__(self, fields: list, state: dict = None, capacity: int = 50, precision: int = 10, bucket_days: int = 366):
+        state = state or {}
+        self.fields = fields
+        self.bucket_days = bucket_days
+        self.count = state.get('count', 0)
+        self.buckets = state.get('buckets', {})
+        self.first_on = state.get('firstOn', None)
+        self.last_on = state.get('lastOn', None)
+        self.aggregates = {
+            name: FieldAggregate(state.get('fields', {}).get(name), capacity, precision) for name in fields
+        }
+
+    def add(self, data: dict, submitted_on: datetime = None):
+        self.count += 1
+        for name, aggregate in self.aggregates.items():
+            aggregate.add(data.get(name))
+
+        if submitted_on is not None:
+            day = submitted_on.date().isoformat()
+            self.buckets[day] = self.buckets.get(day, 0) + 1
+            self.first_on = min(self.first_on or day, day)
+            self.last_on = max(self.last_on or day, day)
+
+    def __prune(self):
+        # keeping daily buckets of the last bucket_days days of submissions only
+        if self.last_on is None or len(self.buckets) <= self.bucket_days:
+            return
+        oldest = (datetime.fromisoformat(self.last_on) - timedelta(days=self.bucket_days - 1)).date().isoformat()
+        self.buckets = {day: count for day, count in self.buckets.items() if day >= oldest}
+
+    def state(self) -> dict:
+        self.__prune()
+        return {
+            'count': self.count,
+            'buckets': self.buckets,
+            'firstOn': self.first_on,
+            'lastOn': self.last_on,
+            'fields': {name: aggregate.state() for name, aggregate in self.aggregates.items()}
+        }
+
+    def summary(self, top_k: int = 10) -> dict:
+        self.__prune()
+        return {
+            'count': self.count,
+            'firstOn': self.first_on,
+            'lastOn': self.last_on,
+            'daily': dict(sorted(self.buckets.items())),
+            'fields': {name: aggregate.summary(top_k) for name, aggregate in self.aggregates.items()}
+        }
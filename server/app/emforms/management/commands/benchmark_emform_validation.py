@@ -0,0 +1,113 @@
+import re
+import time
+import random
+from django.core.management.base import BaseCommand
+from django.utils.dateparse import parse_date, parse_datetime
+from ...aggregates import config_fields
+from ...schema import compile_config, EMAIL_PATTERN
+
+CONFIG = [
+    {'name': 'name', 'type': 'text', 'required': True, 'minLength': 2, 'maxLength': 50},
+    {'name': 'email', 'type': 'email', 'required': True},
+    {'name': 'phone', 'type': 'text', 'pattern': r'\+?[0-9]{10,13}'},
+    {'name': 'age', 'type': 'integer', 'min': 13, 'max': 120},
+    {'name': 'plan', 'type': 'select', 'required': True, 'options': ['free', 'pro', 'enterprise']},
+    {'name': 'topics', 'type': 'checkbox', 'options': ['billing', 'sales', 'support'], 'maxLength': 3},
+    {'name': 'visit', 'type': 'date'},
+    {'name': 'subscribe', 'type': 'boolean'},
+    {'name': 'message', 'type': 'textarea', 'maxLength': 500},
+]
+
+
+# walks the config on every submission, as validating without a compiled schema would
+def _interpreted(config, data) -> dict:
+    if not isinstance(data, dict):
+        return {'submission': 'Must be an object.'}
+    errors = {}
+    fields = config_fields(config)
+    for field in fields:
+        name = field['name']
+        field_type = field.get('type', 'text')
+        value = data.get(name)
+        if value is None or value == '' or value == []:
+            if field.get('required'):
+                errors[name] = 'This field is required.'
+            continue
+        if field_type in ('text', 'textarea') and not isinstance(value, str):
+            errors[name] = 'Must be a text.'
+        elif field_type == 'email' and not (isinstance(value, str) and EMAIL_PATTERN.match(value)):
+            errors[name] = 'Must be a valid email.'
+        elif field_type == 'integer' and (not isinstance(value, int) or isinstance(value, bool)):
+            errors[name] = 'Must be an integer.'
+        elif field_type == 'boolean' and not isinstance(value, bool):
+            errors[name] = 'Must be true or false.'
+        elif field_type == 'date' and not (isinstance(value, str) and (parse_date(value) or parse_datetime(value))):
+            errors[name] = 'Must be a date.'
+        elif field_type in ('checkbox', 'multiselect') and not isinstance(value, list):
+            errors[name] = 'Must be a list.'
+        elif 'minLength' in field and len(value) < field['minLength']:
+            errors[name] = 'Too short.'
+        elif 'maxLength' in field and len(value) > field['maxLength']:
+            errors[name] = 'Too long.'
+        elif 'min' in field and value < field['min']:
+            errors[name] = 'Too small.'
+        elif 'max' in field and value > field['max']:
+            errors[name] = 'Too large.'
+        elif field.get('pattern') and not re.fullmatch(field['pattern'], value):
+            errors[name] = 'Invalid format.'
+        elif field.get('options'):
+            allowed = [str(option) for option in field['options']]
+            items = value if isinstance(value, list) else [value]
+            if not all(str(item) in allowed for item in items):
+                errors[name] = 'Invalid option.'
+    names = {field['name'] for field in fields}
+    for name in data:
+        if name not in names:
+            errors[name] = 'Unknown field.'
+    return errors
+
+
+def _submission(rng: random.Random) -> dict:
+    submission = {
+        'name': rng.choice(['Ada', 'Linus', 'G', 'Grace Hopper']),
+        'email': rng.choice(['ada@example.com', 'linus@kernel.org', 'not-an-email']),
+        'phone': rng.choice(['+919876543210', '12345']),
+        'age': rng.choice([25, 42, 7, 'old']),
+        'plan': rng.choice(['free', 'pro', 'gold']),
+        'topics': rng.sample(['billing', 'sales', 'support'], rng.randint(0, 2)),
+        'visit': rng.choice(['2024-05-01', '2024-05-01T10:00:00', 'tomorrow']),
+        'subscribe': rng.choice([True, False]),
+        'message': 'Hello there. ' * rng.randint(1, 10),
+    }
+    if rng.random() < 0.05:
+        submission['extra'] = 1
+    return submission
+
+
+class Command(BaseCommand):
+    help = 'Benchmarks validating emform submissions with the compiled schema against walking the config per submission.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, default=100000, help='Number of submissions to validate.')
+
+    def handle(self, *args, **options):
+        rng = random.Random(7)
+        submissions = [_submission(rng) for _ in range(options['count'])]
+
+        started = time.perf_counter()
+        validator = compile_config(CONFIG)
+        compiled_errors = [validator(data) for data in submissions]
+        compiled = time.perf_counter() - started
+
+        started = time.perf_counter()
+        interpreted_errors = [_interpreted(CONFIG, data) for data in submissions]
+        interpreted = time.perf_counter() - started
+
+        rejected = sum(1 for errors in compiled_errors if errors)
+        agreeing = sum(1 for a, b in zip(compiled_errors, interpreted_errors) if a.keys() == b.keys())
+        self.stdout.write(
+            f'{len(submissions)} submissions, {rejected} rejected, verdicts agree on {agreeing}\n'
+            f'compiled    {compiled:.2f}s ({compiled / len(submissions) * 1e6:.1f}us each)\n'
+            f'interpreted {interpreted:.2f}s ({interpreted / len(submissions) * 1e6:.1f}us each)\n'
+            f'speedup     {interpreted / compiled:.2f}x'
+        )
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from ...services import EmformMirrorService
+
+
+class Command(BaseCommand):
+    help = 'Mirrors emform submissions from firestore into the local database.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--emform', type=int, default=None, help='Sync only this emform.')
+        parser.add_argument('--full', action='store_true', help='Walk whole collections, dropping deleted submissions and resetting high-water marks.')
+        parser.add_argument('--once', action='store_true', help='Sync once and exit.')
+        parser.add_argument('--interval', type=float, default=None, help='Seconds to wait between syncs.')
+
+    def handle(self, *args, **options):
+        if options['emform'] is not None:
+            synced = EmformMirrorService.sync(options['emform'], full=options['full'])
+            self.stdout.write(f"{synced} submission(s) mirrored.")
+            return
+
+        synced = EmformMirrorService.run(interval=options['interval'], once=options['once'], full=options['full'])
+        self.stdout.write(f"{sum(synced.values())} submission(s) of {len(synced)} emform(s) mirrored.")
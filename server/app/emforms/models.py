@@ -1,9 +1,11 @@
 from django.db import models
+from django.core.serializers.json import DjangoJSONEncoder
 from common.platform.products import Product
+from common.utils.models import DirtyFieldsMixin
 
 
 # emform model
-class Emform(models.Model):
+class Emform(DirtyFieldsMixin, models.Model):
     api = models.OneToOneField("apis.Api", on_delete=models.CASCADE)
     type = models.CharField(default='', choices=Product.chatbot.types_model_choices, max_length=20)
     name = models.CharField(default='', max_length=50)
@@ -12,4 +14,47 @@ class Emform(models.Model):
     created_on = models.DateTimeField(auto_now_add=True, null=True)
 
     def __str__(self) -> str:
-        return self.api.product + " | " + self.api.project.name + " - Configuration"
\ No newline at end of file
+        return self.api.product + " | " + self.api.project.name + " - Configuration"
+
+
+# Submission Model, local mirror of an emform submission stored in firestore
+class Submission(models.Model):
+    emform = models.ForeignKey(Emform, on_delete=models.CASCADE)
+    doc_id = models.CharField(default='', max_length=150)
+    data = models.JSONField(default=dict, encoder=DjangoJSONEncoder)
+    submitted_on = models.DateTimeField(null=True)
+    synced_on = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['emform', 'doc_id'], name='unique_emform_submission'),
+        ]
+        indexes = [
+            models.Index(fields=['emform', 'submitted_on']),
+        ]
+
+    def __str__(self) -> str:
+        return f'{self.emform_id} | {self.doc_id}'
+
+
+# Submission Sync State Model, high-water mark of the last submission mirrored from an emform collection
+class SubmissionSyncState(models.Model):
+    emform = models.OneToOneField(Emform, on_delete=models.CASCADE)
+    high_water = models.DateTimeField(null=True)
+    last_doc_id = models.CharField(default='', max_length=150)
+    synced_on = models.DateTimeField(null=True)
+
+    def __str__(self) -> str:
+        return f'{self.emform_id} | {self.high_water}'
+
+
+# Submission Summary Model, precomputed aggregates of mirrored submissions of an emform
+class SubmissionSummary(models.Model):
+    emform = models.OneToOneField(Emform, on_delete=models.CASCADE)
+    signature = models.CharField(default='', max_length=40)
+    state = models.JSONField(default=dict)
+    summary = models.JSONField(default=dict)
+    updated_on = models.DateTimeField(auto_now=True)
+
+    def __str__(self) -> str:
+        return f'{self.emform_id} | {self.updated_on}'
@@ -0,0 +1,167 @@
+import re
+import threading
+from collections import OrderedDict
+from django.conf import settings
+from django.utils.dateparse import parse_date, parse_datetime
+from .aggregates import config_fields
+
+EMAIL_PATTERN = re.compile(r'^[^@\s]+@[^@\s]+\.[^@\s]+$')
+
+
+# type checks of field values, each returns an error message or None
+def _text(value):
+    return None if isinstance(value, str) else 'Must be a text.'
+
+def _email(value):
+    return None if isinstance(value, str) and EMAIL_PATTERN.match(value) else 'Must be a valid email.'
+
+def _number(value):
+    return None if isinstance(value, (int, float)) and not isinstance(value, bool) else 'Must be a number.'
+
+def _integer(value):
+    return None if isinstance(value, int) and not isinstance(value, bool) else 'Must be an integer.'
+
+def _boolean(value):
+    return None if isinstance(value, bool) else 'Must be true or false.'
+
+def _date(value):
+    if not isinstance(value, str):
+        return 'Must be a date.'
+    try:
+        return None if parse_date(value) or parse_datetime(value) else 'Must be a date.'
+    except ValueError:
+        # well formed, but no calendar date (e.g. 2023-02-30)
+        return 'Must be a date.'
+
+def _list(value):
+    return None if isinstance(value, list) else 'Must be a list.'
+
+TYPES = {
+    'text': _text,
+    'textarea': _text,
+    'email': _email,
+    'number': _number,
+    'integer': _integer,
+    'boolean': _boolean,
+    'date': _date,
+    'select': None,
+    'multiselect': _list,
+    'checkbox': _list,
+}
+LIST_TYPES = ('multiselect', 'checkbox')
+SIZED_TYPES = ('text', 'textarea', 'email', 'multiselect', 'checkbox')
+
+
+# checks of constraint values, so a config of wrong types is rejected when compiled instead of failing submissions
+def _is_length(value):
+    return isinstance(value, int) and not isinstance(value, bool) and value >= 0
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+# returns constraint key of field, raises ValueError if it is set to a value of the wrong type
+def _constraint(field: dict, key: str, check, expected: str):
+    value = field.get(key)
+    if value is not None and not check(value):
+        raise ValueError(f"{key} of {field['name']} must be {expected}.")
+    return value
+
+
+# returns validator of one field, the checks are chosen once here instead of on every submission
+def _compile_field(field: dict):
+    name = field['name']
+    field_type = field.get('type', 'text')
+    required = bool(field.get('required', False))
+    checks = []
+
+    if TYPES.get(field_type) is not None:
+        checks.append(TYPES[field_type])
+
+    if field_type in SIZED_TYPES:
+        min_length = _constraint(field, 'minLength', _is_length, 'a non negative integer')
+        max_length = _constraint(field, 'maxLength', _is_length, 'a non negative integer')
+        if min_length is not None:
+            checks.append(lambda value: None if len(value) >= min_length else f'Must be atleast of {min_length} length.')
+        if max_length is not None:
+            checks.append(lambda value: None if len(value) <= max_length else f'Must be atmost of {max_length} length.')
+
+    if field_type in ('number', 'integer'):
+        minimum = _constraint(field, 'min', _is_number, 'a number')
+        maximum = _constraint(field, 'max', _is_number, 'a number')
+        if minimum is not None:
+            checks.append(lambda value: None if value >= minimum else f'Must be atleast {minimum}.')
+        if maximum is not None:
+            checks.append(lambda value: None if value <= maximum else f'Must be atmost {maximum}.')
+
+    pattern = _constraint(field, 'pattern', lambda value: isinstance(value, str), 'a text') or _constraint(field, 'regex', lambda value: isinstance(value, str), 'a text')
+    if pattern and field_type in ('text', 'textarea', 'email'):
+        compiled = re.compile(pattern)
+        checks.append(lambda value: None if compiled.fullmatch(value) else 'Invalid format.')
+
+    options = _constraint(field, 'options', lambda value: isinstance(value, list), 'a list')
+    if options:
+        allowed = frozenset(str(option.get('value', option.get('label')) if isinstance(option, dict) else option) for option in options)
+        if field_type in LIST_TYPES:
+            checks.append(lambda value: None if all(str(item) in allowed for item in value) else 'Invalid option.')
+        else:
+            checks.append(lambda value: None if str(value) in allowed else 'Invalid option.')
+
+    def validate(data: dict):
+        value = data.get(name)
+        if value is None or value == '' or value == []:
+            return 'This field is required.' if required else None
+        for check in checks:
+            error = check(value)
+            if error is not None:
+                return error
+        return None
+
+    return name, validate
+
+
+# returns validator closure of an emform config, the closure returns errors of a submission keyed by field name
+def compile_config(config):
+    validators = tuple(_compile_field(field) for field in config_fields(config))
+    names = frozenset(name for name, _ in validators)
+
+    def validate(data) -> dict:
+        if not isinstance(data, dict):
+            return {'submission': 'Must be an object.'}
+        errors = {}
+        for name, validator in validators:
+            error = validator(data)
+            if error is not None:
+                errors[name] = error
+        for name in data.keys() - names:
+            errors[name] = 'Unknown field.'
+        return errors
+
+    return validate
+
+
+
+class ValidatorCache:
+    '''LRU of compiled validators per emform, a validator is recompiled only when its config version changes.'''
+    __lock = threading.Lock()
+    __validators = OrderedDict()
+
+    @staticmethod
+    def get(emform_id, version):
+        '''returns cached validator of emform if it was compiled for the given config version'''
+        with ValidatorCache.__lock:
+            entry = ValidatorCache.__validators.get(emform_id)
+            if entry is None or entry[0] != version:
+                return None
+            ValidatorCache.__validators.move_to_end(emform_id)
+            return entry[1]
+
+    @staticmethod
+    def put(emform_id, version, config):
+        '''compiles and caches validator of emform config'''
+        validator = compile_config(config)
+        with ValidatorCache.__lock:
+            ValidatorCache.__validators[emform_id] = (version, validator)
+            ValidatorCache.__validators.move_to_end(emform_id)
+            while len(ValidatorCache.__validators) > settings.EMFORM_VALIDATOR_CACHE_SIZE:
+                ValidatorCache.__validators.popitem(last=False)
+        return validator
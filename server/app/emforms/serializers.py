@@ -1,9 +1,13 @@
+import re
 from rest_framework import serializers
+from django.conf import settings
 from .models import Emform
+from .schema import compile_config
 from common.utils import validators
 from common.debug.log import Log
-from ..apis.models import Api
+from ..apis.services import ApiService
 from common.platform.products import Product
+from common.utils.query import IdentityMap
 
 
 
@@ -21,11 +25,11 @@ class AddEmformConfigSerializer(serializers.ModelSerializer):
         config = attrs.get('config')
         user = self.context.get('user')
 
-        if not Api.objects.filter(id=api_id).exists():
+        api = IdentityMap.fetch(ApiService.queryset(), id=api_id)
+        if api is None:
             raise serializers.ValidationError({'api': 'No API found.'})
         
-        api = Api.objects.get(id=api_id)
-        if api.project.user != user or api.product != Product.emforms.name:
+        if api.project.user_id != user.pk or api.product != Product.emforms.name:
             raise serializers.ValidationError({'api': 'Invalid api for product.'})
         
         if not validators.atleast_length(name, 3) or not validators.atmost_length(name, 20):
@@ -34,4 +38,19 @@ class AddEmformConfigSerializer(serializers.ModelSerializer):
         if config is None or not isinstance(config, list):
             raise serializers.ValidationError({'config': 'Invalid configuration.'})
 
-        return attrs
\ No newline at end of file
+        try:
+            compile_config(config)
+        except ValueError as e:
+            raise serializers.ValidationError({'config': str(e)})
+        except (re.error, TypeError):
+            raise serializers.ValidationError({'config': 'Invalid field pattern or constraint.'})
+
+        return attrs
+
+
+
+# Emform Submission Batch Serializer
+class EmformSubmissionBatchSerializer(serializers.Serializer):
+    # taken from the api key when submissions are sent with one
+    api_id = serializers.IntegerField(required=False)
+    submissions = serializers.ListField(child=serializers.JSONField(), allow_empty=False, max_length=settings.EMFORM_SUBMISSION_BATCH_MAX_SIZE)
@@ -1,14 +1,37 @@
-from .models import Emform
+import io
+import re
+import csv
+import json
+import time
+from datetime import datetime
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import F
+from django.db.models.fields.json import KeyTransform
+from django.utils import timezone
+from .models import Emform, Submission, SubmissionSyncState, SubmissionSummary
+from .aggregates import SubmissionAggregate, config_fields, config_signature
+from .schema import ValidatorCache
 from ..apis.models import Api
 from ..apis.services import ApiService
 from common.debug.log import Log
+from common.utils.query import nested, IdentityMap
 from firebase_admin import firestore
 
 
 class EmformService:
+    # relations read by to_json
+    RELATED = nested('api', ApiService.RELATED)
+
+    @staticmethod
+    def queryset():
+        return Emform.objects.select_related(*EmformService.RELATED)
+
     @staticmethod
     def configure(data: dict):
-       api = Api.objects.get(id=data.get('api_id'))
+       # api loaded by the serializer in this request is reused
+       api = IdentityMap.fetch(ApiService.queryset(), id=data.get('api_id'))
        emform = Emform.objects.create(api=api, type=api.type, **data)
        api.config_id = emform.pk
        api.save()
@@ -16,8 +39,7 @@ class EmformService:
     
     @staticmethod
     def get_configuration(api_id):
-        api = Api.objects.get(id=api_id)
-        emform = Emform.objects.get(pk=api.config_id, api=api)
+        emform = EmformService.queryset().get(api__id=api_id, pk=F('api__config_id'))
         return EmformService.to_json(emform)
 
     @staticmethod
@@ -34,17 +56,379 @@ class EmformService:
 
 # Emform content generation service
 class EmformContentService:
+    # emform submissions are ordered by document id, which is also the pagination cursor
+    ORDER_BY = '__name__'
+    NDJSON = 'ndjson'
+    CSV = 'csv'
+    STREAM_FORMATS = (NDJSON, CSV)
+    # submission data keys usable in mirror filters and ordering, keys are always read as json keys (KeyTransform)
+    KEY_PATTERN = re.compile(r'^[A-Za-z0-9]+(_[A-Za-z0-9]+)*$')
+    MIRROR_ORDERS = ('submitted_on', '-submitted_on')
+
     @staticmethod
-    def get_content(emform_id):
+    def __collection(emform_id):
+        return firestore.client().collection(f'emform_{emform_id}')
+
+    @staticmethod
+    def __check_owner(emform_id, user):
+        # submissions are only read for the owner of the emform
+        if not Emform.objects.filter(pk=emform_id, api__project__user=user).exists():
+            raise Emform.DoesNotExist('No emform found.')
+
+    @staticmethod
+    def get_content(emform_id, user, limit: int = None, cursor: str = None):
+        '''returns one page of submissions and the cursor of the next page, None when there are no more'''
+        EmformContentService.__check_owner(emform_id, user)
+        limit = max(1, min(limit or settings.EMFORM_CONTENT_PAGE_SIZE, settings.EMFORM_CONTENT_MAX_PAGE_SIZE))
         content = {
             'keys': [],
-            'data': []
+            'data': [],
+            'next': None
         }
-        collection = f'emform_{emform_id}'
-        db = firestore.client()
-        docs = db.collection(collection).get()
-        for doc in docs:
+        query = EmformContentService.__collection(emform_id).order_by(EmformContentService.ORDER_BY)
+        if cursor:
+            query = query.start_after({EmformContentService.ORDER_BY: cursor})
+
+        # reading one extra document to know if there is a next page
+        last_id = None
+        for doc in query.limit(limit + 1).stream():
+            if len(content['data']) == limit:
+                content['next'] = last_id
+                break
             content['data'].append(doc.to_dict())
+            last_id = doc.id
         if len(content['data']) > 0:
-            content['keys'] = content['data'][0].keys()
-        return content
\ No newline at end of file
+            content['keys'] = list(content['data'][0].keys())
+        return content
+
+    @staticmethod
+    def __value(value: str):
+        # filter values are compared as json, so that numbers and booleans match their stored type
+        try:
+            return json.loads(value)
+        except ValueError:
+            return value
+
+    @staticmethod
+    def get_mirrored_content(emform_id, user, filters: dict = None, since=None, until=None, order: str = None, limit: int = None, offset: int = 0):
+        '''returns one page of mirrored submissions filtered, sorted and counted by the database'''
+        EmformContentService.__check_owner(emform_id, user)
+        limit = max(1, min(limit or settings.EMFORM_CONTENT_PAGE_SIZE, settings.EMFORM_CONTENT_MAX_PAGE_SIZE))
+        offset = max(0, offset)
+        submissions = Submission.objects.filter(emform_id=emform_id)
+        for i, (key, value) in enumerate((filters or {}).items()):
+            if not EmformContentService.KEY_PATTERN.match(key):
+                raise ValueError(f'Invalid filter key {key}.')
+            # keys are bound as json keys, so a key named like a lookup (contains, in, isnull...) is still only a key
+            submissions = submissions.alias(**{f'filter_{i}': KeyTransform(key, 'data')}).filter(**{f'filter_{i}': EmformContentService.__value(value)})
+        if since is not None:
+            submissions = submissions.filter(submitted_on__gte=since)
+        if until is not None:
+            submissions = submissions.filter(submitted_on__lt=until)
+
+        # ordering by submission time, or by a data key as data.<key> / -data.<key>
+        order = order or '-submitted_on'
+        if order not in EmformContentService.MIRROR_ORDERS:
+            key = order.lstrip('-')
+            if not key.startswith('data.') or not EmformContentService.KEY_PATTERN.match(key[len('data.'):]):
+                raise ValueError(f'Invalid order {order}.')
+            value = KeyTransform(key[len('data.'):], 'data')
+            order = value.desc() if order.startswith('-') else value.asc()
+
+        count = submissions.count()
+        data = list(submissions.order_by(order, 'id').values_list('data', flat=True)[offset:offset + limit])
+        return {
+            'keys': list(data[0].keys()) if len(data) > 0 else [],
+            'data': data,
+            'count': count,
+            'next': offset + limit if offset + limit < count else None
+        }
+
+    @staticmethod
+    def stream(emform_id, user, format: str = NDJSON, fields: list = None):
+        '''yields all submissions as NDJSON lines or CSV rows, holding at most one batch of rows in memory'''
+        # checked before the response starts streaming
+        EmformContentService.__check_owner(emform_id, user)
+        docs = EmformContentService.__collection(emform_id).stream()
+        if format == EmformContentService.CSV:
+            return EmformContentService.__csv(docs, fields)
+        return EmformContentService.__ndjson(docs)
+
+    @staticmethod
+    def __batches(lines):
+        batch = []
+        for line in lines:
+            batch.append(line)
+            if len(batch) == settings.EMFORM_CONTENT_STREAM_BATCH_SIZE:
+                yield ''.join(batch)
+                batch = []
+        if batch:
+            yield ''.join(batch)
+
+    @staticmethod
+    def __ndjson(docs):
+        encoder = DjangoJSONEncoder()
+        return EmformContentService.__batches(encoder.encode(doc.to_dict()) + '\n' for doc in docs)
+
+    @staticmethod
+    def __csv(docs, fields: list = None):
+        # columns are the requested fields, or keys of the first submission
+        def lines():
+            buffer = io.StringIO()
+            writer = None
+            for doc in docs:
+                data = doc.to_dict()
+                if writer is None:
+                    writer = csv.DictWriter(buffer, fieldnames=fields or list(data.keys()), extrasaction='ignore')
+                    writer.writeheader()
+                writer.writerow(data)
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate(0)
+        return EmformContentService.__batches(lines())
+
+
+
+# Emform submission service
+class EmformSubmissionService:
+    '''Validates submissions against the compiled schema of the emform and writes accepted ones to firestore'''
+    # firestore allows atmost 500 writes in one batch
+    WRITE_BATCH_SIZE = 500
+
+    @staticmethod
+    def validator(api_id):
+        # config is only read when there is no validator compiled for the current config version
+        emform_id, version = Emform.objects.filter(api__id=api_id, pk=F('api__config_id')).values_list('id', 'updated_on').get()
+        validator = ValidatorCache.get(emform_id, version)
+        if validator is None:
+            config = Emform.objects.filter(pk=emform_id).values_list('config', flat=True).get()
+            validator = ValidatorCache.put(emform_id, version, config)
+        return emform_id, validator
+
+    @staticmethod
+    def submit(api_id, submissions: list) -> dict:
+        '''returns number of accepted submissions and errors of rejected ones by their index in the batch'''
+        emform_id, validator = EmformSubmissionService.validator(api_id)
+        accepted = []
+        rejected = []
+        for index, data in enumerate(submissions):
+            errors = validator(data)
+            if errors:
+                rejected.append({'index': index, 'errors': errors})
+            else:
+                accepted.append(data)
+
+        if accepted:
+            db = firestore.client()
+            collection = db.collection(f'emform_{emform_id}')
+            field = settings.EMFORM_SUBMISSION_TIMESTAMP_FIELD
+            for start in range(0, len(accepted), EmformSubmissionService.WRITE_BATCH_SIZE):
+                batch = db.batch()
+                for data in accepted[start:start + EmformSubmissionService.WRITE_BATCH_SIZE]:
+                    batch.set(collection.document(), {**data, field: firestore.SERVER_TIMESTAMP})
+                batch.commit()
+
+        return {
+            'accepted': len(accepted),
+            'rejected': rejected
+        }
+
+
+
+# Emform submission aggregate service
+class EmformAggregateService:
+    '''Keeps precomputed per field summaries of mirrored submissions, updated as the mirror sync writes new ones'''
+
+    @staticmethod
+    def __aggregate(config, state: dict = None) -> SubmissionAggregate:
+        return SubmissionAggregate(
+            [field['name'] for field in config_fields(config)],
+            state,
+            capacity=settings.EMFORM_AGGREGATE_TOP_K_CAPACITY,
+            precision=settings.EMFORM_AGGREGATE_HLL_PRECISION,
+            bucket_days=settings.EMFORM_AGGREGATE_BUCKET_DAYS
+        )
+
+    @staticmethod
+    def __save(summary: SubmissionSummary, aggregate: SubmissionAggregate, signature: str):
+        summary.signature = signature
+        summary.state = aggregate.state()
+        summary.summary = aggregate.summary(settings.EMFORM_AGGREGATE_TOP_K)
+        summary.save()
+
+    @staticmethod
+    def add(emform_id, rows: list):
+        '''adds newly mirrored submissions to the summary of emform'''
+        if not rows:
+            return
+        with transaction.atomic():
+            config = Emform.objects.values_list('config', flat=True).get(pk=emform_id)
+            signature = config_signature(config)
+            summary, _ = SubmissionSummary.objects.select_for_update().get_or_create(emform_id=emform_id)
+            if summary.signature != signature:
+                # config fields changed since the summary was built, recounting from the mirror that already holds rows
+                EmformAggregateService.rebuild(emform_id)
+                return
+
+            aggregate = EmformAggregateService.__aggregate(config, summary.state)
+            for row in rows:
+                aggregate.add(row.data, row.submitted_on)
+            EmformAggregateService.__save(summary, aggregate, signature)
+
+    @staticmethod
+    def rebuild(emform_id) -> SubmissionSummary:
+        '''recounts the summary of emform from all mirrored submissions'''
+        with transaction.atomic():
+            config = Emform.objects.values_list('config', flat=True).get(pk=emform_id)
+            summary, _ = SubmissionSummary.objects.select_for_update().get_or_create(emform_id=emform_id)
+            aggregate = EmformAggregateService.__aggregate(config)
+            submissions = Submission.objects.filter(emform_id=emform_id).order_by().values_list('data', 'submitted_on')
+            for data, submitted_on in submissions.iterator(chunk_size=2000):
+                aggregate.add(data, submitted_on)
+            EmformAggregateService.__save(summary, aggregate, config_signature(config))
+            return summary
+
+    @staticmethod
+    def get_summary(emform_id, user) -> dict:
+        '''
+        returns summary of mirrored submissions of emform. new submissions are counted as they are mirrored, edited ones once
+        a sync reads them again: incremental sync only re-reads submissions at or after its high-water timestamp, so edits
+        of older submissions are counted by the next full sync.
+        '''
+        config = Emform.objects.values_list('config', flat=True).get(pk=emform_id, api__project__user=user)
+        summary = SubmissionSummary.objects.filter(emform_id=emform_id).first()
+        if summary is None or summary.signature != config_signature(config):
+            summary = EmformAggregateService.rebuild(emform_id)
+        return {**summary.summary, 'updatedOn': summary.updated_on}
+
+
+
+# Emform submission mirror service
+class EmformMirrorService:
+    '''Mirrors emform submissions from firestore into Submission rows, resuming from per emform high-water marks'''
+
+    @staticmethod
+    def __timestamp(value):
+        return value if isinstance(value, datetime) else None
+
+    @staticmethod
+    def __upsert(emform_id, docs) -> tuple:
+        '''writes docs to the mirror, returns written rows, the rows that were not mirrored before and whether a mirrored row changed'''
+        field = settings.EMFORM_SUBMISSION_TIMESTAMP_FIELD
+        existing = dict(Submission.objects.filter(emform_id=emform_id, doc_id__in=[doc.id for doc in docs]).values_list('doc_id', 'data'))
+        encoder = DjangoJSONEncoder()
+        rows = []
+        for doc in docs:
+            data = doc.to_dict()
+            # rows hold the payload as stored, so aggregates of new rows and of a rebuild see the same values
+            rows.append(Submission(
+                emform_id=emform_id,
+                doc_id=doc.id,
+                data=json.loads(encoder.encode(data)),
+                submitted_on=EmformMirrorService.__timestamp(data.get(field))
+            ))
+        Submission.objects.bulk_create(
+            rows,
+            update_conflicts=True,
+            unique_fields=['emform', 'doc_id'],
+            update_fields=['data', 'submitted_on', 'synced_on']
+        )
+        changed = any(row.doc_id in existing and existing[row.doc_id] != row.data for row in rows)
+        return rows, [row for row in rows if row.doc_id not in existing], changed
+
+    @staticmethod
+    def sync(emform_id, client=None, full: bool = False, batch_size: int = None) -> int:
+        '''
+        mirrors submissions of one emform, returns number of submissions written.
+        incremental sync reads submissions from the high-water mark ordered by (timestamp field, document id).
+        full sync walks the whole collection by document id, removes mirrored submissions no longer in firestore
+        and resets the high-water mark, it also picks up submissions without the timestamp field.
+        '''
+        client = client or firestore.client()
+        batch_size = batch_size or settings.EMFORM_MIRROR_BATCH_SIZE
+        field = settings.EMFORM_SUBMISSION_TIMESTAMP_FIELD
+        collection = client.collection(f'emform_{emform_id}')
+        state, _ = SubmissionSyncState.objects.get_or_create(emform_id=emform_id)
+
+        started = timezone.now()
+        synced = 0
+        high_water, last_doc_id = (None, '') if full else (state.high_water, state.last_doc_id)
+        # (timestamp field value, document id) of the last document read in this run
+        cursor = None
+        # whether a mirrored submission was edited, its old values cannot be taken out of the aggregates
+        changed = False
+        while True:
+            if full:
+                query = collection.order_by(EmformContentService.ORDER_BY)
+                if last_doc_id:
+                    query = query.start_after({EmformContentService.ORDER_BY: last_doc_id})
+            else:
+                query = collection.order_by(field).order_by(EmformContentService.ORDER_BY)
+                if cursor is not None:
+                    query = query.start_after({field: cursor[0], EmformContentService.ORDER_BY: cursor[1]})
+                elif high_water is not None:
+                    # submissions written later with the same timestamp may sort before the last mirrored one,
+                    # so each run starts at the high-water timestamp, re-reading ties is harmless
+                    query = query.start_at({field: high_water})
+
+            docs = list(query.limit(batch_size).stream())
+            if not docs:
+                break
+
+            # mirrored rows and the high-water mark move together, so an interrupted sync resumes without gaps
+            with transaction.atomic():
+                rows, created, edited = EmformMirrorService.__upsert(emform_id, docs)
+                if full:
+                    last_doc_id = rows[-1].doc_id
+                else:
+                    if edited and not changed:
+                        # marking the summary stale with the rows, so it is recounted even if this sync stops before its end
+                        SubmissionSummary.objects.filter(emform_id=emform_id).update(signature='')
+                    changed = changed or edited
+                    if not changed:
+                        EmformAggregateService.add(emform_id, created)
+                    # pages follow the raw field value, which need not be a timestamp, so every page moves forward.
+                    # only timestamps move the high-water mark, documents holding other values are still mirrored
+                    cursor = (docs[-1].to_dict().get(field), docs[-1].id)
+                    stamped = [row for row in rows if row.submitted_on is not None]
+                    if stamped:
+                        high_water, last_doc_id = stamped[-1].submitted_on, stamped[-1].doc_id
+                        SubmissionSyncState.objects.filter(pk=state.pk).update(high_water=high_water, last_doc_id=last_doc_id)
+
+            synced += len(docs)
+            if len(docs) < batch_size:
+                break
+
+        if full:
+            # every submission still in firestore was rewritten by this pass
+            Submission.objects.filter(emform_id=emform_id, synced_on__lt=started).delete()
+            latest = Submission.objects.filter(emform_id=emform_id, submitted_on__isnull=False).order_by('-submitted_on', '-doc_id').first()
+            high_water, last_doc_id = (latest.submitted_on, latest.doc_id) if latest else (None, '')
+        if full or changed:
+            EmformAggregateService.rebuild(emform_id)
+
+        SubmissionSyncState.objects.filter(pk=state.pk).update(high_water=high_water, last_doc_id=last_doc_id, synced_on=timezone.now())
+        return synced
+
+    @staticmethod
+    def sync_all(client=None, full: bool = False) -> dict:
+        '''mirrors submissions of every emform, returns number of submissions written per emform'''
+        synced = {}
+        for emform_id in Emform.objects.values_list('id', flat=True):
+            try:
+                synced[emform_id] = EmformMirrorService.sync(emform_id, client=client, full=full)
+            except Exception as e:
+                Log.error(e)
+        return synced
+
+    @staticmethod
+    def run(interval: float = None, once: bool = False, full: bool = False, client=None):
+        '''syncs all emforms continuously, the first pass may be a full sync'''
+        interval = interval if interval is not None else settings.EMFORM_MIRROR_POLL_SECONDS
+        while True:
+            synced = EmformMirrorService.sync_all(client=client, full=full)
+            Log.info({'mirroredSubmissions': sum(synced.values()), 'emforms': len(synced)})
+            if once:
+                return synced
+            full = False
+            time.sleep(interval)
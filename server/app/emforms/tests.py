@@ -1,3 +1,387 @@
-from django.test import TestCase
+import json
+from datetime import datetime, timedelta, timezone
+from unittest import mock
+from django.test import TestCase, override_settings
+from django.core.cache import cache
+from rest_framework.test import APIClient
+from common.platform.products import Product
+from ..account.models import User
+from ..project.models import Project
+from ..apis.models import Api
+from .models import Emform, Submission, SubmissionSyncState
+from .services import EmformContentService, EmformMirrorService, EmformAggregateService
+from .aggregates import HyperLogLog, FieldAggregate
+from .schema import compile_config
 
-# Create your tests here.
+
+class FakeDocument:
+    def __init__(self, id: str, data: dict):
+        self.id = id
+        self.__data = data
+
+    def to_dict(self) -> dict:
+        return dict(self.__data)
+
+
+class FakeQuery:
+    '''In-memory stand-in of a firestore collection query: order_by, start_at / start_after with field cursors, limit and stream'''
+
+    def __init__(self, client, name: str, orders: tuple = (), at: tuple = None, after: tuple = None, count: int = None):
+        self.client = client
+        self.name = name
+        self.orders = orders
+        self.at = at
+        self.after = after
+        self.count = count
+
+    def __copy(self, **changes):
+        query = FakeQuery(self.client, self.name, self.orders, self.at, self.after, self.count)
+        query.__dict__.update(changes)
+        return query
+
+    def order_by(self, field: str):
+        return self.__copy(orders=self.orders + (field,))
+
+    def start_at(self, values: dict):
+        return self.__copy(at=tuple(values[field] for field in self.orders[:len(values)]))
+
+    def start_after(self, values: dict):
+        return self.__copy(after=tuple(values[field] for field in self.orders[:len(values)]))
+
+    def limit(self, count: int):
+        return self.__copy(count=count)
+
+    def __key(self, id: str, data: dict) -> tuple:
+        return tuple(id if field == '__name__' else data[field] for field in self.orders)
+
+    def stream(self):
+        # documents without an ordered field are left out, as firestore does
+        documents = [(id, data) for id, data in self.client.collections.get(self.name, {}).items() if all(field == '__name__' or field in data for field in self.orders)]
+        documents.sort(key=lambda document: self.__key(*document))
+        if self.at is not None:
+            documents = [document for document in documents if self.__key(*document)[:len(self.at)] >= self.at]
+        if self.after is not None:
+            documents = [document for document in documents if self.__key(*document)[:len(self.after)] > self.after]
+        for id, data in documents[:self.count]:
+            self.client.reads += 1
+            yield FakeDocument(id, data)
+
+
+class FakeFirestore:
+    '''In-memory stand-in of the firestore client'''
+
+    def __init__(self):
+        self.collections = {}
+        self.reads = 0
+
+    def collection(self, name: str) -> FakeQuery:
+        return FakeQuery(self, name)
+
+    def add(self, emform_id, id: str, data: dict):
+        self.collections.setdefault(f'emform_{emform_id}', {})[id] = data
+
+
+class EmformTestCase(TestCase):
+    '''Emform of a user, with services reading submissions from an in-memory firestore'''
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(email='ada@example.com', username='ada1234', photo='profile/photo/ada.png', is_signed=True, is_active=True)
+        project = Project.objects.create(user=self.user, name='project')
+        api = Api.objects.create(project=project, product=Product.emforms.name, type='QNA')
+        self.emform = Emform.objects.create(api=api, name='contact', config=[{'name': 'email', 'type': 'email', 'required': True}])
+        self.firestore = FakeFirestore()
+        patcher = mock.patch('app.emforms.services.firestore')
+        patcher.start().client.return_value = self.firestore
+        self.addCleanup(patcher.stop)
+
+
+class ContentTest(EmformTestCase):
+    '''Paging by cursor and streaming of submissions.'''
+
+    def setUp(self):
+        super().setUp()
+        for i in range(25):
+            self.firestore.add(self.emform.pk, f'doc{i:03d}', {'email': f'user{i}@example.com', 'age': i})
+
+    def __pages(self, limit) -> list:
+        pages = []
+        cursor = None
+        while True:
+            content = EmformContentService.get_content(self.emform.pk, self.user, limit=limit, cursor=cursor)
+            pages.append([data['age'] for data in content['data']])
+            cursor = content['next']
+            if cursor is None:
+                return pages
+
+    def test_pages(self):
+        pages = self.__pages(10)
+        self.assertEqual([len(page) for page in pages], [10, 10, 5])
+        self.assertEqual(sum(pages, []), list(range(25)))
+
+    @override_settings(EMFORM_CONTENT_PAGE_SIZE=20, EMFORM_CONTENT_MAX_PAGE_SIZE=20)
+    def test_page_size_bounds(self):
+        self.assertEqual([len(page) for page in self.__pages(100)], [20, 5])
+        self.assertEqual([len(page) for page in self.__pages(0)], [20, 5])
+        # negative sizes read one submission per page instead of none
+        self.assertEqual(len(self.__pages(-5)), 25)
+
+    @override_settings(EMFORM_CONTENT_STREAM_BATCH_SIZE=4)
+    def test_stream_ndjson(self):
+        batches = EmformContentService.stream(self.emform.pk, self.user)
+        # documents are read as batches are consumed, not all upfront
+        first = next(batches)
+        self.assertEqual(self.firestore.reads, 4)
+        lines = (first + ''.join(batches)).splitlines()
+        self.assertEqual([json.loads(line)['age'] for line in lines], list(range(25)))
+
+    @override_settings(EMFORM_CONTENT_STREAM_BATCH_SIZE=4)
+    def test_stream_csv(self):
+        rows = ''.join(EmformContentService.stream(self.emform.pk, self.user, EmformContentService.CSV, ['email'])).splitlines()
+        self.assertEqual(rows[0], 'email')
+        self.assertEqual(rows[1:], [f'user{i}@example.com' for i in range(25)])
+
+
+    def test_other_user(self):
+        other = User.objects.create(email='bob@example.com', username='bob1234', photo='profile/photo/bob.png', is_signed=True, is_active=True)
+        client = APIClient()
+        client.force_authenticate(other)
+        for query in ('', '?stream=ndjson', '?stream=csv'):
+            response = client.get(f'/api/emforms/v1/content/{self.emform.pk}/{query}')
+            self.assertEqual(response.data['errors'], {'server': ['No emform found.']})
+        self.assertEqual(self.firestore.reads, 0)
+
+        # the owner streams every submission
+        client.force_authenticate(self.user)
+        response = client.get(f'/api/emforms/v1/content/{self.emform.pk}/?stream=ndjson')
+        self.assertEqual(len(b''.join(response.streaming_content).splitlines()), 25)
+
+
+class MirrorTest(EmformTestCase):
+    '''Mirroring submissions from firestore and querying the mirror.'''
+
+    START = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+    def setUp(self):
+        super().setUp()
+        # three submissions share every timestamp
+        for i in range(30):
+            self.__add(f'doc{i:03d}', i // 3, age=i % 5, vip=i % 7 == 0)
+
+    def __add(self, id: str, minutes: int, **data):
+        self.firestore.add(self.emform.pk, id, {'email': f'{id}@example.com', **data, 'submitted_on': self.START + timedelta(minutes=minutes)})
+
+    def __sync(self, **options) -> int:
+        return EmformMirrorService.sync(self.emform.pk, client=self.firestore, batch_size=4, **options)
+
+    def test_incremental(self):
+        self.assertEqual(self.__sync(), 30)
+        self.assertEqual(Submission.objects.filter(emform=self.emform).count(), 30)
+        state = SubmissionSyncState.objects.get(emform=self.emform)
+        self.assertEqual((state.high_water, state.last_doc_id), (self.START + timedelta(minutes=9), 'doc029'))
+
+        # a late submission tying the high-water timestamp sorts before the last mirrored one, and a newer one
+        self.__add('aaa', 9)
+        self.__add('doc100', 20)
+        self.__sync()
+        self.assertEqual(set(Submission.objects.filter(emform=self.emform, doc_id__in=['aaa', 'doc100']).values_list('doc_id', flat=True)), {'aaa', 'doc100'})
+        self.assertEqual(Submission.objects.filter(emform=self.emform).count(), 32)
+        self.assertEqual(SubmissionSyncState.objects.get(emform=self.emform).last_doc_id, 'doc100')
+
+    def test_full_resync(self):
+        self.__sync()
+        del self.firestore.collections[f'emform_{self.emform.pk}']['doc000']
+        # submissions without the timestamp field are only found by a full sync
+        self.firestore.add(self.emform.pk, 'untimed', {'email': 'untimed@example.com'})
+        self.assertEqual(self.__sync(full=True), 30)
+        doc_ids = set(Submission.objects.filter(emform=self.emform).values_list('doc_id', flat=True))
+        self.assertNotIn('doc000', doc_ids)
+        self.assertIn('untimed', doc_ids)
+        self.assertEqual(SubmissionSyncState.objects.get(emform=self.emform).last_doc_id, 'doc029')
+
+    def test_timestamp_not_datetime(self):
+        self.firestore.collections.clear()
+        for i in range(10):
+            self.firestore.add(self.emform.pk, f'doc{i:03d}', {'email': 'user@example.com', 'submitted_on': f'2024-01-01 10:{i:02d}'})
+        # pages move on by the raw field value, without a timestamp there is no high-water mark
+        self.assertEqual(self.__sync(), 10)
+        self.assertEqual(Submission.objects.filter(emform=self.emform).count(), 10)
+        self.assertIsNone(SubmissionSyncState.objects.get(emform=self.emform).high_water)
+
+    def test_filters(self):
+        self.__sync()
+        content = EmformContentService.get_mirrored_content(self.emform.pk, self.user, filters={'age': '2', 'vip': 'true'}, order='data.email')
+        self.assertEqual([data['email'] for data in content['data']], ['doc007@example.com'])
+        content = EmformContentService.get_mirrored_content(self.emform.pk, self.user, order='-data.age', limit=2, offset=-1)
+        self.assertEqual((content['count'], [data['age'] for data in content['data']], content['next']), (30, [4, 4], 2))
+
+    def test_other_user(self):
+        self.__sync()
+        other = User.objects.create(email='bob@example.com', username='bob1234', photo='profile/photo/bob.png', is_signed=True, is_active=True)
+        with self.assertRaises(Emform.DoesNotExist):
+            EmformContentService.get_mirrored_content(self.emform.pk, other)
+
+        client = APIClient()
+        client.force_authenticate(other)
+        response = client.get(f'/api/emforms/v1/content/{self.emform.pk}/?source=mirror')
+        self.assertEqual(response.data['errors'], {'server': ['No emform found.']})
+        client.force_authenticate(self.user)
+        response = client.get(f'/api/emforms/v1/content/{self.emform.pk}/?source=mirror')
+        self.assertEqual(response.data['data']['content']['count'], 30)
+
+    def test_summary(self):
+        Emform.objects.filter(pk=self.emform.pk).update(config=['email', 'age'])
+        self.__sync()
+        summary = EmformAggregateService.get_summary(self.emform.pk, self.user)
+        self.assertEqual(summary['count'], 30)
+        self.assertEqual(summary['daily'], {'2024-01-01': 30})
+        self.assertEqual(summary['fields']['age']['numeric'], {'min': 0, 'max': 4, 'mean': 2})
+        self.assertEqual(summary['fields']['age']['top'], [['0', 6], ['1', 6], ['2', 6], ['3', 6], ['4', 6]])
+        # distinct count is an estimate
+        self.assertAlmostEqual(summary['fields']['email']['distinct'], 30, delta=2)
+
+        # new submissions are added to the summary as they are mirrored
+        self.__add('doc100', 20, age=9)
+        self.__sync()
+        summary = EmformAggregateService.get_summary(self.emform.pk, self.user)
+        self.assertEqual((summary['count'], summary['fields']['age']['numeric']['max']), (31, 9))
+
+        client = APIClient()
+        client.force_authenticate(self.user)
+        response = client.get(f'/api/emforms/v1/content/{self.emform.pk}/summary/')
+        self.assertEqual(response.data['data']['summary']['count'], 31)
+        other = User.objects.create(email='bob@example.com', username='bob1234', photo='profile/photo/bob.png', is_signed=True, is_active=True)
+        client.force_authenticate(other)
+        response = client.get(f'/api/emforms/v1/content/{self.emform.pk}/summary/')
+        self.assertEqual(response.data['errors'], {'server': ['No emform found.']})
+
+    def test_summary_edited_submission(self):
+        Emform.objects.filter(pk=self.emform.pk).update(config=['email', 'age'])
+        self.__sync()
+        EmformAggregateService.get_summary(self.emform.pk, self.user)
+
+        # an edit at the high-water timestamp is read again by the next incremental sync, the summary is recounted
+        self.__add('doc029', 9, age=40)
+        self.__sync()
+        summary = EmformAggregateService.get_summary(self.emform.pk, self.user)
+        self.assertEqual((summary['count'], summary['fields']['age']['numeric']['max']), (30, 40))
+        self.assertEqual(dict(summary['fields']['age']['top'])['4'], 5)
+
+        # an edit of an older submission is only read by a full sync
+        self.__add('doc000', 0, age=50)
+        self.__sync()
+        self.assertEqual(EmformAggregateService.get_summary(self.emform.pk, self.user)['fields']['age']['numeric']['max'], 40)
+        self.__sync(full=True)
+        summary = EmformAggregateService.get_summary(self.emform.pk, self.user)
+        self.assertEqual((summary['count'], summary['fields']['age']['numeric']['max']), (30, 50))
+
+    def test_filter_keys_are_not_lookups(self):
+        self.__sync()
+        # each of these keys would be a lookup of data if it was interpolated into data__<key>
+        for key in ('contains', 'has_key', 'in', 'gt', 'isnull'):
+            content = EmformContentService.get_mirrored_content(self.emform.pk, self.user, filters={key: '1'})
+            self.assertEqual(content['count'], 0)
+        self.__add('doc200', 30, isnull=True)
+        self.__sync()
+        content = EmformContentService.get_mirrored_content(self.emform.pk, self.user, filters={'isnull': 'true'})
+        self.assertEqual([data['email'] for data in content['data']], ['doc200@example.com'])
+
+
+class AggregateTest(TestCase):
+    '''Distinct estimates and top values of field aggregates.'''
+
+    def test_hyperloglog(self):
+        hll = HyperLogLog(precision=10)
+        for i in range(100):
+            hll.add(f'user{i}@example.com')
+            hll.add(f'user{i}@example.com')
+        # small counts are linear counted, close to exact
+        self.assertAlmostEqual(hll.count(), 100, delta=3)
+
+        for i in range(100, 20000):
+            hll.add(f'user{i}@example.com')
+        # standard error is 1.04 / sqrt(1024), about 3%
+        self.assertAlmostEqual(hll.count(), 20000, delta=20000 * 0.1)
+        self.assertEqual(HyperLogLog(precision=10, registers=hll.dump()).count(), hll.count())
+
+    def test_top_k(self):
+        values = ['a'] * 50 + ['b'] * 30 + ['c'] * 20 + [f'rare{i}' for i in range(20)]
+        exact = FieldAggregate(capacity=100)
+        bounded = FieldAggregate(capacity=5)
+        for value in values:
+            exact.add(value)
+            bounded.add(value)
+        # with room for every value counts are exact
+        self.assertEqual(exact.summary(3)['top'], [('a', 50), ('b', 30), ('c', 20)])
+
+        # space-saving keeps heavy values first, counts overestimate by at most values / capacity
+        top = bounded.summary(3)['top']
+        self.assertEqual([value for value, _ in top], ['a', 'b', 'c'])
+        for (value, count), actual in zip(top, (50, 30, 20)):
+            self.assertTrue(actual <= count <= actual + len(values) // 5)
+
+    def test_field(self):
+        aggregate = FieldAggregate()
+        for value in (1, 2.5, None, '', ['x', 'y'], True):
+            aggregate.add(value)
+        summary = FieldAggregate(aggregate.state()).summary()
+        self.assertEqual((summary['filled'], summary['missing']), (4, 2))
+        # booleans and lists are counted as values, not as numbers
+        self.assertEqual(summary['numeric'], {'min': 1, 'max': 2.5, 'mean': 1.75})
+        self.assertEqual(summary['distinct'], 5)
+
+
+class QueryCountTest(TestCase):
+    '''Query budgets of emform endpoints, rows loaded while validating are reused by the services.'''
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(email='ada@example.com', username='ada1234', photo='profile/photo/ada.png', is_signed=True, is_active=True)
+        project = Project.objects.create(user=self.user, name='project')
+        self.api = Api.objects.create(project=project, product=Product.emforms.name, type='QNA', api_key_hash='emform')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_config(self):
+        config = [{'name': 'email', 'type': 'email', 'required': True}]
+        # api, emform insert, its change log and chatbots using it, api update and its change log
+        with self.assertNumQueries(6):
+            response = self.client.post('/api/emforms/v1/config/', {'api_id': self.api.pk, 'name': 'contact', 'config': config}, format='json')
+        self.assertTrue(response.data['success'])
+        self.assertEqual(Emform.objects.get(api=self.api).config, config)
+
+    def test_config_invalid_constraint(self):
+        response = self.client.post('/api/emforms/v1/config/', {'api_id': self.api.pk, 'name': 'contact', 'config': [{'name': 'email', 'type': 'text', 'minLength': '5'}]}, format='json')
+        self.assertEqual(response.data['errors']['config'], ['minLength of email must be a non negative integer.'])
+
+    def test_config_unknown_api(self):
+        with self.assertNumQueries(1):
+            response = self.client.post('/api/emforms/v1/config/', {'api_id': 0, 'name': 'contact', 'config': []}, format='json')
+        self.assertIn('api', response.data['errors'])
+
+
+class SchemaTest(TestCase):
+    '''Constraints of wrong types are rejected when the config is compiled, not when submissions arrive.'''
+
+    def test_constraint_types(self):
+        for field in (
+            {'name': 'email', 'type': 'text', 'minLength': '5'},
+            {'name': 'email', 'type': 'text', 'maxLength': -1},
+            {'name': 'age', 'type': 'number', 'min': '18'},
+            {'name': 'age', 'type': 'integer', 'max': True},
+            {'name': 'email', 'type': 'text', 'pattern': 5},
+            {'name': 'plan', 'type': 'select', 'options': 'free,pro'},
+        ):
+            with self.assertRaises(ValueError):
+                compile_config([field])
+
+        validate = compile_config([{'name': 'email', 'type': 'text', 'minLength': 5}, {'name': 'age', 'type': 'number', 'min': 18.5}])
+        self.assertEqual(validate({'email': 'ada', 'age': 20}), {'email': 'Must be atleast of 5 length.'})
+        self.assertEqual(validate({'email': 'ada@example.com', 'age': 18}), {'age': 'Must be atleast 18.5.'})
+
+    def test_date(self):
+        validate = compile_config([{'name': 'born', 'type': 'date'}])
+        self.assertEqual(validate({'born': '2023-02-28'}), {})
+        self.assertEqual(validate({'born': '2023-02-28T10:00:00Z'}), {})
+        for value in ('2023-02-30', '2023-02-28T25:00:00', 'soon', 20230228):
+            self.assertEqual(validate({'born': value}), {'born': 'Must be a date.'})
@@ -5,4 +5,6 @@ from . import views
 urlpatterns = [
     path('v1/config/', views.EmformConfig.as_view(), name='emform-config'),
     path('v1/content/<int:emform_id>/', views.EmformContent.as_view(), name='emform-content'),
+    path('v1/content/<int:emform_id>/summary/', views.EmformContentSummary.as_view(), name='emform-content-summary'),
+    path('v1/submit/', views.EmformSubmit.as_view(), name='emform-submit'),
 ]
\ No newline at end of file
@@ -1,10 +1,16 @@
+from django.http import StreamingHttpResponse
+from django.utils.dateparse import parse_datetime
 from rest_framework.views import APIView
 from rest_framework.permissions import IsAuthenticated
 from common.debug.log import Log
 from common.utils.response import Response
+from common.auth.permissions import IsExternalAuthenticated, IsApiKeyAuthenticated
 from common.auth.throttling import AuthenticatedUserThrottling
 from . import serializers
-from .services import EmformService, EmformContentService
+from .models import Emform
+from .services import EmformService, EmformContentService, EmformAggregateService, EmformSubmissionService
+from ..apis.models import Api
+from ..apis.services import ApiKeyService
 
 
 
@@ -54,12 +60,111 @@ class EmformContent(APIView):
     permission_classes = [IsAuthenticated]
     throttle_classes = [AuthenticatedUserThrottling]
 
+    @staticmethod
+    def __datetime(value):
+        if value is None:
+            return None
+        parsed = parse_datetime(value)
+        if parsed is None:
+            raise ValueError('Invalid date time.')
+        return parsed
+
     def get(self, request, emform_id):
         try:
-            content = EmformContentService.get_content(emform_id)
+            stream = request.query_params.get('stream', None)
+            if stream is not None:
+                if stream not in EmformContentService.STREAM_FORMATS:
+                    return Response.error('Invalid stream format.')
+
+                fields = request.query_params.get('fields', None)
+                fields = fields.split(',') if fields else None
+                response = StreamingHttpResponse(
+                    EmformContentService.stream(emform_id, request.user, stream, fields),
+                    content_type='text/csv' if stream == EmformContentService.CSV else 'application/x-ndjson'
+                )
+                response['Content-Disposition'] = f'attachment; filename="emform_{emform_id}.{stream}"'
+                return response
+
+            # reading from the local mirror with database side filtering, sorting and counting
+            if request.query_params.get('source', None) == 'mirror':
+                since = request.query_params.get('since', None)
+                until = request.query_params.get('until', None)
+                content = EmformContentService.get_mirrored_content(
+                    emform_id,
+                    request.user,
+                    filters={key[len('data.'):]: value for key, value in request.query_params.items() if key.startswith('data.')},
+                    since=EmformContent.__datetime(since),
+                    until=EmformContent.__datetime(until),
+                    order=request.query_params.get('order', None),
+                    limit=int(request.query_params.get('limit', 0)),
+                    offset=int(request.query_params.get('offset', 0))
+                )
+                return Response.success({
+                    'content': content
+                })
+
+            content = EmformContentService.get_content(
+                emform_id,
+                request.user,
+                limit=int(request.query_params.get('limit', 0)),
+                cursor=request.query_params.get('cursor', None)
+            )
             return Response.success({
                 'content': content
             })
+        except Emform.DoesNotExist:
+            return Response.error('No emform found.')
+        except ValueError as e:
+            return Response.error(str(e) if str(e).startswith('Invalid') else 'Invalid query.')
+        except Exception as e:
+            Log.error(e)
+            return Response.something_went_wrong()
+
+
+
+# Emform Content Summary, counts of mirrored submissions, edits of older submissions are counted after the next full sync
+class EmformContentSummary(APIView):
+    permission_classes = [IsAuthenticated]
+    throttle_classes = [AuthenticatedUserThrottling]
+
+    def get(self, request, emform_id):
+        try:
+            summary = EmformAggregateService.get_summary(emform_id, request.user)
+            return Response.success({
+                'summary': summary
+            })
+        except Emform.DoesNotExist:
+            return Response.error('No emform found.')
         except Exception as e:
             Log.error(e)
-            return Response.something_went_wrong()
\ No newline at end of file
+            return Response.something_went_wrong()
+
+
+
+# Emform Submission
+class EmformSubmit(APIView):
+    permission_classes = [IsExternalAuthenticated | IsApiKeyAuthenticated]
+
+    def post(self, request):
+        try:
+            serializer = serializers.EmformSubmissionBatchSerializer(data=request.data)
+            if serializer.is_valid():
+                data = serializer.validated_data
+                api_id = ApiKeyService.api_id(request, data.get('api_id'))
+                if api_id is None:
+                    return Response.error('Api id not specified.')
+
+                content = EmformSubmissionService.submit(api_id, data.get('submissions'))
+                return Response.success(content)
+
+            return Response.errors(serializer.errors)
+        except Api.DoesNotExist as e:
+            return Response.error(str(e))
+        except Emform.DoesNotExist:
+            return Response.error('No emform found.')
+        except ValueError:
+            # config saved before its constraints were checked
+            return Response.error('Invalid emform configuration.')
+        except Exception as e:
+            Log.error(e)
+            return Response.something_went_wrong()
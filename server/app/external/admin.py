@@ -1,3 +1,23 @@
 from django.contrib import admin
+from . import models
 
-# Register your models here.
+# usage batch admin panel
+class UsageBatchAdmin(admin.ModelAdmin):
+    list_display = ('id', 'key', 'created_on')
+
+admin.site.register(models.UsageBatch, UsageBatchAdmin)
+
+
+# product snapshot admin panel
+class ProductSnapshotAdmin(admin.ModelAdmin):
+    list_display = ('id', 'api', 'project', 'version', 'etag', 'updated_on')
+
+admin.site.register(models.ProductSnapshot, ProductSnapshotAdmin)
+
+
+# config change admin panel
+class ConfigChangeAdmin(admin.ModelAdmin):
+    list_display = ('id', 'entity', 'entity_id', 'action', 'project_id', 'api_id', 'created_on')
+    list_filter = ('entity', 'action')
+
+admin.site.register(models.ConfigChange, ConfigChangeAdmin)
@@ -0,0 +1,75 @@
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from common.platform.products import Product
+from common.platform.security import AES256
+from ...services import ExternalExportService, ProductSnapshotService
+from ....account.models import User
+from ....project.models import Project
+from ....apis.models import Api
+from ....chatbot.models import Chatbot
+from ....emforms.models import Emform
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Benchmarks serving product config to external servers, built per request against snapshots and cached etags.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=2000, help='Product requests per mode.')
+
+    # returns (requests/s, queries per request) of serve called requests times
+    def __measure(self, serve, requests: int) -> tuple:
+        queries = [0]
+
+        def counter(execute, sql, params, many, context):
+            queries[0] += 1
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(counter):
+            started = time.perf_counter()
+            for _ in range(requests):
+                serve()
+            elapsed = time.perf_counter() - started
+        return requests / elapsed, queries[0] / requests
+
+    def handle(self, *args, **options):
+        requests = options['requests']
+
+        # everything runs in one transaction rolled back at the end, so no rows are left behind
+        try:
+            with transaction.atomic():
+                user = User.objects.create(email='benchmark-snapshot@example.com', username='benchmark-snapshot', photo='profile/photo/benchmark.png')
+                project = Project.objects.create(user=user, name='benchmark')
+                emform_api = Api.objects.create(project=project, product=Product.emforms.name, type='QNA', api_key_hash='benchmark-snapshot-emform')
+                emform = Emform.objects.create(api=emform_api, name='contact', config=[{'name': 'email', 'type': 'email', 'required': True}])
+                api = Api.objects.create(
+                    project=project,
+                    product=Product.chatbot.name,
+                    type='QNA',
+                    api_key=AES256(settings.SERVER_ENC_KEY).encrypt('benchmark-snapshot-key'),
+                    api_key_hash='benchmark-snapshot-chatbot'
+                )
+                Chatbot.objects.create(api=api, name='bot', photo='chatbot/photo/bot.gif', engine='C-QnA', knowledge='We open at 9am.', use_emform=True, emform=emform)
+                ProductSnapshotService.rebuild(api.pk)
+
+                results = {
+                    'built': self.__measure(lambda: ExternalExportService.get_product(project.pk, api.pk), requests),
+                    'snapshot': self.__measure(lambda: ExternalExportService.get_product_snapshot(project.pk, api.pk), requests),
+                    'etag': self.__measure(lambda: ProductSnapshotService.etag(project.pk, api.pk), requests),
+                }
+                ProductSnapshotService.forget(project.pk, api.pk)
+                raise Rollback()
+        except Rollback:
+            pass
+
+        for label, (rate, queries) in results.items():
+            self.stdout.write(f'{label:<9} {rate:>10,.0f} requests/s  {queries:.1f} queries/request')
+        self.stdout.write(
+            f"snapshot {results['snapshot'][0] / results['built'][0]:.1f}x, "
+            f"etag (304) {results['etag'][0] / results['built'][0]:.1f}x faster than building"
+        )
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from ...services import ConfigChangeService
+
+
+class Command(BaseCommand):
+    help = 'Deletes configuration changes older than the retention period of the change feed.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=None, help='Changes kept, in days (CHANGE_FEED_RETENTION_DAYS by default).')
+
+    def handle(self, *args, **options):
+        deleted = ConfigChangeService.prune(options['days'])
+        self.stdout.write(f'{deleted} change(s) pruned.')
@@ -1,3 +1,45 @@
 from django.db import models
 
-# Create your models here.
+
+# Usage Batch Model, remembers applied usage batches by idempotency key
+class UsageBatch(models.Model):
+    key = models.CharField(max_length=100, unique=True)
+    response = models.JSONField(default=dict)
+    created_on = models.DateTimeField(auto_now_add=True, null=True)
+
+    def __str__(self) -> str:
+        return self.key
+
+
+# Product Snapshot Model, precomputed product configuration of an api served to external servers
+class ProductSnapshot(models.Model):
+    api = models.OneToOneField('apis.Api', on_delete=models.CASCADE)
+    project = models.ForeignKey('project.Project', on_delete=models.CASCADE)
+    version = models.IntegerField(default=0)
+    etag = models.CharField(default='', max_length=64)
+    api_key = models.TextField(default='')
+    product = models.JSONField(default=dict)
+    updated_on = models.DateTimeField(auto_now=True)
+
+    def __str__(self) -> str:
+        return f'{self.api_id} | v{self.version}'
+
+
+# Config Change Model, monotonic log of configuration changes, id is the feed cursor
+class ConfigChange(models.Model):
+    PROJECT = 'PROJECT'
+    API = 'API'
+    CHATBOT = 'CHATBOT'
+    EMFORM = 'EMFORM'
+    SAVE = 'SAVE'
+    DELETE = 'DELETE'
+
+    entity = models.CharField(default='', choices=((PROJECT, 'Project'), (API, 'Api'), (CHATBOT, 'Chatbot'), (EMFORM, 'Emform')), max_length=10)
+    entity_id = models.CharField(default='', max_length=36)
+    action = models.CharField(default=SAVE, choices=((SAVE, 'Save'), (DELETE, 'Delete')), max_length=10)
+    project_id = models.CharField(default='', max_length=36, blank=True)
+    api_id = models.BigIntegerField(null=True, blank=True)
+    created_on = models.DateTimeField(auto_now_add=True, null=True, db_index=True)
+
+    def __str__(self) -> str:
+        return f'{self.pk} | {self.entity} {self.entity_id} {self.action}'
@@ -0,0 +1,26 @@
+from rest_framework import serializers
+from django.conf import settings
+
+
+
+# Usage Serializer
+class UsageSerializer(serializers.Serializer):
+    project_id = serializers.CharField(max_length=36)
+    api_id = serializers.IntegerField()
+    count = serializers.IntegerField(min_value=1)
+
+
+# Usage Batch Serializer
+class UsageBatchSerializer(serializers.Serializer):
+    usage = UsageSerializer(many=True)
+
+    def validate(self, attrs):
+        usage = attrs.get('usage')
+
+        if usage is None or len(usage) == 0:
+            raise serializers.ValidationError({'usage': 'No usage provided.'})
+
+        if len(usage) > settings.USAGE_BATCH_MAX_SIZE:
+            raise serializers.ValidationError({'usage': f'Atmost {settings.USAGE_BATCH_MAX_SIZE} usage entries allowed in a batch.'})
+
+        return attrs
@@ -1,13 +1,27 @@
 from ..project.models import Project
 from ..apis.models import Api
+from ..apis.services import ApiService
 from ..chatbot.models import Chatbot
 from ..chatbot.services import ChatbotService
 from ..emforms.models import Emform
 from ..emforms.services import EmformService
 from ..billing.services import BillingService
-from common.platform.security import AES256
 from common.platform.products import Product
 from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from rest_framework.utils.encoders import JSONEncoder
+from common.debug.log import Log
+from common.platform.security import AES256
+from .models import UsageBatch, ProductSnapshot, ConfigChange
+import json
+import time
+import hashlib
+import threading
+from datetime import timedelta
 
 
 
@@ -27,25 +41,247 @@ class ExternalExportService:
     
     @staticmethod
     def get_product(project_id, api_id):
-        project = Project.objects.get(id=project_id)
-        api = Api.objects.get(id=api_id, project=project)
-        api_key = AES256(settings.SERVER_ENC_KEY).decrypt(api.api_key)
+        api = Api.objects.get(id=api_id, project__id=project_id)
+        api_key = ApiService.decrypt_api_key(api)
         if api.product == Product.chatbot.name:
-            product = Chatbot.objects.get(api=api)
+            product = ChatbotService.queryset().get(api=api)
             return {
                 'apikey': api_key,
                 'product': ChatbotService.to_json(product)
             }
         elif api.product == Product.emforms.name:
-            product = Emform.objects.get(api=api)
+            product = EmformService.queryset().get(api=api)
             return {
                 'apikey': api_key,
                 'product': EmformService.to_json(product)
             }
         raise Exception('No Product Found.')
     
+    @staticmethod
+    def get_product_snapshot(project_id, api_id):
+        '''returns precomputed product with current counters and its etag, building the snapshot if missing'''
+        snapshot = ProductSnapshot.objects.filter(api_id=api_id, project_id=project_id).first()
+        if snapshot is None:
+            snapshot = ProductSnapshotService.rebuild(api_id)
+            # comparing ids as stored, the requested id may differ in case
+            if snapshot is None or snapshot.project_id != Project._meta.pk.to_python(project_id):
+                raise Exception('No Product Found.')
+
+        # hits and price are counted with F() updates that do not rebuild snapshots, they are read per request
+        product, counters = ProductSnapshotService.with_counters(snapshot.product)
+        etag = f'{snapshot.etag[:-1]}-{counters}"'
+        ProductSnapshotService.cache_etag(project_id, api_id, etag)
+        return {
+            'apikey': AES256(settings.SERVER_ENC_KEY).decrypt(snapshot.api_key),
+            'product': product
+        }, etag
+
     @staticmethod
     def update_billing(project_id, api_id):
         return BillingService.update_billing(project_id, api_id)
-            
-            
\ No newline at end of file
+
+    @staticmethod
+    def update_billing_batch(key: str, usage: list) -> dict:
+        '''applies usage batch once per idempotency key, retries get the stored response'''
+        with transaction.atomic():
+            batch, created = UsageBatch.objects.select_for_update().get_or_create(key=key)
+            if not created:
+                return batch.response
+
+            prices = BillingService.apply_usage(usage)
+            batch.response = {'prices': prices}
+            batch.save(update_fields=['response'])
+            return batch.response
+
+
+
+
+class ProductSnapshotService:
+    '''Product Snapshot service, keeps versioned product configuration of apis ready for external servers.'''
+
+    @staticmethod
+    def __etag_key(project_id, api_id) -> str:
+        # ids as stored, so ids sent in another case or form share the key of the snapshot
+        try:
+            return f'{Project._meta.pk.to_python(project_id)}:{int(api_id)}:product-etag'
+        except (ValidationError, ValueError, TypeError):
+            return None
+
+    @staticmethod
+    def etag(project_id, api_id):
+        '''returns cached etag of product snapshot without touching database'''
+        key = ProductSnapshotService.__etag_key(project_id, api_id)
+        return cache.get(key) if key is not None else None
+
+    @staticmethod
+    def cache_etag(project_id, api_id, etag):
+        key = ProductSnapshotService.__etag_key(project_id, api_id)
+        if key is not None:
+            cache.set(key, etag, timeout=settings.PRODUCT_SNAPSHOT_ETAG_CACHE_SECONDS)
+
+    @staticmethod
+    def with_counters(product: dict) -> tuple:
+        '''returns product with hits and price of its apis as last flushed, and a digest of those counters'''
+        apis = [product.get('api'), (product.get('emform') or {}).get('api')]
+        apis = [api for api in apis if api]
+        rows = Api.objects.filter(pk__in=[api['id'] for api in apis]).values_list(
+            'id', 'hits_count', 'project__price_to_pay', 'project__next_pricing_date'
+        )
+        # rendered as json, as stored in the snapshot
+        counters = json.loads(json.dumps(
+            {str(id): [hits_count, price_to_pay, next_pricing_date] for id, hits_count, price_to_pay, next_pricing_date in rows},
+            cls=JSONEncoder
+        ))
+        for api in apis:
+            if str(api['id']) in counters:
+                api['hitsCount'], api['project']['priceToPay'], api['project']['nextPricingDate'] = counters[str(api['id'])]
+
+        digest = hashlib.sha256(json.dumps(counters, sort_keys=True).encode('utf-8')).hexdigest()[:8]
+        return product, digest
+
+    @staticmethod
+    def rebuild(api_id):
+        '''rebuilds product snapshot of api, returns None if api has no configured product'''
+        try:
+            api = Api.objects.get(id=api_id)
+            content = ExternalExportService.get_product(api.project_id, api.pk)
+        except (Api.DoesNotExist, Chatbot.DoesNotExist, Emform.DoesNotExist) as e:
+            ProductSnapshot.objects.filter(api_id=api_id).delete()
+            return None
+        except Exception as e:
+            Log.error(e)
+            return None
+
+        # storing product as plain json, as rendered to external servers
+        product = json.loads(json.dumps(content['product'], cls=JSONEncoder))
+        digest = hashlib.sha256(json.dumps(product, sort_keys=True).encode('utf-8')).hexdigest()[:16]
+
+        with transaction.atomic():
+            snapshot, created = ProductSnapshot.objects.select_for_update().get_or_create(api=api, defaults={'project_id': api.project_id})
+            snapshot.project_id = api.project_id
+            snapshot.version = snapshot.version + 1
+            snapshot.etag = f'"{snapshot.version}-{digest}"'
+            snapshot.api_key = Api.objects.values_list('api_key', flat=True).get(pk=api.pk)
+            snapshot.product = product
+            snapshot.save()
+
+        # served etags carry counters too, the next request caches the new one
+        ProductSnapshotService.forget(snapshot.project_id, api.pk)
+        return snapshot
+
+    @staticmethod
+    def rebuild_many(api_ids):
+        for api_id in set(api_ids):
+            ProductSnapshotService.rebuild(api_id)
+
+    @staticmethod
+    def schedule_rebuild(api_ids):
+        '''rebuilds snapshots once the current transaction commits'''
+        api_ids = list(api_ids)
+        if api_ids:
+            transaction.on_commit(lambda: ProductSnapshotService.rebuild_many(api_ids))
+
+    @staticmethod
+    def forget(project_id, api_id):
+        key = ProductSnapshotService.__etag_key(project_id, api_id)
+        if key is not None:
+            cache.delete(key)
+
+    @staticmethod
+    def forget_counters(api_ids, project_ids):
+        '''drops cached etags of products embedding hits of the given apis or price of the given projects'''
+        apis = set(Api.objects.filter(Q(pk__in=api_ids) | Q(project_id__in=project_ids)).values_list('project_id', 'id'))
+        # chatbots embed the emform they use with its api
+        apis.update(Chatbot.objects.filter(
+            Q(emform__api_id__in=api_ids) | Q(emform__api__project_id__in=project_ids)
+        ).values_list('api__project_id', 'api_id'))
+        cache.delete_many([ProductSnapshotService.__etag_key(project_id, api_id) for project_id, api_id in apis])
+
+    @staticmethod
+    def schedule_forget_counters(api_ids, project_ids):
+        transaction.on_commit(lambda: ProductSnapshotService.forget_counters(api_ids, project_ids))
+
+    @staticmethod
+    def discard(project_id, api_id):
+        '''removes snapshot of api whose product is deleted, its etag is forgotten once the transaction commits'''
+        ProductSnapshot.objects.filter(api_id=api_id).delete()
+        transaction.on_commit(lambda: ProductSnapshotService.forget(project_id, api_id))
+
+
+
+
+class ConfigChangeService:
+    '''Config Change service, records configuration changes and serves them as a feed to external servers.'''
+
+    # long polls waiting in this worker
+    __lock = threading.Lock()
+    __waiting = 0
+
+    @staticmethod
+    def record(entity: str, entity_id, action: str, project_id='', api_id=None):
+        ConfigChange.objects.create(entity=entity, entity_id=str(entity_id), action=action, project_id=project_id or '', api_id=api_id)
+
+    @staticmethod
+    def __after(cursor: int, limit: int) -> list:
+        # ids are taken at insert but become visible at commit, so a lower id can commit after a higher one.
+        # only changes older than the visibility lag are served, by then every lower id has committed
+        visible_before = timezone.now() - timedelta(seconds=settings.CHANGE_FEED_VISIBILITY_SECONDS)
+        return list(ConfigChange.objects.filter(id__gt=cursor, created_on__lte=visible_before).order_by('id')[:limit])
+
+    @staticmethod
+    def __start_waiting() -> bool:
+        with ConfigChangeService.__lock:
+            if ConfigChangeService.__waiting >= settings.CHANGE_FEED_MAX_WAITERS:
+                return False
+            ConfigChangeService.__waiting += 1
+            return True
+
+    @staticmethod
+    def __stop_waiting():
+        with ConfigChangeService.__lock:
+            ConfigChangeService.__waiting -= 1
+
+    @staticmethod
+    def changes_after(cursor: int, limit: int = None, wait: float = 0) -> dict:
+        '''returns changes after cursor, waiting upto wait seconds for new changes when there are none'''
+        limit = min(limit or settings.CHANGE_FEED_PAGE_SIZE, settings.CHANGE_FEED_PAGE_SIZE)
+        wait = min(max(wait, 0), settings.CHANGE_FEED_MAX_WAIT_SECONDS)
+        deadline = time.monotonic() + wait
+
+        changes = ConfigChangeService.__after(cursor, limit)
+        # a waiting poll holds a request worker, so only a few wait at once and the rest answer right away
+        if not changes and wait > 0 and ConfigChangeService.__start_waiting():
+            try:
+                while not changes and time.monotonic() < deadline:
+                    time.sleep(settings.CHANGE_FEED_POLL_SECONDS)
+                    changes = ConfigChangeService.__after(cursor, limit)
+            finally:
+                ConfigChangeService.__stop_waiting()
+
+        # changes after cursor were pruned, the consumer has to reload everything
+        oldest = ConfigChange.objects.order_by('id').values_list('id', flat=True).first()
+        return {
+            'changes': [ConfigChangeService.to_json(change) for change in changes],
+            'cursor': changes[-1].pk if changes else cursor,
+            'more': len(changes) == limit,
+            'reset': oldest is not None and cursor < oldest - 1
+        }
+
+    @staticmethod
+    def prune(days: int = None) -> int:
+        '''deletes changes older than days (CHANGE_FEED_RETENTION_DAYS by default), returns number of deleted changes'''
+        days = days if days is not None else settings.CHANGE_FEED_RETENTION_DAYS
+        deleted, _ = ConfigChange.objects.filter(created_on__lt=timezone.now() - timedelta(days=days)).delete()
+        return deleted
+
+    @staticmethod
+    def to_json(change: ConfigChange) -> dict:
+        return {
+            'id': change.pk,
+            'entity': change.entity,
+            'entityId': change.entity_id,
+            'action': change.action,
+            'projectId': change.project_id,
+            'apiId': change.api_id,
+            'createdon': change.created_on
+        }
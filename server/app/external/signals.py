@@ -0,0 +1,97 @@
+from django.db.models.signals import post_save, pre_delete, post_delete
+from django.dispatch import receiver
+from ..account.models import User
+from ..project.models import Project
+from ..apis.models import Api
+from ..chatbot.models import Chatbot
+from ..emforms.models import Emform
+from ..billing.counters import HitCounter, counters_applied
+from .models import ConfigChange
+from .services import ProductSnapshotService, ConfigChangeService
+
+# user fields embedded into product snapshots through project profile
+PROFILE_FIELDS = {'first_name', 'last_name', 'username', 'photo', 'gender', 'acc_type'}
+
+
+def _project_of_api(instance):
+    # reusing api loaded with the instance
+    if type(instance).api.is_cached(instance):
+        return instance.api.project_id
+    return Api.objects.filter(pk=instance.api_id).values_list('project_id', flat=True).first()
+
+
+# rebuilding product snapshots and logging changes of apis whose configuration is changed
+@receiver(post_save, sender=Api)
+def api_saved(sender, instance: Api, raw=False, **kwargs):
+    if not raw:
+        ConfigChangeService.record(ConfigChange.API, instance.pk, ConfigChange.SAVE, instance.project_id, instance.pk)
+        ProductSnapshotService.schedule_rebuild([instance.pk])
+
+
+@receiver(post_delete, sender=Api)
+def api_deleted(sender, instance: Api, **kwargs):
+    ConfigChangeService.record(ConfigChange.API, instance.pk, ConfigChange.DELETE, instance.project_id, instance.pk)
+    ProductSnapshotService.forget(instance.project_id, instance.pk)
+
+
+@receiver(post_save, sender=Chatbot)
+def chatbot_saved(sender, instance: Chatbot, raw=False, **kwargs):
+    if not raw:
+        ConfigChangeService.record(ConfigChange.CHATBOT, instance.pk, ConfigChange.SAVE, _project_of_api(instance), instance.api_id)
+        ProductSnapshotService.schedule_rebuild([instance.api_id])
+
+
+@receiver(post_delete, sender=Chatbot)
+def chatbot_deleted(sender, instance: Chatbot, **kwargs):
+    project_id = _project_of_api(instance)
+    ConfigChangeService.record(ConfigChange.CHATBOT, instance.pk, ConfigChange.DELETE, project_id, instance.api_id)
+    ProductSnapshotService.discard(project_id, instance.api_id)
+
+
+@receiver(post_save, sender=Emform)
+def emform_saved(sender, instance: Emform, raw=False, **kwargs):
+    if not raw:
+        ConfigChangeService.record(ConfigChange.EMFORM, instance.pk, ConfigChange.SAVE, _project_of_api(instance), instance.api_id)
+
+        # chatbots embed the emform they use
+        api_ids = list(Chatbot.objects.filter(emform=instance).values_list('api_id', flat=True))
+        ProductSnapshotService.schedule_rebuild([instance.api_id] + api_ids)
+
+
+@receiver(pre_delete, sender=Emform)
+def emform_deleting(sender, instance: Emform, **kwargs):
+    # chatbots embedding the emform lose it, their snapshots are rebuilt after the delete commits
+    ProductSnapshotService.schedule_rebuild(Chatbot.objects.filter(emform=instance).values_list('api_id', flat=True))
+
+
+@receiver(post_delete, sender=Emform)
+def emform_deleted(sender, instance: Emform, **kwargs):
+    project_id = _project_of_api(instance)
+    ConfigChangeService.record(ConfigChange.EMFORM, instance.pk, ConfigChange.DELETE, project_id, instance.api_id)
+    ProductSnapshotService.discard(project_id, instance.api_id)
+
+
+@receiver(post_save, sender=Project)
+def project_saved(sender, instance: Project, raw=False, created=False, **kwargs):
+    if not raw:
+        ConfigChangeService.record(ConfigChange.PROJECT, instance.pk, ConfigChange.SAVE, instance.pk)
+        if not created:
+            ProductSnapshotService.schedule_rebuild(Api.objects.filter(project=instance).values_list('id', flat=True))
+
+
+@receiver(post_delete, sender=Project)
+def project_deleted(sender, instance: Project, **kwargs):
+    ConfigChangeService.record(ConfigChange.PROJECT, instance.pk, ConfigChange.DELETE, instance.pk)
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance: User, raw=False, created=False, update_fields=None, **kwargs):
+    if raw or created or (update_fields is not None and not PROFILE_FIELDS.intersection(update_fields)):
+        return
+    ProductSnapshotService.schedule_rebuild(Api.objects.filter(project__user=instance).values_list('id', flat=True))
+
+
+# products embed api hits and project price, their cached etags are dropped once flushed counters commit
+@receiver(counters_applied, sender=HitCounter)
+def counters_flushed(sender, api_ids, project_ids, **kwargs):
+    ProductSnapshotService.schedule_forget_counters(api_ids, project_ids)
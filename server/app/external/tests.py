@@ -1,3 +1,99 @@
-from django.test import TestCase
+from datetime import timedelta
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from django.core.cache import cache
+from django.conf import settings
+from common.platform.products import Product
+from common.platform.security import AES256
+from ..account.models import User
+from ..project.models import Project
+from ..apis.models import Api
+from ..chatbot.models import Chatbot
+from ..billing.counters import HitCounter
+from .models import ProductSnapshot, ConfigChange
+from .services import ExternalExportService, ProductSnapshotService, ConfigChangeService
 
-# Create your tests here.
+
+class ProductSnapshotTest(TestCase):
+    '''Snapshots follow their product, deleted products are no longer served.'''
+
+    def setUp(self):
+        cache.clear()
+        user = User.objects.create(email='ada@example.com', username='ada1234', photo='profile/photo/ada.png', is_active=True)
+        self.project = Project.objects.create(user=user, name='project')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.api = Api.objects.create(project=self.project, product=Product.chatbot.name, type='QNA', api_key=AES256(settings.SERVER_ENC_KEY).encrypt('key'))
+            self.chatbot = Chatbot.objects.create(api=self.api, name='bot', photo='chatbot/photo/bot.gif', engine='C-QnA')
+
+    def test_chatbot_deleted(self):
+        product, etag = ExternalExportService.get_product_snapshot(self.project.pk, self.api.pk)
+        self.assertEqual(product['product']['id'], self.chatbot.pk)
+        self.assertEqual(ProductSnapshotService.etag(self.project.pk, self.api.pk), etag)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.chatbot.delete()
+        self.assertFalse(ProductSnapshot.objects.filter(api=self.api).exists())
+        self.assertIsNone(ProductSnapshotService.etag(self.project.pk, self.api.pk))
+        with self.assertRaises(Exception):
+            ExternalExportService.get_product_snapshot(self.project.pk, self.api.pk)
+
+    def test_counters(self):
+        product, etag = ExternalExportService.get_product_snapshot(self.project.pk, self.api.pk)
+        self.assertEqual(product['product']['api']['hitsCount'], 0)
+        version = ProductSnapshot.objects.get(api=self.api).version
+
+        # flushed hits are F() updates, they drop the cached etag without rebuilding the snapshot
+        with self.captureOnCommitCallbacks(execute=True):
+            HitCounter.apply({self.api.pk: 3}, {self.project.pk: 1.5})
+        self.assertIsNone(ProductSnapshotService.etag(self.project.pk, self.api.pk))
+
+        product, counted = ExternalExportService.get_product_snapshot(self.project.pk, self.api.pk)
+        self.assertEqual(product['product']['api']['hitsCount'], 3)
+        self.assertEqual(product['product']['api']['project']['priceToPay'], 1.5)
+        self.assertNotEqual(counted, etag)
+        self.assertEqual(ProductSnapshot.objects.get(api=self.api).version, version)
+
+    def test_etag_key(self):
+        product, etag = ExternalExportService.get_product_snapshot(self.project.pk, self.api.pk)
+        # ids as sent in a query string share the key of the stored ids
+        self.assertEqual(ProductSnapshotService.etag(str(self.project.pk).upper(), str(self.api.pk)), etag)
+        self.assertIsNone(ProductSnapshotService.etag('unknown', 'unknown'))
+
+
+@override_settings(CHANGE_FEED_VISIBILITY_SECONDS=60)
+class ConfigChangeFeedTest(TestCase):
+    '''Changes are served in id order once older than the visibility lag.'''
+
+    def __record(self, entity_id: int, age: float) -> ConfigChange:
+        ConfigChangeService.record(ConfigChange.API, entity_id, ConfigChange.SAVE, api_id=entity_id)
+        change = ConfigChange.objects.latest('id')
+        ConfigChange.objects.filter(pk=change.pk).update(created_on=timezone.now() - timedelta(seconds=age))
+        return change
+
+    def test_visibility_lag(self):
+        first = self.__record(1, age=120)
+        second = self.__record(2, age=1)
+        feed = ConfigChangeService.changes_after(0)
+        self.assertEqual([change['id'] for change in feed['changes']], [first.pk])
+        self.assertEqual(feed['cursor'], first.pk)
+
+        ConfigChange.objects.filter(pk=second.pk).update(created_on=timezone.now() - timedelta(seconds=120))
+        feed = ConfigChangeService.changes_after(feed['cursor'])
+        self.assertEqual([change['id'] for change in feed['changes']], [second.pk])
+
+    @override_settings(CHANGE_FEED_MAX_WAITERS=0)
+    def test_wait_without_free_waiter(self):
+        # answers right away instead of holding the worker
+        feed = ConfigChangeService.changes_after(0, wait=5)
+        self.assertEqual(feed['changes'], [])
+
+    def test_prune(self):
+        old = self.__record(1, age=8 * 24 * 3600)
+        new = self.__record(2, age=120)
+        self.assertEqual(ConfigChangeService.prune(days=7), 1)
+        self.assertFalse(ConfigChange.objects.filter(pk=old.pk).exists())
+
+        # a consumer behind the pruned changes has to reload, one after them does not
+        self.assertTrue(ConfigChangeService.changes_after(0)['reset'])
+        self.assertFalse(ConfigChangeService.changes_after(old.pk)['reset'])
+        self.assertEqual(ConfigChangeService.changes_after(old.pk)['cursor'], new.pk)
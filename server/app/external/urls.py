@@ -6,4 +6,6 @@ urlpatterns = [
     path('v1/import/project/', views.ExternalExportProject.as_view(), name='external-export-project'),
     path('v1/import/product/', views.ExternalExportProduct.as_view(), name='external-export-product'),
     path('v1/import/update-billing/', views.ExternalExportBillingUpdate.as_view(), name='external-export-update-billing'),
+    path('v1/import/changes/', views.ExternalExportChanges.as_view(), name='external-export-changes'),
+    path('v1/import/usage/', views.ExternalExportUsageBatch.as_view(), name='external-export-usage'),
 ]
@@ -2,7 +2,9 @@ from rest_framework.views import APIView
 from common.utils.response import Response
 from common.debug.log import Log
 from common.auth.permissions import IsExternalAuthenticated
-from .services import ExternalExportService
+from constants.headers import Header
+from .serializers import UsageBatchSerializer
+from .services import ExternalExportService, ProductSnapshotService, ConfigChangeService
 
 
 
@@ -38,8 +40,18 @@ class ExternalExportProduct(APIView):
             if api_id is None:
                 return Response.error('Api id not specified')
             
-            product = ExternalExportService.get_product(project_id, api_id)
-            return Response.success(product)
+            # answering conditional requests from cached etag without database work
+            etag = ProductSnapshotService.etag(project_id, api_id)
+            if etag is not None and request.META.get('HTTP_IF_NONE_MATCH') == etag:
+                return Response.not_modified(etag)
+
+            product, etag = ExternalExportService.get_product_snapshot(project_id, api_id)
+            if request.META.get('HTTP_IF_NONE_MATCH') == etag:
+                return Response.not_modified(etag)
+
+            response = Response.success(product)
+            response['ETag'] = etag
+            return response
         except Exception as e:
             Log.error(e)
             return Response.something_went_wrong()
@@ -64,3 +76,43 @@ class ExternalExportBillingUpdate(APIView):
         except Exception as e:
             Log.error(e)
             return Response.something_went_wrong()
+
+
+
+class ExternalExportUsageBatch(APIView):
+    permission_classes = [IsExternalAuthenticated]
+
+    def post(self, request):
+        try:
+            key = request.META.get(Header.IDEMPOTENCY_KEY, None)
+            if key is None or len(key) == 0 or len(key) > 100:
+                return Response.error('Idempotency key not specified.')
+
+            serializer = UsageBatchSerializer(data=request.data)
+            if serializer.is_valid():
+                content = ExternalExportService.update_billing_batch(key, serializer.validated_data.get('usage'))
+                return Response.success(content)
+
+            return Response.errors(serializer.errors)
+        except Exception as e:
+            Log.error(e)
+            return Response.something_went_wrong()
+
+
+
+class ExternalExportChanges(APIView):
+    permission_classes = [IsExternalAuthenticated]
+
+    def get(self, request):
+        try:
+            cursor = int(request.query_params.get('cursor', 0))
+            limit = int(request.query_params.get('limit', 0))
+            wait = float(request.query_params.get('wait', 0))
+
+            content = ConfigChangeService.changes_after(cursor, limit=limit, wait=wait)
+            return Response.success(content)
+        except ValueError:
+            return Response.error('Invalid cursor, limit or wait.')
+        except Exception as e:
+            Log.error(e)
+            return Response.something_went_wrong()
@@ -0,0 +1,82 @@
+import os
+import time
+import tempfile
+import multiprocessing
+from django.core.cache.backends.db import DatabaseCache
+from django.core.management.base import BaseCommand
+from django.core.management.commands.createcachetable import Command as CreateCacheTable
+from django.db import connection, connections, DEFAULT_DB_ALIAS
+from common.cache.sqlite import SQLiteCache
+
+# cache table created in the default database for the run and dropped after it (also when left by an earlier run)
+TABLE = 'benchmark_cache'
+
+
+def _backends(directory: str) -> dict:
+    return {
+        'sqlite-wal': SQLiteCache(os.path.join(directory, 'cache.sqlite3'), {'OPTIONS': {'MAX_ENTRIES': 1000000}}),
+        'database': DatabaseCache(TABLE, {'OPTIONS': {'MAX_ENTRIES': 1000000}}),
+    }
+
+
+# increments one shared counter from a worker process
+def _incr(name: str, directory: str, count: int):
+    connections.close_all()
+    cache = _backends(directory)[name]
+    for _ in range(count):
+        cache.incr('counter')
+
+
+class Command(BaseCommand):
+    help = 'Benchmarks the shared SQLite cache backend against the database cache backend.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--operations', type=int, default=5000, help='Operations per benchmark.')
+        parser.add_argument('--processes', type=int, default=4, help='Processes incrementing one shared counter.')
+
+    def handle(self, *args, **options):
+        operations = options['operations']
+        processes = options['processes']
+        create = CreateCacheTable()
+        create.verbosity = 0
+        create.create_table(DEFAULT_DB_ALIAS, TABLE, dry_run=False)
+
+        try:
+            self.__run(operations, processes)
+        finally:
+            with connection.cursor() as cursor:
+                cursor.execute(f'DROP TABLE {connection.ops.quote_name(TABLE)}')
+
+    def __run(self, operations: int, processes: int):
+        with tempfile.TemporaryDirectory() as directory:
+            for name, cache in _backends(directory).items():
+                cache.clear()
+                results = []
+                for label, operation in (
+                    ('set', lambda i: cache.set(f'key:{i}', {'otp': 'hmac$0$0', 'email': 'user@example.com'}, 300)),
+                    ('get', lambda i: cache.get(f'key:{i}')),
+                    ('add', lambda i: cache.add(f'attempts:{i}', 0, 300)),
+                    ('incr', lambda i: cache.incr(f'attempts:{i}')),
+                ):
+                    started = time.perf_counter()
+                    for i in range(operations):
+                        operation(i)
+                    results.append(f'{label} {operations / (time.perf_counter() - started):,.0f}/s')
+
+                # concurrent increments from several processes, lost updates show a non atomic incr
+                cache.set('counter', 0, None)
+                connections.close_all()
+                started = time.perf_counter()
+                workers = [
+                    multiprocessing.Process(target=_incr, args=(name, directory, operations // processes))
+                    for _ in range(processes)
+                ]
+                for worker in workers:
+                    worker.start()
+                for worker in workers:
+                    worker.join()
+                elapsed = time.perf_counter() - started
+                expected = operations // processes * processes
+                results.append(f'{processes}-process incr {expected / elapsed:,.0f}/s, counter {cache.get("counter")}/{expected}')
+
+                self.stdout.write(f'{name:>10}: ' + ', '.join(results))
@@ -1,3 +1,91 @@
-from django.test import TestCase
+import os
+import time
+import tempfile
+import threading
+import multiprocessing
+from unittest import mock
+from django.test import SimpleTestCase
+from common.cache.sqlite import SQLiteCache
 
-# Create your tests here.
+
+# increments one shared counter from a worker process
+def _incr(cache: SQLiteCache, count: int):
+    for _ in range(count):
+        cache.incr('counter')
+
+
+class SQLiteCacheTest(SimpleTestCase):
+    '''Shared SQLite cache backend: values, expiry, culling and increments from threads and processes.'''
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.location = os.path.join(directory.name, 'cache', 'cache.sqlite3')
+        self.cache = SQLiteCache(self.location, {'OPTIONS': {'MAX_ENTRIES': 10, 'CULL_EVERY': 5}})
+
+    def test_get_set(self):
+        self.assertIsNone(self.cache.get('otp'))
+        self.cache.set('otp', {'email': 'ada@example.com'}, 60)
+        self.assertEqual(self.cache.get('otp'), {'email': 'ada@example.com'})
+        self.assertFalse(self.cache.add('otp', 'other', 60))
+        self.assertTrue(self.cache.add('new', 'value', 60))
+        self.assertEqual(self.cache.get_many(['otp', 'new', 'missing']), {'otp': {'email': 'ada@example.com'}, 'new': 'value'})
+        self.assertTrue(self.cache.delete('otp'))
+        self.assertFalse(self.cache.has_key('otp'))
+
+    def test_incr(self):
+        self.cache.set('attempts', 1, 60)
+        self.assertEqual(self.cache.incr('attempts'), 2)
+        self.assertEqual(self.cache.incr('attempts', 5), 7)
+        self.cache.set('score', 1.5, 60)
+        self.assertEqual(self.cache.incr('score'), 2.5)
+        with self.assertRaises(ValueError):
+            self.cache.incr('missing')
+
+    def test_expiry(self):
+        self.cache.set('short', 'value', 10)
+        self.cache.set('forever', 'value', None)
+        now = time.time()
+        with mock.patch('common.cache.sqlite.time.time', return_value=now + 11):
+            self.assertIsNone(self.cache.get('short'))
+            self.assertEqual(self.cache.get('forever'), 'value')
+            # an expired entry can be added again and is not incremented
+            with self.assertRaises(ValueError):
+                self.cache.incr('short')
+            self.assertTrue(self.cache.add('short', 1, 10))
+
+    def test_cull(self):
+        for i in range(20):
+            self.cache.set(f'key:{i}', i, 60 + i)
+        # culled every 5 writes, the entries closest to expiry go first
+        self.assertLessEqual(self.cache._connection().execute('SELECT COUNT(*) FROM cache').fetchone()[0], 10)
+        self.assertEqual(self.cache.get('key:19'), 19)
+
+    def test_threads(self):
+        self.cache.set('counter', 0, None)
+
+        def hit():
+            for _ in range(50):
+                self.cache.incr('counter')
+                self.cache.set(f'key:{threading.get_ident()}', 1, 60)
+
+        threads = [threading.Thread(target=hit) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.cache.get('counter'), 200)
+        # 201 writes counted without losing any, culled every 5
+        self.assertEqual(self.cache._writes, 1)
+
+    def test_processes(self):
+        self.cache.set('counter', 0, None)
+        # forked workers reopen the connection inherited from this process
+        context = multiprocessing.get_context('fork')
+        workers = [context.Process(target=_incr, args=(self.cache, 50)) for _ in range(4)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        self.assertEqual([worker.exitcode for worker in workers], [0] * 4)
+        self.assertEqual(self.cache.get('counter'), 200)
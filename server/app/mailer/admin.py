@@ -0,0 +1,9 @@
+from django.contrib import admin
+from . import models
+
+# outbox mail admin panel
+class MailAdmin(admin.ModelAdmin):
+    list_display = ('id', 'to', 'status', 'attempts', 'next_attempt_on', 'sent_on', 'created_on')
+    list_filter = ('status',)
+
+admin.site.register(models.Mail, MailAdmin)
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from ...services import MailOutboxService
+
+
+class Command(BaseCommand):
+    help = 'Drains the mail outbox over one reused connection.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Drain the outbox once and exit.')
+        parser.add_argument('--interval', type=float, default=None, help='Seconds to wait when the outbox is empty.')
+
+    def handle(self, *args, **options):
+        MailOutboxService.run(interval=options['interval'], once=options['once'])
+        self.stdout.write(str(MailOutboxService.metrics()))
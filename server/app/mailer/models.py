@@ -0,0 +1,30 @@
+from django.db import models
+from django.utils import timezone
+
+
+# Outbox Mail Model
+class Mail(models.Model):
+    PENDING = 'PENDING'
+    SENDING = 'SENDING'
+    SENT = 'SENT'
+    FAILED = 'FAILED'
+
+    to = models.EmailField(default='', max_length=255)
+    subject = models.CharField(default='', max_length=255)
+    body = models.TextField(default='')
+    reply_to = models.EmailField(default='', max_length=255, blank=True)
+    status = models.CharField(default=PENDING, choices=((PENDING, 'Pending'), (SENDING, 'Sending'), (SENT, 'Sent'), (FAILED, 'Failed')), max_length=10)
+    attempts = models.IntegerField(default=0)
+    last_error = models.TextField(default='', blank=True)
+    next_attempt_on = models.DateTimeField(default=timezone.now)
+    claimed_on = models.DateTimeField(null=True, blank=True)
+    sent_on = models.DateTimeField(null=True, blank=True)
+    created_on = models.DateTimeField(auto_now_add=True, null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_on']),
+        ]
+
+    def __str__(self) -> str:
+        return f'{self.to} | {self.status}'
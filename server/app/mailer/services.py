@@ -0,0 +1,179 @@
+import time
+import threading
+from datetime import timedelta
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from common.debug.log import Log
+from ..tasks.models import Task
+from ..tasks.services import TaskService
+from .models import Mail
+
+
+
+class MailOutboxService:
+    '''Mail Outbox Service for queueing mails and draining them over one reused connection'''
+    TASK = 'mailer.drain'
+
+    # in-process send latency metrics of the worker
+    __lock = threading.Lock()
+    __sent = 0
+    __failed = 0
+    __send_seconds = 0.0
+    __max_send_seconds = 0.0
+
+    @staticmethod
+    def enqueue(to: str, subject: str, body: str, reply_to: str = '') -> Mail:
+        mail = Mail.objects.create(to=to, subject=subject, body=body, reply_to=reply_to)
+        if settings.TASKS_ENABLED:
+            # waking the task worker once the mail is committed, without the task queue the mailer worker drains the outbox
+            transaction.on_commit(MailOutboxService.schedule)
+        return mail
+
+    @staticmethod
+    def schedule(eta=None):
+        '''queues a drain task due at eta (now by default), unless one due by then is already waiting'''
+        eta = eta or timezone.now()
+        if not Task.objects.filter(name=MailOutboxService.TASK, status=Task.PENDING, eta__lte=eta).exists():
+            TaskService.enqueue(MailOutboxService.TASK, eta=eta)
+
+    @staticmethod
+    def __claim(batch_size: int) -> list:
+        now = timezone.now()
+        stale_on = now - timedelta(seconds=settings.MAIL_OUTBOX_CLAIM_TIMEOUT_SECONDS)
+
+        # due pending mails, or mails claimed by a worker that died before finishing
+        due = Q(status=Mail.PENDING, next_attempt_on__lte=now) | Q(status=Mail.SENDING, claimed_on__lt=stale_on)
+        ids = list(Mail.objects.filter(due).order_by('next_attempt_on').values_list('id', flat=True)[:batch_size])
+        if not ids:
+            return []
+
+        # claiming rows with a conditional update, so concurrent workers never send the same mail twice
+        claimed = []
+        for id in ids:
+            if Mail.objects.filter(due, id=id).update(status=Mail.SENDING, claimed_on=now) == 1:
+                claimed.append(id)
+        return list(Mail.objects.filter(id__in=claimed))
+
+    @staticmethod
+    def __backoff(attempts: int) -> timedelta:
+        seconds = settings.MAIL_OUTBOX_BACKOFF_SECONDS * (2 ** (attempts - 1))
+        return timedelta(seconds=min(seconds, settings.MAIL_OUTBOX_MAX_BACKOFF_SECONDS))
+
+    @staticmethod
+    def __record(seconds: float, success: bool):
+        with MailOutboxService.__lock:
+            if success:
+                MailOutboxService.__sent += 1
+                MailOutboxService.__send_seconds += seconds
+                MailOutboxService.__max_send_seconds = max(MailOutboxService.__max_send_seconds, seconds)
+            else:
+                MailOutboxService.__failed += 1
+
+    @staticmethod
+    def drain(connection=None, batch_size: int = None) -> int:
+        '''sends one batch of due mails over the given (or a new) connection, returns number of mails processed'''
+        batch_size = batch_size or settings.MAIL_OUTBOX_BATCH_SIZE
+        mails = MailOutboxService.__claim(batch_size)
+        if not mails:
+            return 0
+
+        connection = connection or get_connection()
+        for mail in mails:
+            message = EmailMessage(
+                subject=mail.subject,
+                body=mail.body,
+                from_email=str(settings.EMAIL_HOST_USER),
+                to=[mail.to,],
+                reply_to=[mail.reply_to,] if mail.reply_to else None,
+                connection=connection
+            )
+            started = time.perf_counter()
+            try:
+                message.send(fail_silently=False)
+                MailOutboxService.__record(time.perf_counter() - started, True)
+                Mail.objects.filter(id=mail.id).update(status=Mail.SENT, sent_on=timezone.now(), attempts=mail.attempts + 1)
+            except Exception as e:
+                Log.error(e)
+                MailOutboxService.__record(time.perf_counter() - started, False)
+                attempts = mail.attempts + 1
+                status = Mail.FAILED if attempts >= settings.MAIL_OUTBOX_MAX_ATTEMPTS else Mail.PENDING
+                Mail.objects.filter(id=mail.id).update(
+                    status=status,
+                    attempts=attempts,
+                    last_error=str(e),
+                    next_attempt_on=timezone.now() + MailOutboxService.__backoff(attempts)
+                )
+
+                # reopening connection as smtp connection may have been dropped
+                try:
+                    connection.close()
+                    connection.open()
+                except Exception as e:
+                    Log.error(e)
+        return len(mails)
+
+    @staticmethod
+    def drain_all():
+        '''drains every due mail in batches over one connection, then schedules a drain for the earliest retry'''
+        connection = get_connection()
+        # failing to connect fails the task, so it is retried with backoff
+        connection.open()
+        try:
+            while MailOutboxService.drain(connection):
+                pass
+        finally:
+            connection.close()
+
+        retry_on = Mail.objects.filter(status=Mail.PENDING).order_by('next_attempt_on').values_list('next_attempt_on', flat=True).first()
+        if retry_on is not None:
+            MailOutboxService.schedule(retry_on)
+
+    @staticmethod
+    def run(interval: float = None, once: bool = False):
+        '''drains outbox continuously, keeping one connection open while there is work'''
+        interval = interval if interval is not None else settings.MAIL_OUTBOX_POLL_SECONDS
+        connection = get_connection()
+        try:
+            while True:
+                try:
+                    connection.open()
+                except Exception as e:
+                    Log.error(e)
+                    if once:
+                        return
+                    time.sleep(interval)
+                    continue
+
+                processed = MailOutboxService.drain(connection)
+                if processed:
+                    Log.info(MailOutboxService.metrics())
+                    continue
+
+                # closing idle connection until there is more work
+                connection.close()
+                if once:
+                    return
+                time.sleep(interval)
+        finally:
+            connection.close()
+
+    @staticmethod
+    def metrics() -> dict:
+        '''returns outbox queue depth and send latency of this worker'''
+        with MailOutboxService.__lock:
+            sent = MailOutboxService.__sent
+            failed = MailOutboxService.__failed
+            average = MailOutboxService.__send_seconds / sent if sent else 0
+            maximum = MailOutboxService.__max_send_seconds
+
+        return {
+            'queueDepth': Mail.objects.filter(status__in=[Mail.PENDING, Mail.SENDING]).count(),
+            'failedMails': Mail.objects.filter(status=Mail.FAILED).count(),
+            'sent': sent,
+            'failed': failed,
+            'avgSendSeconds': round(average, 4),
+            'maxSendSeconds': round(maximum, 4)
+        }
@@ -0,0 +1,8 @@
+from ..tasks.services import TaskService
+from .services import MailOutboxService
+
+
+# draining the mail outbox, one worker at a time so mails share one smtp connection
+@TaskService.register(MailOutboxService.TASK, concurrency=1, priority=10)
+def drain():
+    MailOutboxService.drain_all()
@@ -0,0 +1,59 @@
+from unittest import mock
+from django.core import mail
+from django.test import TransactionTestCase, override_settings
+from common.utils.messenger import Mailer
+from ..tasks.models import Task
+from ..tasks.services import TaskService
+from .models import Mail
+from .services import MailOutboxService
+
+
+@override_settings(DEBUG=False, MAIL_OUTBOX_ENABLED=True, EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend')
+class MailOutboxTest(TransactionTestCase):
+    '''Mails are stored in the outbox and drained in batches, by the mailer worker or the task worker.'''
+
+    def test_tasks_disabled(self):
+        with override_settings(TASKS_ENABLED=False):
+            Mailer.sendEmail('ada@example.com', 'Your OTP is 123456.')
+
+        # nothing is sent on the request thread
+        self.assertEqual(Mail.objects.get().status, Mail.PENDING)
+        self.assertFalse(Task.objects.exists())
+        self.assertEqual(len(mail.outbox), 0)
+
+        MailOutboxService.run(interval=0, once=True)
+        self.assertEqual(Mail.objects.get().status, Mail.SENT)
+        self.assertEqual(mail.outbox[0].to, ['ada@example.com'])
+
+    @override_settings(TASKS_ENABLED=True)
+    def test_tasks_enabled(self):
+        for i in range(3):
+            Mailer.sendEmail(f'user{i}@example.com', 'Your OTP is 123456.')
+
+        # one drain task for all mails waiting
+        self.assertEqual(Mail.objects.filter(status=Mail.PENDING).count(), 3)
+        self.assertEqual(Task.objects.get().name, MailOutboxService.TASK)
+        self.assertEqual(len(mail.outbox), 0)
+
+        with mock.patch('django.core.mail.backends.locmem.EmailBackend.open') as open:
+            TaskService.run(workers=1, interval=0, once=True)
+        self.assertEqual(Task.objects.get().status, Task.SUCCEEDED)
+        self.assertEqual(Mail.objects.filter(status=Mail.SENT).count(), 3)
+        self.assertEqual(len(mail.outbox), 3)
+        # the batch is sent over one connection
+        self.assertEqual(open.call_count, 1)
+
+    @override_settings(TASKS_ENABLED=True)
+    def test_retry(self):
+        Mailer.sendEmail('ada@example.com', 'Your OTP is 123456.')
+        with mock.patch('django.core.mail.backends.locmem.EmailBackend.send_messages', side_effect=ConnectionError('connection dropped')), mock.patch('app.mailer.services.Log'):
+            TaskService.run(workers=1, interval=0, once=True)
+
+        # the mail waits in the outbox for its backoff, with a drain task due when it ends
+        outboxed = Mail.objects.get()
+        self.assertEqual(outboxed.status, Mail.PENDING)
+        self.assertEqual(outboxed.attempts, 1)
+        self.assertIn('connection dropped', outboxed.last_error)
+        retry = Task.objects.get(status=Task.PENDING)
+        self.assertEqual(retry.eta, outboxed.next_attempt_on)
+        self.assertEqual(len(mail.outbox), 0)
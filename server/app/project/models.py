@@ -2,7 +2,8 @@ from datetime import timedelta
 from django.db import models
 from django.conf import settings
 from django.utils import timezone
-from common.utils import generator
+from common.utils.models import DirtyFieldsMixin, CompactIdField
+from common.utils import ids
 
 
 
@@ -10,8 +11,8 @@ def _next_pricing_date():
     return timezone.now() + timedelta(days=30)
 
 # Project Model
-class Project(models.Model):
-    id = models.CharField(default=generator.generate_identity, max_length=36, primary_key=True, unique=True)
+class Project(DirtyFieldsMixin, models.Model):
+    id = CompactIdField(legacy=ids.UUID, primary_key=True, unique=True)
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     name = models.CharField(default='', max_length=50)
     description = models.CharField(default='', max_length=200)
@@ -1,6 +1,7 @@
 from .models import Project, _next_pricing_date
 from ..account.services import ProfileService
 from common.debug.log import Log
+from common.utils.query import nested
 
 
 
@@ -8,6 +9,13 @@ from common.debug.log import Log
 class ProjectService:
     '''Project crud service'''
 
+    # relations read by to_json
+    RELATED = nested('user')
+
+    @staticmethod
+    def queryset():
+        return Project.objects.select_related(*ProjectService.RELATED)
+
     @staticmethod
     def can_create_project(user):
         return Project.objects.filter(user=user).count() < 3
@@ -28,7 +36,7 @@ class ProjectService:
     @staticmethod
     def update_project(user, id: str, data: dict):
         hosts_list = str(data.get('host')).split(',')
-        project = Project.objects.get(user=user, id=id)
+        project = ProjectService.queryset().get(user=user, id=id)
         project.name = data.get('name')
         project.description = data.get('description')
         project.envtype = data.get('envtype')
@@ -38,7 +46,7 @@ class ProjectService:
     
     @staticmethod
     def list_project(user):
-        projects_query = Project.objects.filter(user=user)
+        projects_query = ProjectService.queryset().filter(user=user)
         projects = [ProjectService.to_json(project) for project in projects_query]
         return projects
 
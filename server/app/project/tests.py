@@ -1,3 +1,21 @@
 from django.test import TestCase
+from ..account.models import User
+from .models import Project
+from .services import ProjectService
 
-# Create your tests here.
+
+class QueryCountTest(TestCase):
+    '''Listing projects runs a fixed number of queries whatever the number of rows.'''
+
+    def setUp(self):
+        self.user = User.objects.create(email='ada@example.com', username='ada1234', photo='profile/photo/ada.png', is_active=True)
+
+    def test_list_project(self):
+        Project.objects.create(user=self.user, name='project 0')
+        with self.assertNumQueries(1):
+            self.assertEqual(len(ProjectService.list_project(self.user)), 1)
+
+        for i in range(1, 5):
+            Project.objects.create(user=self.user, name=f'project {i}')
+        with self.assertNumQueries(1):
+            self.assertEqual(len(ProjectService.list_project(self.user)), 5)
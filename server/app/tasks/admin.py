@@ -0,0 +1,9 @@
+from django.contrib import admin
+from . import models
+
+# task admin panel
+class TaskAdmin(admin.ModelAdmin):
+    list_display = ('id', 'name', 'priority', 'status', 'attempts', 'eta', 'finished_on', 'created_on')
+    list_filter = ('status', 'name')
+
+admin.site.register(models.Task, TaskAdmin)
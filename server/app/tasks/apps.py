@@ -0,0 +1,11 @@
+from django.apps import AppConfig
+
+
+class TasksConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'app.tasks'
+
+    def ready(self):
+        # registering task handlers declared in tasks.py of every app
+        from django.utils.module_loading import autodiscover_modules
+        autodiscover_modules('tasks')
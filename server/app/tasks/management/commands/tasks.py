@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from ...services import TaskService
+
+
+class Command(BaseCommand):
+    help = 'Runs queued background tasks on a pool of worker threads.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=None, help='Number of worker threads.')
+        parser.add_argument('--once', action='store_true', help='Run due tasks and exit once the queue is empty.')
+        parser.add_argument('--interval', type=float, default=None, help='Seconds to wait for new tasks.')
+
+    def handle(self, *args, **options):
+        TaskService.run(workers=options['workers'], interval=options['interval'], once=options['once'])
+        self.stdout.write(str(TaskService.metrics()))
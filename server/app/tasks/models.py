@@ -0,0 +1,31 @@
+from django.db import models
+from django.utils import timezone
+
+
+# Task Model, queued background task run by the task worker
+class Task(models.Model):
+    PENDING = 'PENDING'
+    RUNNING = 'RUNNING'
+    SUCCEEDED = 'SUCCEEDED'
+    FAILED = 'FAILED'
+
+    name = models.CharField(default='', max_length=100)
+    kwargs = models.JSONField(default=dict)
+    priority = models.IntegerField(default=0)
+    status = models.CharField(default=PENDING, choices=((PENDING, 'Pending'), (RUNNING, 'Running'), (SUCCEEDED, 'Succeeded'), (FAILED, 'Failed')), max_length=10)
+    attempts = models.IntegerField(default=0)
+    max_attempts = models.IntegerField(default=5)
+    last_error = models.TextField(default='', blank=True)
+    eta = models.DateTimeField(default=timezone.now)
+    claimed_on = models.DateTimeField(null=True, blank=True)
+    finished_on = models.DateTimeField(null=True, blank=True)
+    created_on = models.DateTimeField(auto_now_add=True, null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'eta']),
+            models.Index(fields=['status', 'name']),
+        ]
+
+    def __str__(self) -> str:
+        return f'{self.name} | {self.status}'
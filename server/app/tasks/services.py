@@ -0,0 +1,184 @@
+import time
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from datetime import timedelta
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import Count, F, Q
+from django.utils import timezone
+from common.debug.log import Log
+from .models import Task
+
+
+
+class TaskType:
+    '''Registered task handler with its queueing defaults'''
+
+    def __init__(self, handler, concurrency: int = None, max_attempts: int = None, priority: int = 0):
+        self.handler = handler
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        self.priority = priority
+
+
+
+class TaskService:
+    '''Task Service for queueing tasks in the database and running them on a worker thread pool'''
+    __types = {}
+
+    # in-process run metrics of the worker
+    __lock = threading.Lock()
+    __succeeded = 0
+    __failed = 0
+    __retried = 0
+
+    @staticmethod
+    def register(name: str, concurrency: int = None, max_attempts: int = None, priority: int = 0):
+        '''decorator registering a function as handler of tasks named name, concurrency limits running tasks of this type across workers'''
+        def decorator(handler):
+            TaskService.__types[name] = TaskType(handler, concurrency, max_attempts, priority)
+            return handler
+        return decorator
+
+    @staticmethod
+    def enqueue(name: str, kwargs: dict = None, priority: int = None, eta=None, delay: float = None):
+        '''queues task to run after eta (or delay seconds), runs it inline when the task queue is disabled'''
+        task_type = TaskService.__types[name]
+        kwargs = kwargs or {}
+
+        if not settings.TASKS_ENABLED:
+            try:
+                task_type.handler(**kwargs)
+            except Exception as e:
+                Log.error(e)
+            return None
+
+        if eta is None:
+            eta = timezone.now() + timedelta(seconds=delay or 0)
+
+        # tasks enqueued inside a transaction are only visible to workers after it commits
+        return Task.objects.create(
+            name=name,
+            kwargs=kwargs,
+            priority=priority if priority is not None else task_type.priority,
+            max_attempts=task_type.max_attempts or settings.TASK_MAX_ATTEMPTS,
+            eta=eta
+        )
+
+    @staticmethod
+    def __stale_on():
+        return timezone.now() - timedelta(seconds=settings.TASK_CLAIM_TIMEOUT_SECONDS)
+
+    @staticmethod
+    def __claim(slots: int) -> list:
+        now = timezone.now()
+        stale_on = TaskService.__stale_on()
+
+        # due pending tasks, or tasks claimed by a worker that died before finishing
+        due = Q(status=Task.PENDING, eta__lte=now) | Q(status=Task.RUNNING, claimed_on__lt=stale_on)
+        candidates = list(
+            Task.objects.filter(due).order_by('-priority', 'eta', 'id').values_list('id', 'name')[:slots * 4]
+        )
+        if not candidates:
+            return []
+
+        # running tasks of types with a concurrency limit, counted across all workers
+        limited = {name for _, name in candidates if name in TaskService.__types and TaskService.__types[name].concurrency}
+        running = defaultdict(int)
+        if limited:
+            rows = Task.objects.filter(status=Task.RUNNING, claimed_on__gte=stale_on, name__in=limited).values('name').annotate(count=Count('id'))
+            for row in rows:
+                running[row['name']] = row['count']
+
+        claimed = []
+        for id, name in candidates:
+            if len(claimed) == slots:
+                break
+            task_type = TaskService.__types.get(name)
+            if task_type is not None and task_type.concurrency and running[name] >= task_type.concurrency:
+                continue
+            # claiming rows with a conditional update, so concurrent workers never run the same task twice
+            if Task.objects.filter(due, id=id).update(status=Task.RUNNING, claimed_on=now, attempts=F('attempts') + 1) == 1:
+                claimed.append(id)
+                running[name] += 1
+        return list(Task.objects.filter(id__in=claimed).order_by('-priority', 'eta', 'id'))
+
+    @staticmethod
+    def __backoff(attempts: int) -> timedelta:
+        seconds = settings.TASK_BACKOFF_SECONDS * (2 ** (attempts - 1))
+        return timedelta(seconds=min(seconds, settings.TASK_MAX_BACKOFF_SECONDS))
+
+    @staticmethod
+    def __record(outcome: str):
+        with TaskService.__lock:
+            if outcome == Task.SUCCEEDED:
+                TaskService.__succeeded += 1
+            elif outcome == Task.FAILED:
+                TaskService.__failed += 1
+            else:
+                TaskService.__retried += 1
+
+    @staticmethod
+    def execute(task: Task):
+        '''runs one claimed task and records its outcome, retrying with backoff until max attempts'''
+        try:
+            task_type = TaskService.__types.get(task.name)
+            if task_type is None:
+                raise Exception(f'No task handler registered for {task.name}.')
+            task_type.handler(**task.kwargs)
+            Task.objects.filter(id=task.id).update(status=Task.SUCCEEDED, finished_on=timezone.now(), last_error='')
+            TaskService.__record(Task.SUCCEEDED)
+        except Exception as e:
+            Log.error(e)
+            if task.attempts >= task.max_attempts or task.name not in TaskService.__types:
+                Task.objects.filter(id=task.id).update(status=Task.FAILED, finished_on=timezone.now(), last_error=str(e))
+                TaskService.__record(Task.FAILED)
+            else:
+                Task.objects.filter(id=task.id).update(
+                    status=Task.PENDING,
+                    last_error=str(e),
+                    eta=timezone.now() + TaskService.__backoff(task.attempts)
+                )
+                TaskService.__record(Task.PENDING)
+        finally:
+            # worker threads keep their own connections, closing them once they are unusable or too old
+            close_old_connections()
+
+    @staticmethod
+    def run(workers: int = None, interval: float = None, once: bool = False):
+        '''claims due tasks while there are free worker threads and runs them until stopped'''
+        workers = workers or settings.TASK_WORKERS
+        interval = interval if interval is not None else settings.TASK_POLL_SECONDS
+        running = set()
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='task-worker') as pool:
+            while True:
+                tasks = TaskService.__claim(workers - len(running)) if len(running) < workers else []
+                for task in tasks:
+                    running.add(pool.submit(TaskService.execute, task))
+
+                if once and not tasks and not running:
+                    return
+                if running:
+                    # waking up as soon as a thread is free, or after interval to pick up new tasks
+                    done, _ = wait(running, timeout=interval, return_when=FIRST_COMPLETED)
+                    running -= done
+                elif not tasks:
+                    time.sleep(interval)
+
+    @staticmethod
+    def metrics() -> dict:
+        '''returns queue depth and run counts of this worker'''
+        with TaskService.__lock:
+            succeeded = TaskService.__succeeded
+            failed = TaskService.__failed
+            retried = TaskService.__retried
+
+        return {
+            'pending': Task.objects.filter(status=Task.PENDING).count(),
+            'running': Task.objects.filter(status=Task.RUNNING).count(),
+            'failedTasks': Task.objects.filter(status=Task.FAILED).count(),
+            'succeeded': succeeded,
+            'failed': failed,
+            'retried': retried
+        }
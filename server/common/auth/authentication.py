@@ -2,6 +2,7 @@ from rest_framework import authentication
 from rest_framework import exceptions
 from app.account.models import User
 from .jwt_token import Jwt
+from .principal import PrincipalCache
 from constants.tokens import TokenType, HeaderToken
 from constants.headers import Header
 from ..debug.log import Log
@@ -22,8 +23,8 @@ class UserAuthentication(authentication.BaseAuthentication):
                 return None
 
             try:
-                # fetching user from database
-                user = User.objects.get(uid=payload['sub'])
+                # fetching user from principal cache or database
+                user = PrincipalCache.get(payload['sub'])
             except User.DoesNotExist:
                 raise exceptions.AuthenticationFailed('No such Account found.')
 
@@ -0,0 +1,143 @@
+import os
+import time
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from concurrent.futures.process import BrokenProcessPool
+import multiprocessing
+import numpy as np
+from django.conf import settings
+from django.contrib.auth import hashers
+from ..exception.exceptions import HashingOverloadError
+
+
+class PBKDF2PasswordHasher(hashers.PBKDF2PasswordHasher):
+    '''PBKDF2-SHA256 hasher whose iteration count is read from PASSWORD_HASH_ITERATIONS, hashes of other counts are upgraded on login'''
+
+    @property
+    def iterations(self):
+        return settings.PASSWORD_HASH_ITERATIONS
+
+
+# hashing pool process setup, pool processes run at lower priority so request processes keep the cpu during login bursts
+def _init_worker(nice: int):
+    import django
+    django.setup()
+    if nice:
+        os.nice(nice)
+
+# returns hash of password with the preferred hasher, run in pool process
+def _make(password: str, submitted: float):
+    started = time.time()
+    return hashers.make_password(password), started - submitted
+
+# returns whether password matches encoded and whether encoded must be rehashed, run in pool process
+def _verify(password: str, encoded: str, submitted: float):
+    started = time.time()
+    if not encoded:
+        # hashing anyway, so unknown users take as long as known ones
+        hashers.make_password(password)
+        return (False, False), started - submitted
+    valid = hashers.check_password(password, encoded)
+    must_update = valid and (
+        hashers.identify_hasher(encoded).algorithm != hashers.get_hasher('default').algorithm
+        or hashers.get_hasher('default').must_update(encoded)
+    )
+    return (valid, must_update), started - submitted
+
+
+
+class PasswordHashingService:
+    '''
+    Password hashing on a bounded pool of worker processes, so login bursts do not pin request workers.
+    Atmost PASSWORD_HASH_MAX_PENDING hashes are queued or running per process, callers beyond that wait
+    PASSWORD_HASH_QUEUE_TIMEOUT seconds for a slot and then get HashingOverloadError, as do hashes not
+    done within PASSWORD_HASH_TIMEOUT seconds. A pool broken by a dying worker process is replaced.
+    '''
+    __lock = threading.Lock()
+    __pool = None
+    __slots = None
+
+    # queue wait times (seconds) of the last hashes and rejected calls of this process
+    __queue_times = deque(maxlen=1000)
+    __rejected = 0
+    __completed = 0
+
+    @staticmethod
+    def __executor() -> ProcessPoolExecutor:
+        if PasswordHashingService.__pool is None:
+            with PasswordHashingService.__lock:
+                if PasswordHashingService.__slots is None:
+                    # slots outlive replaced pools, callers holding one release it to the same semaphore
+                    PasswordHashingService.__slots = threading.BoundedSemaphore(settings.PASSWORD_HASH_MAX_PENDING)
+                if PasswordHashingService.__pool is None:
+                    PasswordHashingService.__pool = ProcessPoolExecutor(
+                        max_workers=settings.PASSWORD_HASH_WORKERS,
+                        mp_context=multiprocessing.get_context('spawn'),
+                        initializer=_init_worker,
+                        initargs=(settings.PASSWORD_HASH_NICE,)
+                    )
+        return PasswordHashingService.__pool
+
+    @staticmethod
+    def __reset(broken: ProcessPoolExecutor):
+        '''drops broken pool, unless another caller replaced it already, the next call starts a new one'''
+        with PasswordHashingService.__lock:
+            if PasswordHashingService.__pool is broken:
+                PasswordHashingService.__pool = None
+        broken.shutdown(wait=False, cancel_futures=True)
+
+    @staticmethod
+    def __run(function, *args):
+        if not settings.PASSWORD_HASH_WORKERS:
+            # pool disabled, hashing on the calling thread
+            return function(*args, time.time())[0]
+
+        executor = PasswordHashingService.__executor()
+        if not PasswordHashingService.__slots.acquire(timeout=settings.PASSWORD_HASH_QUEUE_TIMEOUT):
+            with PasswordHashingService.__lock:
+                PasswordHashingService.__rejected += 1
+            raise HashingOverloadError()
+
+        try:
+            try:
+                result, queued = executor.submit(function, *args, time.time()).result(timeout=settings.PASSWORD_HASH_TIMEOUT)
+            except BrokenProcessPool:
+                # a worker process died (killed or out of memory), retrying once on a new pool
+                PasswordHashingService.__reset(executor)
+                executor = PasswordHashingService.__executor()
+                result, queued = executor.submit(function, *args, time.time()).result(timeout=settings.PASSWORD_HASH_TIMEOUT)
+        except TimeoutError:
+            with PasswordHashingService.__lock:
+                PasswordHashingService.__rejected += 1
+            raise HashingOverloadError()
+        finally:
+            PasswordHashingService.__slots.release()
+
+        with PasswordHashingService.__lock:
+            PasswordHashingService.__completed += 1
+            PasswordHashingService.__queue_times.append(queued)
+        return result
+
+    @staticmethod
+    def make(password: str) -> str:
+        '''returns encoded password made with the preferred hasher'''
+        return PasswordHashingService.__run(_make, password)
+
+    @staticmethod
+    def verify(password: str, encoded: str) -> tuple:
+        '''returns (valid, must_update), must_update is True when encoded was made with older hasher parameters'''
+        return PasswordHashingService.__run(_verify, password, encoded)
+
+    @staticmethod
+    def metrics() -> dict:
+        with PasswordHashingService.__lock:
+            queue_times = np.array(PasswordHashingService.__queue_times, dtype=np.float64)
+            rejected = PasswordHashingService.__rejected
+            completed = PasswordHashingService.__completed
+
+        metrics = {'completed': completed, 'rejected': rejected}
+        if len(queue_times):
+            p50, p99 = np.percentile(queue_times * 1000, [50, 99])
+            metrics.update({'queueP50Ms': round(float(p50), 3), 'queueP99Ms': round(float(p99), 3)})
+        return metrics
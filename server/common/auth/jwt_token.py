@@ -1,26 +1,103 @@
+import time
+import hashlib
+import threading
+from collections import OrderedDict
 from django.utils import timezone
 from datetime import timedelta
 from django.conf import settings
 from jwt import encode, decode
 
 
+class _VerifiedTokenCache:
+    '''Bounded LRU cache of verified JWT payloads, keyed by token digest and expiring at token exp.'''
+
+    def __init__(self, max_size: int = 4096):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.__entries = OrderedDict()
+        self.__lock = threading.Lock()
+
+    @staticmethod
+    def key(token, category: int) -> str:
+        return hashlib.sha256(f'{category}:{token}'.encode('utf-8')).hexdigest()
+
+    def get(self, key: str):
+        with self.__lock:
+            entry = self.__entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            exp, payload = entry
+            if exp <= time.time():
+                del self.__entries[key]
+                self.misses += 1
+                return None
+
+            self.__entries.move_to_end(key)
+            self.hits += 1
+            return payload
+
+    def set(self, key: str, payload: dict):
+        exp = payload.get('exp')
+        if not isinstance(exp, (int, float)) or self.max_size <= 0:
+            # tokens without expiry are never cached
+            return
+
+        with self.__lock:
+            self.__entries[key] = (exp, payload)
+            self.__entries.move_to_end(key)
+            while len(self.__entries) > self.max_size:
+                self.__entries.popitem(last=False)
+
+    def clear(self):
+        with self.__lock:
+            self.__entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> dict:
+        with self.__lock:
+            return {
+                'size': len(self.__entries),
+                'maxSize': self.max_size,
+                'hits': self.hits,
+                'misses': self.misses
+            }
+
+
 class Jwt:
     ACCESS = 0
     REFRESH = 1
 
+    cache = _VerifiedTokenCache(getattr(settings, 'JWT_VERIFIED_CACHE_SIZE', 4096))
+
     @staticmethod
     def validate(token, category: int = ACCESS):
         '''returns the payload if JWT token is valid'''
         payload = {}
         try:
+            key = _VerifiedTokenCache.key(token, category)
+            cached = Jwt.cache.get(key)
+            if cached is not None:
+                return (True, dict(cached))
+
             if category == Jwt.ACCESS:
                 payload = decode(token, settings.JWT_ACCESS_SECRET, algorithms=["HS256"])
             else:
                 payload = decode(token, settings.JWT_REFRESH_SECRET, algorithms=["HS256"])
+
+            Jwt.cache.set(key, dict(payload))
             return (True, payload)
         except:
             return (False, payload)
-    
+
+    @staticmethod
+    def cache_stats() -> dict:
+        '''returns verified token cache size, hits and misses'''
+        return Jwt.cache.stats()
+
     @staticmethod
     def generate(type: str, sub: str = None, data: dict = None, category: int = ACCESS, seconds: int = None):
         '''returns generated JWT token using the given payload type (token for type), data, t_type (token type, can be ACCESS or REFRESH) and seconds''' 
@@ -35,4 +35,22 @@ class IsWebIdentitySessionValid(permissions.BasePermission):
 class IsExternalAuthenticated(permissions.BasePermission):
     def has_permission(self, request, view):
         key = request.META.get(Header.EXTERNAL_SERVER_API_KEY)
-        return key == settings.EXTERNAL_SERVER_API_KEY
\ No newline at end of file
+        # a missing header never matches an unset key
+        return bool(key) and key == settings.EXTERNAL_SERVER_API_KEY
+
+
+
+# Product Api Key valid permission, the api of the key is kept on request
+class IsApiKeyAuthenticated(permissions.BasePermission):
+    def has_permission(self, request, view):
+        key = request.META.get(Header.PRODUCT_API_KEY)
+        if not key:
+            return False
+
+        from app.apis.models import Api
+        from app.apis.services import ApiKeyService
+        try:
+            request.api = ApiKeyService.resolve(key)
+            return True
+        except Api.DoesNotExist:
+            return False
@@ -0,0 +1,47 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import FileField
+from app.account.models import User
+
+
+class PrincipalCache:
+    '''Caches authenticated user rows by uid so that authentication does not hit the database on every request.'''
+
+    @staticmethod
+    def __key(uid: str) -> str:
+        return f'{uid}:principal'
+
+    @staticmethod
+    def __timeout() -> int:
+        return getattr(settings, 'AUTH_PRINCIPAL_CACHE_SECONDS', 60)
+
+    @staticmethod
+    def get(uid: str) -> User:
+        '''returns the user for uid, raises User.DoesNotExist if no such user exists'''
+        timeout = PrincipalCache.__timeout()
+        if timeout <= 0:
+            return User.objects.get(uid=uid)
+
+        key = PrincipalCache.__key(uid)
+        fields = cache.get(key)
+        if fields is not None:
+            # rebuilding model instance as if loaded from database, so saves issue UPDATE
+            return User.from_db('default', list(fields.keys()), list(fields.values()))
+
+        fields = User.objects.filter(uid=uid).values(*[field.attname for field in User._meta.concrete_fields]).get()
+        cache.set(key, fields, timeout=timeout)
+        return User.from_db('default', list(fields.keys()), list(fields.values()))
+
+    @staticmethod
+    def put(user: User):
+        '''caches user row loaded elsewhere, so the next get does not hit the database'''
+        timeout = PrincipalCache.__timeout()
+        if timeout > 0:
+            fields = {field.attname: getattr(user, field.attname) for field in User._meta.concrete_fields}
+            # file fields are cached by name, as values() returns them
+            fields.update({field.attname: fields[field.attname].name for field in User._meta.concrete_fields if isinstance(field, FileField)})
+            cache.set(PrincipalCache.__key(user.uid), fields, timeout=timeout)
+
+    @staticmethod
+    def invalidate(uid: str):
+        cache.delete(PrincipalCache.__key(uid))
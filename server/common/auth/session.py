@@ -0,0 +1,89 @@
+from datetime import timedelta
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+from app.account.models import User, LoginState
+from common.utils import generator
+from .principal import PrincipalCache
+
+
+class SessionStore:
+    '''
+    Login sessions, many per user (one per device), looked up by session id.
+    The session id to uid map is cached so refreshing access tokens does not hit the database,
+    a miss loads session and user in one query.
+    '''
+
+    @staticmethod
+    def __key(session_id: str) -> str:
+        return f'{session_id}:session'
+
+    @staticmethod
+    def __timeout(expires_on) -> int:
+        timeout = settings.SESSION_CACHE_SECONDS
+        if expires_on is not None:
+            timeout = min(timeout, int((expires_on - timezone.now()).total_seconds()))
+        return timeout
+
+    @staticmethod
+    def create(user: User, seconds: int, device: str = '') -> LoginState:
+        '''creates session of user expiring after seconds, oldest sessions beyond SESSION_MAX_PER_USER are removed'''
+        now = timezone.now()
+        session = LoginState.objects.create(
+            user=user,
+            session_id=generator.generate_identity(),
+            device=device[:255],
+            expires_on=now + timedelta(seconds=seconds)
+        )
+
+        # removing expired sessions and sessions over the per user limit
+        sessions = LoginState.objects.filter(user=user).order_by('-created_on', '-id').values_list('session_id', 'expires_on')
+        stale = [
+            session_id for i, (session_id, expires_on) in enumerate(sessions)
+            if i >= settings.SESSION_MAX_PER_USER or (expires_on is not None and expires_on <= now)
+        ]
+        if stale:
+            SessionStore.__remove(stale)
+
+        timeout = SessionStore.__timeout(session.expires_on)
+        if timeout > 0:
+            cache.set(SessionStore.__key(session.session_id), user.uid, timeout=timeout)
+        PrincipalCache.put(user)
+        return session
+
+    @staticmethod
+    def get_user(session_id: str) -> User:
+        '''returns user of session, None if the session was revoked or has expired'''
+        uid = cache.get(SessionStore.__key(session_id))
+        if uid is not None:
+            try:
+                return PrincipalCache.get(uid)
+            except User.DoesNotExist:
+                return None
+
+        session = LoginState.objects.select_related('user').filter(session_id=session_id).first()
+        if session is None or (session.expires_on is not None and session.expires_on <= timezone.now()):
+            return None
+
+        timeout = SessionStore.__timeout(session.expires_on)
+        if timeout > 0:
+            cache.set(SessionStore.__key(session_id), session.user_id, timeout=timeout)
+        PrincipalCache.put(session.user)
+        return session.user
+
+    @staticmethod
+    def __remove(session_ids: list):
+        LoginState.objects.filter(session_id__in=session_ids).delete()
+        cache.delete_many([SessionStore.__key(session_id) for session_id in session_ids])
+
+    @staticmethod
+    def revoke(session_id: str):
+        '''removes one session'''
+        SessionStore.__remove([session_id])
+
+    @staticmethod
+    def revoke_all(user: User):
+        '''removes every session of user, as on password change'''
+        session_ids = list(LoginState.objects.filter(user=user).values_list('session_id', flat=True))
+        if session_ids:
+            SessionStore.__remove(session_ids)
@@ -1,34 +1,101 @@
-from rest_framework.throttling import AnonRateThrottle, UserRateThrottle
+from rest_framework.throttling import SimpleRateThrottle, AnonRateThrottle, UserRateThrottle
 
-class SignupThrottling(AnonRateThrottle):
+
+class SlidingWindowRateThrottle(SimpleRateThrottle):
+    '''
+    Approximate sliding window throttle keeping two integer counters (previous and current window) per client
+    instead of a list of request timestamps. Counters are incremented atomically through the cache so that
+    several workers sharing one cache do not race.
+    '''
+
+    def __window_keys(self):
+        window = int(self.now // self.duration)
+        return f'{self.key}:{window - 1}', f'{self.key}:{window}'
+
+    def __estimate(self, previous, current):
+        elapsed = (self.now % self.duration) / self.duration
+        return previous * (1 - elapsed) + current
+
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+
+        self.now = self.timer()
+        previous_key, current_key = self.__window_keys()
+
+        # counting this request first, then checking, keeps concurrent workers consistent
+        self.cache.add(current_key, 0, timeout=self.duration * 2)
+        try:
+            current = self.cache.incr(current_key)
+        except ValueError:
+            # counter expired between add and incr
+            self.cache.set(current_key, 1, timeout=self.duration * 2)
+            current = 1
+
+        self.previous = self.cache.get(previous_key, 0)
+        self.current = current
+        if self.__estimate(self.previous, self.current) > self.num_requests:
+            # rejected requests are not counted
+            try:
+                self.cache.decr(current_key)
+            except ValueError:
+                pass
+            self.current = current - 1
+            return self.throttle_failure()
+        return True
+
+    def wait(self):
+        remaining_window = self.duration - (self.now % self.duration)
+        if self.current >= self.num_requests or self.previous <= 0:
+            return remaining_window
+
+        # time until the weighted previous window decays enough to admit one request
+        excess = self.__estimate(self.previous, self.current) + 1 - self.num_requests
+        return min(remaining_window, max(0, excess * self.duration / self.previous))
+
+
+class AnonSlidingWindowRateThrottle(SlidingWindowRateThrottle, AnonRateThrottle):
+    pass
+
+
+class UserSlidingWindowRateThrottle(SlidingWindowRateThrottle, UserRateThrottle):
+    pass
+
+
+
+class SignupThrottling(AnonSlidingWindowRateThrottle):
     scope = 'signup'
 
-class SignupVerificationThrottling(AnonRateThrottle):
+class SignupVerificationThrottling(AnonSlidingWindowRateThrottle):
     scope = 'signup_verification'
-    
-class ResentSignupOtpThrottling(AnonRateThrottle):
+
+class ResentSignupOtpThrottling(AnonSlidingWindowRateThrottle):
     scope = 'resent_signup_otp'
 
-class LoginThrottling(AnonRateThrottle):
+class LoginThrottling(AnonSlidingWindowRateThrottle):
     scope = 'login'
 
-class PasswordRecoveryThrottling(AnonRateThrottle):
+class PasswordRecoveryThrottling(AnonSlidingWindowRateThrottle):
     scope = 'password_recovery'
 
-class PasswordRecoveryVerificationThrottling(AnonRateThrottle):
+class PasswordRecoveryVerificationThrottling(AnonSlidingWindowRateThrottle):
     scope = 'password_recovery_verification'
 
-class PasswordRecoveryNewPasswordThrottling(AnonRateThrottle):
+class PasswordRecoveryNewPasswordThrottling(AnonSlidingWindowRateThrottle):
     scope = 'password_recovery_new_password'
 
-class ResentPasswordRecoveryOtpThrottling(AnonRateThrottle):
+class ResentPasswordRecoveryOtpThrottling(AnonSlidingWindowRateThrottle):
     scope = 'resent_password_recovery_otp'
 
-class AuthenticatedUserThrottling(UserRateThrottle):
+class AuthenticatedUserThrottling(UserSlidingWindowRateThrottle):
     scope = 'authenticated_user'
 
-class ChangeNamesThrottling(UserRateThrottle):
+class ChangeNamesThrottling(UserSlidingWindowRateThrottle):
     scope = 'change_names'
 
-class LogoutThrottling(UserRateThrottle):
+class LogoutThrottling(UserSlidingWindowRateThrottle):
     scope = 'logout'
\ No newline at end of file
@@ -0,0 +1,198 @@
+import os
+import time
+import pickle
+import sqlite3
+import threading
+from django.core.cache.backends.base import BaseCache, DEFAULT_TIMEOUT
+
+
+class SQLiteCache(BaseCache):
+    '''
+    Cache backend shared by all worker processes of one host, stored in a SQLite database in WAL mode.
+    Integers are stored as SQL integers so incr is a single UPDATE, other values are pickled.
+    Expired entries are skipped on read and removed while culling, which also keeps the entry count
+    below MAX_ENTRIES by dropping the entries closest to expiry.
+
+    CACHES = {'default': {'BACKEND': 'common.cache.sqlite.SQLiteCache', 'LOCATION': '/path/to/cache.sqlite3'}}
+    '''
+    pickle_protocol = pickle.HIGHEST_PROTOCOL
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        self._location = location
+        options = params.get('OPTIONS', {})
+        self._busy_timeout = int(options.get('BUSY_TIMEOUT', 5))
+        # entry count is checked every cull_every writes of a process instead of on every write
+        self._cull_every = int(options.get('CULL_EVERY', 100))
+        self._writes = 0
+        self._writes_lock = threading.Lock()
+        self._local = threading.local()
+
+    # returns connection of the current thread, reopened after a fork
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, 'connection', None)
+        if connection is not None and self._local.pid == os.getpid():
+            return connection
+
+        directory = os.path.dirname(self._location)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        connection = sqlite3.connect(self._location, timeout=self._busy_timeout, isolation_level=None, check_same_thread=False)
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('PRAGMA synchronous=NORMAL')
+        connection.execute(
+            'CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL) WITHOUT ROWID'
+        )
+        connection.execute('CREATE INDEX IF NOT EXISTS cache_expires ON cache (expires)')
+        self._local.connection = connection
+        self._local.pid = os.getpid()
+        return connection
+
+    def _encode(self, value):
+        if type(value) is int:
+            return value
+        return pickle.dumps(value, self.pickle_protocol)
+
+    @staticmethod
+    def _decode(value):
+        if isinstance(value, int):
+            return value
+        return pickle.loads(value)
+
+    @staticmethod
+    def _alive():
+        return '(expires IS NULL OR expires > ?)'
+
+    def _wrote(self, connection, count: int = 1):
+        # threads of a process share the write count, one of them culls
+        with self._writes_lock:
+            self._writes += count
+            cull = self._writes >= self._cull_every
+            if cull:
+                self._writes = 0
+        if cull:
+            self._cull(connection)
+
+    def _cull(self, connection):
+        connection.execute('DELETE FROM cache WHERE expires <= ?', (time.time(),))
+        count = connection.execute('SELECT COUNT(*) FROM cache').fetchone()[0]
+        if count > self._max_entries:
+            # dropping a fraction of entries, the ones closest to expiry first and never-expiring ones last
+            remove = max(count - self._max_entries, count // self._cull_frequency if self._cull_frequency else count)
+            connection.execute(
+                'DELETE FROM cache WHERE key IN (SELECT key FROM cache ORDER BY expires IS NULL, expires LIMIT ?)',
+                (remove,)
+            )
+
+    def get(self, key, default=None, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        row = self._connection().execute(
+            f'SELECT value FROM cache WHERE key = ? AND {self._alive()}', (key, time.time())
+        ).fetchone()
+        return default if row is None else self._decode(row[0])
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        connection = self._connection()
+        connection.execute(
+            'INSERT OR REPLACE INTO cache (key, value, expires) VALUES (?, ?, ?)',
+            (key, self._encode(value), self.get_backend_timeout(timeout))
+        )
+        self._wrote(connection)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        connection = self._connection()
+        # inserting, or replacing an expired entry, in one statement so concurrent adds have one winner
+        cursor = connection.execute(
+            'INSERT INTO cache (key, value, expires) VALUES (?, ?, ?) '
+            'ON CONFLICT (key) DO UPDATE SET value = excluded.value, expires = excluded.expires '
+            'WHERE cache.expires IS NOT NULL AND cache.expires <= ?',
+            (key, self._encode(value), self.get_backend_timeout(timeout), time.time())
+        )
+        self._wrote(connection)
+        return cursor.rowcount == 1
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        cursor = self._connection().execute(
+            f'UPDATE cache SET expires = ? WHERE key = ? AND {self._alive()}',
+            (self.get_backend_timeout(timeout), key, time.time())
+        )
+        return cursor.rowcount == 1
+
+    def incr(self, key, delta=1, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        connection = self._connection()
+        # one immediate transaction, so no other process writes between the update and the read back
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            cursor = connection.execute(
+                f"UPDATE cache SET value = value + ? WHERE key = ? AND typeof(value) = 'integer' AND {self._alive()}",
+                (delta, key, time.time())
+            )
+            if cursor.rowcount == 1:
+                value = connection.execute('SELECT value FROM cache WHERE key = ?', (key,)).fetchone()[0]
+            else:
+                value = None
+            connection.execute('COMMIT')
+        except Exception:
+            connection.execute('ROLLBACK')
+            raise
+
+        if value is None:
+            row = connection.execute(f'SELECT value FROM cache WHERE key = ? AND {self._alive()}', (key, time.time())).fetchone()
+            if row is None:
+                raise ValueError("Key '%s' not found" % key)
+            # other numbers (floats) are incremented with a read and a write, as the base backend does
+            value = self._decode(row[0]) + delta
+            connection.execute('UPDATE cache SET value = ? WHERE key = ?', (self._encode(value), key))
+        return value
+
+    def delete(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        cursor = self._connection().execute('DELETE FROM cache WHERE key = ?', (key,))
+        return cursor.rowcount == 1
+
+    def has_key(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        row = self._connection().execute(
+            f'SELECT 1 FROM cache WHERE key = ? AND {self._alive()}', (key, time.time())
+        ).fetchone()
+        return row is not None
+
+    def get_many(self, keys, version=None):
+        keys = {self.make_and_validate_key(key, version=version): key for key in keys}
+        if not keys:
+            return {}
+        rows = self._connection().execute(
+            f"SELECT key, value FROM cache WHERE key IN ({', '.join('?' * len(keys))}) AND {self._alive()}",
+            (*keys, time.time())
+        ).fetchall()
+        return {keys[key]: self._decode(value) for key, value in rows}
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        expires = self.get_backend_timeout(timeout)
+        rows = [(self.make_and_validate_key(key, version=version), self._encode(value), expires) for key, value in data.items()]
+        connection = self._connection()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            connection.executemany('INSERT OR REPLACE INTO cache (key, value, expires) VALUES (?, ?, ?)', rows)
+            connection.execute('COMMIT')
+        except Exception:
+            connection.execute('ROLLBACK')
+            raise
+        self._wrote(connection, len(rows))
+        return []
+
+    def delete_many(self, keys, version=None):
+        keys = [self.make_and_validate_key(key, version=version) for key in keys]
+        if keys:
+            self._connection().execute(f"DELETE FROM cache WHERE key IN ({', '.join('?' * len(keys))})", keys)
+
+    def clear(self):
+        self._connection().execute('DELETE FROM cache')
+
+    def close(self, **kwargs):
+        # connections are kept open per thread for the life of the process
+        pass
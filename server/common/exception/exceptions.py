@@ -19,4 +19,15 @@ class UserNotFoundError(Exception):
 class ProfileError(Exception):
     def __init__(self, message='Profile error.'):
         self.message = message
-        super().__init__(self.message)
\ No newline at end of file
+        super().__init__(self.message)
+
+class HashingOverloadError(Exception):
+    def __init__(self, message='Server is busy! Try again in a moment.'):
+        self.message = message
+        super().__init__(self.message)
+
+
+class KnowledgeIndexingError(Exception):
+    def __init__(self, message='Knowledge is being indexed! Try again in a moment.'):
+        self.message = message
+        super().__init__(self.message)
@@ -125,6 +125,10 @@ class Product:
     def product_types_model_choices():
         return Product.chatbot.types_model_choices + Product.emforms.types_model_choices
     
+    @staticmethod
+    def price_of(product):
+        return Product.chatbot.price if product == Product.chatbot.name else Product.emforms.price
+
     @staticmethod
     def is_product_type_valid(product, type):
         return (product == Product.chatbot.name and type in Product.chatbot.types) or (product == Product.emforms.name and type in Product.emforms.types)
@@ -1,13 +1,98 @@
+import base64
+import hmac
+import hashlib
+import threading
 from AesEverywhere import aes256
+from Cryptodome.Cipher import AES
+from Cryptodome.Random import get_random_bytes
+from django.conf import settings
+
+try:
+    # OpenSSL backed AES-GCM, much faster than pycryptodome GCM when installed
+    from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+except ImportError:
+    AESGCM = None
+
 
 class AES256:
-    def __init__(self, key):
+    '''
+    AES-256 cipher with two modes:
+    v1 - AesEverywhere CBC, key re-derived from passphrase and random salt on every call (legacy)
+    v2 - AES-GCM (authenticated), key derived once per process, ciphertext prefixed with "v2:"
+         and laid out as base64(nonce + cipher + tag)
+    '''
+    V1 = 1
+    V2 = 2
+    V2_PREFIX = 'v2:'
+
+    __KDF_SALT = b'conceptune:aes256:v2'
+    __KDF_ITERATIONS = 100000
+    __derived_keys = {}
+    __aeads = {}
+    __lock = threading.Lock()
+
+    def __init__(self, key, version: int = None):
         self.key = key
+        self.version = version if version is not None else getattr(settings, 'AES_CIPHER_VERSION', AES256.V2)
+
+    def __derived_key(self) -> bytes:
+        derived = AES256.__derived_keys.get(self.key)
+        if derived is None:
+            with AES256.__lock:
+                derived = AES256.__derived_keys.get(self.key)
+                if derived is None:
+                    derived = hashlib.pbkdf2_hmac('sha256', str(self.key).encode('utf-8'), AES256.__KDF_SALT, AES256.__KDF_ITERATIONS)
+                    AES256.__derived_keys[self.key] = derived
+        return derived
+
+    def __aead(self):
+        aead = AES256.__aeads.get(self.key)
+        if aead is None:
+            aead = AESGCM(self.__derived_key())
+            AES256.__aeads[self.key] = aead
+        return aead
+
+    @staticmethod
+    def is_legacy(cipher) -> bool:
+        return not cipher.startswith(AES256.V2_PREFIX)
 
     def encrypt(self, raw):
-        cipher = aes256.encrypt(raw, self.key)
-        return cipher.decode('utf-8')
+        if self.version == AES256.V1:
+            cipher = aes256.encrypt(raw, self.key)
+            return cipher.decode('utf-8')
+
+        nonce = get_random_bytes(12)
+        if AESGCM is not None:
+            sealed = self.__aead().encrypt(nonce, raw.encode('utf-8'), None)
+        else:
+            cipher, tag = AES.new(self.__derived_key(), AES.MODE_GCM, nonce=nonce).encrypt_and_digest(raw.encode('utf-8'))
+            sealed = cipher + tag
+        return AES256.V2_PREFIX + base64.b64encode(nonce + sealed).decode('utf-8')
 
     def decrypt(self, cipher):
-        raw = aes256.decrypt(cipher.encode('utf-8'), self.key)
-        return raw.decode('utf-8')
\ No newline at end of file
+        if AES256.is_legacy(cipher):
+            raw = aes256.decrypt(cipher.encode('utf-8'), self.key)
+            return raw.decode('utf-8')
+
+        data = base64.b64decode(cipher[len(AES256.V2_PREFIX):])
+        nonce, sealed = data[:12], data[12:]
+        if AESGCM is not None:
+            raw = self.__aead().decrypt(nonce, sealed, None)
+        else:
+            raw = AES.new(self.__derived_key(), AES.MODE_GCM, nonce=nonce).decrypt_and_verify(sealed[:-16], sealed[-16:])
+        return raw.decode('utf-8')
+
+    def decrypt_and_upgrade(self, cipher):
+        '''returns decrypted raw text and re-encrypted cipher if the given cipher is of an older version, otherwise None'''
+        raw = self.decrypt(cipher)
+        if self.version != AES256.V1 and AES256.is_legacy(cipher):
+            return raw, self.encrypt(raw)
+        return raw, None
+
+
+class KeyedHash:
+    '''Deterministic keyed hash (HMAC-SHA256) for indexed lookup of secrets stored encrypted.'''
+
+    @staticmethod
+    def digest(raw, key) -> str:
+        return hmac.new(str(key).encode('utf-8'), str(raw).encode('utf-8'), hashlib.sha256).hexdigest()
@@ -0,0 +1,95 @@
+'''
+Time-ordered compact ids, stored in 16 bytes.
+
+New ids use the UUIDv7 layout (48 bit unix milliseconds, version 7, 74 random bits) so they sort by creation
+time, and are written as 26 character Crockford base32 text (ULID style) which sorts the same way.
+Ids of older rows keep their text form and are packed into the same 16 bytes:
+    UUID - uuid4 text ("xxxxxxxx-xxxx-4xxx-yxxx-xxxxxxxxxxxx"), stored as its uuid bytes (version 4)
+    UID  - uuid4 text with the dashes replaced by one random digit, stored as uuid bytes with the version
+           nibble holding the digit (never 7, so they cannot be mistaken for new ids)
+'''
+import os
+import time
+import uuid
+
+
+UUID = 'uuid'
+UID = 'uid'
+
+ALPHABET = '0123456789ABCDEFGHJKMNPQRSTVWXYZ'
+DECODING = {char: i for i, char in enumerate(ALPHABET)}
+DECODING.update({char.lower(): i for char, i in list(DECODING.items())})
+DECODING.update({'O': 0, 'o': 0, 'I': 1, 'i': 1, 'L': 1, 'l': 1})
+
+VERSION = 7
+# version nibbles of legacy uids by their dash digit, skipping 7
+UID_VERSIONS = (0, 1, 2, 3, 4, 5, 6, 8, 9, 10)
+DASHES = (8, 13, 18, 23)
+
+
+# returns 16 bytes of a new id
+def generate_bytes() -> bytes:
+    value = (time.time_ns() // 1000000) << 80 | int.from_bytes(os.urandom(10), 'big')
+    value = value & ~(0xF << 76) | VERSION << 76
+    value = value & ~(0x3 << 62) | 0x2 << 62
+    return value.to_bytes(16, 'big')
+
+# returns text of a new id
+def generate() -> str:
+    return _base32(generate_bytes())
+
+def _base32(raw: bytes) -> str:
+    value = int.from_bytes(raw, 'big')
+    return ''.join(ALPHABET[(value >> shift) & 0x1F] for shift in range(125, -1, -5))
+
+def _version(raw: bytes) -> int:
+    return raw[6] >> 4
+
+# returns 16 bytes of id text, raises ValueError for text that is no id of the legacy format
+def encode(text: str, legacy: str = None) -> bytes:
+    if len(text) == 26:
+        value = 0
+        for char in text:
+            if char not in DECODING:
+                raise ValueError(f'Invalid id {text}.')
+            value = value << 5 | DECODING[char]
+        if value >> 128:
+            raise ValueError(f'Invalid id {text}.')
+        raw = value.to_bytes(16, 'big')
+        if _version(raw) != VERSION:
+            raise ValueError(f'Invalid id {text}.')
+        return raw
+
+    if len(text) == 36 and legacy == UUID:
+        raw = uuid.UUID(text).bytes
+        if _version(raw) == VERSION:
+            raise ValueError(f'Invalid id {text}.')
+        return raw
+
+    if len(text) == 36 and legacy == UID:
+        digit = text[DASHES[0]]
+        if not digit.isdigit() or any(text[i] != digit for i in DASHES) or text[14] != '4':
+            raise ValueError(f'Invalid id {text}.')
+        raw = bytearray(bytes.fromhex(''.join(char for i, char in enumerate(text) if i not in DASHES)))
+        raw[6] = UID_VERSIONS[int(digit)] << 4 | raw[6] & 0x0F
+        return bytes(raw)
+
+    raise ValueError(f'Invalid id {text}.')
+
+# returns id text of 16 bytes
+def decode(raw: bytes, legacy: str = None) -> str:
+    raw = bytes(raw)
+    version = _version(raw)
+    if version == VERSION or legacy is None:
+        return _base32(raw)
+
+    if legacy == UUID:
+        return str(uuid.UUID(bytes=raw))
+
+    digit = str(UID_VERSIONS.index(version))
+    text = bytearray(raw)
+    text[6] = 0x40 | text[6] & 0x0F
+    text = text.hex()
+    for i in DASHES:
+        text = text[:i] + digit + text[i:]
+    return text
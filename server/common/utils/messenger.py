@@ -5,11 +5,22 @@ from ..debug.log import Log
 class Mailer:
     @staticmethod
     def sendEmail(email, data):
-        '''sends email'''
+        '''queues email into outbox, sent later by the mailer worker (or the task worker when background tasks are enabled)'''
 
         if settings.DEBUG:
             # printing data only for Development
             Log.info(data)
+        elif settings.MAIL_OUTBOX_ENABLED:
+            try:
+                from app.mailer.services import MailOutboxService
+                MailOutboxService.enqueue(
+                    to=email,
+                    subject=f'{settings.APP_NAME} app',
+                    body=str(data),
+                    reply_to='support@example.com'
+                )
+            except Exception as e:
+                Log.error(e)
         else:
             try:
                 email = EmailMessage(
@@ -22,4 +33,4 @@ class Mailer:
                 email.send(fail_silently=False)
             except Exception as e:
                 Log.error(e)
-            
\ No newline at end of file
+            
@@ -0,0 +1,134 @@
+import uuid
+import pickle
+from django import forms
+from django.core import exceptions
+from django.db import models
+from . import ids
+
+
+class _Pickled(bytes):
+    '''pickled snapshot of a mutable field value'''
+
+
+
+class DirtyFieldsMixin(models.Model):
+    '''
+    Tracks fields modified since the row was loaded, so a bare save() writes only those columns
+    (plus auto_now fields) with update_fields. A save without modified fields writes nothing,
+    as save(update_fields=[]) does. New rows and explicit update_fields save as usual.
+    '''
+
+    class Meta:
+        abstract = True
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._track(field.attname for field in cls._meta.concrete_fields if field.attname in instance.__dict__)
+        return instance
+
+    def refresh_from_db(self, using=None, fields=None, **kwargs):
+        super().refresh_from_db(using=using, fields=fields, **kwargs)
+        self._track(fields or [field.attname for field in self._meta.concrete_fields])
+
+    # returns value as remembered, mutable values (json) are pickled as that is much cheaper than deep copies
+    @staticmethod
+    def _snapshot(value):
+        return _Pickled(pickle.dumps(value, pickle.HIGHEST_PROTOCOL)) if isinstance(value, (dict, list)) else value
+
+    # remembers current values of attnames as loaded
+    def _track(self, attnames):
+        loaded = self.__dict__.setdefault('_loaded_values', {})
+        for attname in attnames:
+            if attname in self.__dict__:
+                loaded[attname] = self._snapshot(self.__dict__[attname])
+
+    def dirty_fields(self) -> list:
+        '''returns attnames of fields changed since load, fields loaded later (deferred) and set count as changed'''
+        loaded = self.__dict__.get('_loaded_values', {})
+        dirty = []
+        for field in self._meta.concrete_fields:
+            if field.primary_key or field.attname not in self.__dict__:
+                continue
+            if field.attname not in loaded or self._snapshot(self.__dict__[field.attname]) != loaded[field.attname]:
+                dirty.append(field.attname)
+        return dirty
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None and not args and not kwargs.get('force_insert') and not self._state.adding:
+            update_fields = self.dirty_fields()
+            if update_fields:
+                update_fields += [field.attname for field in self._meta.concrete_fields if getattr(field, 'auto_now', False) and field.attname not in update_fields]
+            kwargs['update_fields'] = update_fields
+
+        super().save(*args, **kwargs)
+
+        saved = None if update_fields is None else set(update_fields)
+        self._track(field.attname for field in self._meta.concrete_fields if saved is None or field.name in saved or field.attname in saved)
+
+
+
+class CompactIdField(models.Field):
+    '''
+    Time-ordered id stored in 16 bytes (binary(16) on mysql, uuid on postgresql, blob on sqlite), its python value is the id text.
+    legacy names the text format of ids made before (ids.UUID or ids.UID), such ids keep working unchanged.
+    '''
+    description = 'Time-ordered compact id'
+    empty_strings_allowed = False
+    default_error_messages = {'invalid': '“%(value)s” is not a valid id.'}
+    DB_TYPES = {'mysql': 'binary(16)', 'postgresql': 'uuid', 'oracle': 'RAW(16)'}
+
+    def __init__(self, *args, legacy: str = None, **kwargs):
+        self.legacy = legacy
+        kwargs.setdefault('default', ids.generate)
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        if self.legacy is not None:
+            kwargs['legacy'] = self.legacy
+        if kwargs.get('default') is ids.generate:
+            del kwargs['default']
+        return name, path, args, kwargs
+
+    def db_type(self, connection):
+        return self.DB_TYPES.get(connection.vendor, 'blob')
+
+    def to_python(self, value):
+        if value is None:
+            return None
+        try:
+            if isinstance(value, uuid.UUID):
+                return ids.decode(value.bytes, self.legacy)
+            if isinstance(value, (bytes, bytearray, memoryview)):
+                return ids.decode(value, self.legacy)
+            # normalizing case and lookalike characters of the text
+            return ids.decode(ids.encode(str(value), self.legacy), self.legacy)
+        except (ValueError, IndexError):
+            raise exceptions.ValidationError(self.error_messages['invalid'], code='invalid', params={'value': value})
+
+    def get_prep_value(self, value):
+        return self.to_python(super().get_prep_value(value))
+
+    def get_db_prep_value(self, value, connection, prepared=False):
+        if not prepared:
+            value = self.get_prep_value(value)
+        if value is None:
+            return None
+        raw = ids.encode(value, self.legacy)
+        return uuid.UUID(bytes=raw) if connection.vendor == 'postgresql' else raw
+
+    def from_db_value(self, value, expression, connection):
+        if value is None:
+            return None
+        if isinstance(value, str) and connection.vendor != 'postgresql':
+            # text of a row not converted to 16 bytes yet (see "manage.py compact_ids")
+            return value
+        return self.to_python(uuid.UUID(value) if isinstance(value, str) else value)
+
+    def value_to_string(self, obj):
+        return self.value_from_object(obj)
+
+    def formfield(self, **kwargs):
+        return super().formfield(**{'form_class': forms.CharField, 'max_length': 36, **kwargs})
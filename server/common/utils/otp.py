@@ -1,15 +1,58 @@
 import random
 import bcrypt
+import hmac
+import hashlib
+import secrets
+from django.conf import settings
+from django.core.cache import cache
+from constants.tokens import TokenExpiry
+
+HMAC_PREFIX = 'hmac$'
+
+# returns random 6 digit OTP
+def _random_otp():
+    return str(random.random())[3:9]
+
+# returns bcrypt hashed OTP
+def _bcrypt_hash(OTP):
+    salt = bcrypt.gensalt(10)
+    return bcrypt.hashpw(OTP.encode('utf-8'), salt).decode('utf-8')
+
+# returns keyed HMAC digest of OTP in form hmac$<nonce>$<digest>
+def _hmac_hash(OTP, nonce=None):
+    nonce = nonce if nonce is not None else secrets.token_hex(8)
+    key = str(getattr(settings, 'OTP_HMAC_KEY', None) or settings.SECRET_KEY).encode('utf-8')
+    digest = hmac.new(key, f'{nonce}:{OTP}'.encode('utf-8'), hashlib.sha256).hexdigest()
+    return f'{HMAC_PREFIX}{nonce}${digest}'
+
+# returns True while the hashed OTP still has verification attempts left
+def _has_attempts_left(hashOTP):
+    key = 'otp:attempts:' + hashlib.sha256(hashOTP.encode('utf-8')).hexdigest()
+    cache.add(key, 0, timeout=TokenExpiry.OTP_EXPIRE_SECONDS)
+    try:
+        attempts = cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, timeout=TokenExpiry.OTP_EXPIRE_SECONDS)
+        attempts = 1
+    return attempts <= getattr(settings, 'OTP_MAX_ATTEMPTS', 5)
 
 # returns generated 6 digit OTP
 def generate():
-    OTP = str(random.random())[3:9]
-    salt = bcrypt.gensalt(10)
-    hashOTP = bcrypt.hashpw(OTP.encode('utf-8'), salt)
-    return OTP, hashOTP.decode('utf-8')
+    OTP = _random_otp()
+    if getattr(settings, 'OTP_ENGINE', 'hmac') == 'bcrypt':
+        return OTP, _bcrypt_hash(OTP)
+    return OTP, _hmac_hash(OTP)
 
 # check whether the OTP is valid or not
 def compare(OTP, hashOTP):
+    if not _has_attempts_left(hashOTP):
+        return False
+
+    # engine is picked from the stored hash, so OTPs issued before an engine switch still verify
+    if hashOTP.startswith(HMAC_PREFIX):
+        nonce = hashOTP[len(HMAC_PREFIX):].split('$')[0]
+        return hmac.compare_digest(_hmac_hash(OTP, nonce), hashOTP)
+
     if bcrypt.checkpw(OTP.encode('utf-8'), hashOTP.encode('utf-8')):
         return True
-    return False
\ No newline at end of file
+    return False
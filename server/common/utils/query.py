@@ -0,0 +1,83 @@
+from contextvars import ContextVar
+from django.core.exceptions import EmptyResultSet
+
+
+# returns select_related lookups for a relation and the relations nested under it
+def nested(relation: str, related: tuple = ()) -> tuple:
+    return (relation,) + tuple(f'{relation}__{lookup}' for lookup in related)
+
+# returns the one row matching lookup or None, in a single query (no exists() before get())
+def first(queryset, **lookup):
+    return next(iter(queryset.filter(**lookup)[:1]), None)
+
+
+
+class IdentityMap:
+    '''
+    Request scoped map of loaded rows by queryset and lookup, so a serializer's validate and the service
+    running after it share the same instance instead of fetching it again.
+    Outside a request (no map begun) fetch is a plain single query.
+    '''
+    __rows = ContextVar('identity_map', default=None)
+
+    @staticmethod
+    def begin():
+        return IdentityMap.__rows.set({})
+
+    @staticmethod
+    def end(token):
+        IdentityMap.__rows.reset(token)
+
+    @staticmethod
+    def __key(queryset, lookup: dict) -> tuple:
+        model = queryset.model
+        # primary key lookups share one entry however the key is named
+        lookup = {'pk' if name in ('pk', model._meta.pk.attname) else name: value for name, value in lookup.items()}
+        # rows are only shared by querysets of the same filters and joins, a filtered queryset may not match a row loaded without them
+        return (model._meta.label, str(queryset.query), tuple(sorted((name, str(value)) for name, value in lookup.items())))
+
+    @staticmethod
+    def fetch(queryset, **lookup):
+        '''returns row matching the unique lookup or None, loaded once per request'''
+        rows = IdentityMap.__rows.get()
+        if rows is None:
+            return first(queryset, **lookup)
+
+        queryset = queryset.all()
+        try:
+            key = IdentityMap.__key(queryset, lookup)
+        except EmptyResultSet:
+            # querysets that match nothing (none()) have no sql
+            return None
+        if key in rows:
+            return rows[key]
+
+        # missing rows are not remembered, they may be created later in the request
+        row = first(queryset, **lookup)
+        if row is not None:
+            rows[key] = row
+            rows[IdentityMap.__key(queryset, {'pk': row.pk})] = row
+        return row
+
+    @staticmethod
+    def forget(row):
+        '''drops every entry of row, as after deleting it'''
+        rows = IdentityMap.__rows.get()
+        if rows:
+            for key in [key for key, value in rows.items() if value is row]:
+                del rows[key]
+
+
+
+class IdentityMapMiddleware:
+    '''Begins an identity map for every request'''
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = IdentityMap.begin()
+        try:
+            return self.get_response(request)
+        finally:
+            IdentityMap.end(token)
@@ -54,6 +54,13 @@ class Response:
         response['errors'] = errors
         return Resp(response, status=200)
     
+    # not modified response
+    @staticmethod
+    def not_modified(etag):
+        response = Resp(status=304)
+        response['ETag'] = etag
+        return response
+
     # something went wrong response
     @staticmethod
     def something_went_wrong():
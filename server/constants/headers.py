@@ -3,4 +3,6 @@ class Header:
     USER_AGENT = 'HTTP_USER_AGENT'
     APP_API_KEY = 'HTTP_AAK'
     ACCOUNT_CREATION_KEY = 'HTTP_ACK'
-    EXTERNAL_SERVER_API_KEY = 'HTTP_ASAK'
\ No newline at end of file
+    EXTERNAL_SERVER_API_KEY = 'HTTP_ASAK'
+    PRODUCT_API_KEY = 'HTTP_PAK'
+    IDEMPOTENCY_KEY = 'HTTP_IDEMPOTENCY_KEY'
\ No newline at end of file
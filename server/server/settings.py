@@ -8,6 +8,8 @@ from corsheaders.defaults import default_headers
 load_dotenv()
 
 BASE_DIR = Path(__file__).resolve().parent.parent
+# runtime files of the host (shared cache), kept out of the source tree
+VAR_DIR = Path(getenv('VAR_DIR', '/var/tmp/server'))
 
 APP_NAME = getenv('APP_NAME')
 
@@ -37,6 +39,8 @@ INSTALLED_APPS = [
     'app.emforms',
     'app.external',
     'app.billing',
+    'app.mailer',
+    'app.tasks',
 ]
 
 MIDDLEWARE = [
@@ -48,6 +52,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'common.utils.query.IdentityMapMiddleware',
 ]
 
 ROOT_URLCONF = 'server.urls'
@@ -97,6 +102,18 @@ DATABASES = {
 #     }
 # }
 
+# Cache, shared by all worker processes of the host (otp, signup and recovery sessions, throttling)
+
+CACHES = {
+    'default': {
+        'BACKEND': 'common.cache.sqlite.SQLiteCache',
+        'LOCATION': getenv('CACHE_LOCATION', str(VAR_DIR / 'cache.sqlite3')),
+        'OPTIONS': {
+            'MAX_ENTRIES': int(getenv('CACHE_MAX_ENTRIES', 100000)),
+        },
+    }
+}
+
 # Firebase
 creds = credentials.Certificate(str(BASE_DIR / 'firebase_credentials.json'))
 firebase_admin.initialize_app(creds)
@@ -118,6 +135,24 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# Password Hashing (hashes run on a pool of PASSWORD_HASH_WORKERS niced processes, 0 hashes on the request thread)
+# hashes made with other iterations or hashers are upgraded on the next successful login
+
+PASSWORD_HASHERS = [
+    'common.auth.hashing.PBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+]
+PASSWORD_HASH_ITERATIONS = int(getenv('PASSWORD_HASH_ITERATIONS', 600000))
+PASSWORD_HASH_WORKERS = int(getenv('PASSWORD_HASH_WORKERS', 2))
+PASSWORD_HASH_MAX_PENDING = int(getenv('PASSWORD_HASH_MAX_PENDING', 16))
+PASSWORD_HASH_QUEUE_TIMEOUT = float(getenv('PASSWORD_HASH_QUEUE_TIMEOUT', 5))
+PASSWORD_HASH_TIMEOUT = float(getenv('PASSWORD_HASH_TIMEOUT', 30))
+PASSWORD_HASH_NICE = int(getenv('PASSWORD_HASH_NICE', 10))
+
 # Rest API Framework Configurations
 
 REST_FRAMEWORK = {
@@ -147,6 +182,22 @@ REST_FRAMEWORK = {
 
 JWT_ACCESS_SECRET = getenv('JWT_ACCESS_SECRET')
 JWT_REFRESH_SECRET = getenv('JWT_REFRESH_SECRET')
+JWT_VERIFIED_CACHE_SIZE = int(getenv('JWT_VERIFIED_CACHE_SIZE', 4096))
+
+# Principal Cache Config (staleness window in seconds, 0 disables)
+
+AUTH_PRINCIPAL_CACHE_SECONDS = int(getenv('AUTH_PRINCIPAL_CACHE_SECONDS', 60))
+
+# Login Sessions (session id to uid map cached for SESSION_CACHE_SECONDS, revoking a session removes its entry)
+
+SESSION_CACHE_SECONDS = int(getenv('SESSION_CACHE_SECONDS', 60 * 60))
+SESSION_MAX_PER_USER = int(getenv('SESSION_MAX_PER_USER', 10))
+
+# Otp Config (OTP_ENGINE can be 'hmac' or 'bcrypt')
+
+OTP_ENGINE = getenv('OTP_ENGINE', 'hmac')
+OTP_HMAC_KEY = getenv('OTP_HMAC_KEY')
+OTP_MAX_ATTEMPTS = int(getenv('OTP_MAX_ATTEMPTS', 5))
 
 # App api key
 
@@ -159,10 +210,88 @@ ACCOUNT_CREATION_KEY = getenv('ACCOUNT_CREATION_KEY')
 # Encryption Key
 
 SERVER_ENC_KEY = getenv('SERVER_ENC_KEY')
+AES_CIPHER_VERSION = int(getenv('AES_CIPHER_VERSION', 2))
+
+# Api Key Lookup
+
+API_KEY_HASH_KEY = getenv('API_KEY_HASH_KEY')
+API_KEY_LOOKUP_CACHE_SECONDS = 60
+API_KEY_LOOKUP_CACHE_SIZE = 10000
 
 # External api key
 
 EXTERNAL_SERVER_API_KEY = getenv('EXTERNAL_SERVER_API_KEY')
+USAGE_BATCH_MAX_SIZE = 1000
+PRODUCT_SNAPSHOT_ETAG_CACHE_SECONDS = 30
+CHANGE_FEED_PAGE_SIZE = 500
+CHANGE_FEED_MAX_WAIT_SECONDS = 10
+CHANGE_FEED_MAX_WAITERS = 4
+CHANGE_FEED_POLL_SECONDS = 0.5
+# changes are served once older than this, longer than any transaction recording them is expected to run
+CHANGE_FEED_VISIBILITY_SECONDS = 2
+CHANGE_FEED_RETENTION_DAYS = 7
+
+# Emform content
+
+EMFORM_CONTENT_PAGE_SIZE = 500
+EMFORM_CONTENT_MAX_PAGE_SIZE = 1000
+EMFORM_CONTENT_STREAM_BATCH_SIZE = 500
+EMFORM_SUBMISSION_TIMESTAMP_FIELD = getenv('EMFORM_SUBMISSION_TIMESTAMP_FIELD', 'submitted_on')
+EMFORM_MIRROR_BATCH_SIZE = 500
+EMFORM_MIRROR_POLL_SECONDS = 60
+EMFORM_AGGREGATE_TOP_K = 10
+EMFORM_AGGREGATE_TOP_K_CAPACITY = 50
+EMFORM_AGGREGATE_HLL_PRECISION = 10
+EMFORM_AGGREGATE_BUCKET_DAYS = 366
+EMFORM_VALIDATOR_CACHE_SIZE = 10000
+EMFORM_SUBMISSION_BATCH_MAX_SIZE = 1000
+
+# Chatbot QnA engine
+
+QNA_CHUNK_WORDS = 80
+QNA_TOP_K = 3
+# knowledge longer than this is indexed on a background thread, questions meanwhile use the previous index
+QNA_INLINE_BUILD_CHARS = 256 * 1024
+# indexes kept per worker, least recently used ones are dropped past either bound
+QNA_INDEX_CACHE_SIZE = 64
+QNA_INDEX_CACHE_BYTES = 512 * 1024 * 1024
+QNA_QUESTION_MAX_LENGTH = 500
+QNA_P50_TARGET_MS = 5
+QNA_P99_TARGET_MS = 50
+
+# Email Configuration (set EMAIL_BACKEND to console or filebased backend for offline testing)
+
+EMAIL_BACKEND = getenv('EMAIL_BACKEND', 'django.core.mail.backends.smtp.EmailBackend')
+EMAIL_FILE_PATH = BASE_DIR / 'mails'
+EMAIL_HOST = getenv('EMAIL_HOST', 'localhost')
+EMAIL_PORT = int(getenv('EMAIL_PORT', 587))
+EMAIL_HOST_USER = getenv('EMAIL_HOST_USER', '')
+EMAIL_HOST_PASSWORD = getenv('EMAIL_HOST_PASSWORD', '')
+EMAIL_USE_TLS = getenv('EMAIL_USE_TLS', 'True') == 'True'
+
+# Mail Outbox Configuration (drained by "python manage.py mailer", or by the task worker when background tasks are enabled)
+
+MAIL_OUTBOX_ENABLED = getenv('MAIL_OUTBOX_ENABLED', 'True') == 'True'
+MAIL_OUTBOX_BATCH_SIZE = 50
+MAIL_OUTBOX_POLL_SECONDS = 2
+MAIL_OUTBOX_MAX_ATTEMPTS = 5
+MAIL_OUTBOX_BACKOFF_SECONDS = 30
+MAIL_OUTBOX_MAX_BACKOFF_SECONDS = 60 * 60
+MAIL_OUTBOX_CLAIM_TIMEOUT_SECONDS = 10 * 60
+
+# Background Tasks (run by "python manage.py tasks", tasks run inline in the request when disabled)
+
+TASKS_ENABLED = getenv('TASKS_ENABLED', 'False') == 'True'
+TASK_WORKERS = int(getenv('TASK_WORKERS', 4))
+TASK_POLL_SECONDS = 1
+TASK_MAX_ATTEMPTS = 5
+TASK_BACKOFF_SECONDS = 10
+TASK_MAX_BACKOFF_SECONDS = 60 * 60
+TASK_CLAIM_TIMEOUT_SECONDS = 10 * 60
+
+# Api Hit Counter flush interval (seconds, 0 writes every hit through)
+
+HIT_COUNTER_FLUSH_SECONDS = float(getenv('HIT_COUNTER_FLUSH_SECONDS', 5))
 
 # Cors Configuration
 